@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 import argparse
+import atexit
 import importlib
 from importlib import metadata
 import json
 import os
 from pathlib import Path
+import signal
 import sys
 import time
 import urllib.error
@@ -13,15 +15,74 @@ import urllib.request
 
 from packaging.version import InvalidVersion, Version
 
+from .admission import DEFAULT_MAX_WAITING, DEFAULT_RETRY_AFTER
+from .batching import DEFAULT_MAX_BATCH_SIZE
+from .bench import (
+    SyntheticSearcher,
+    dump_report,
+    format_report,
+    load_queries,
+    run_bench,
+    serve_in_background,
+    synthetic_queries,
+)
+from .cache import DEFAULT_CACHE_MAX_MB
+from .collection_store import build_collection_store, default_store_path, store_is_current
 from .data import (
     DATASET_REPO_ID,
     DatasetLayoutError,
+    detect_all_dataset_paths,
     detect_dataset_paths,
     download_archives,
     download_collection_and_indexes,
     extract_archives,
+    infer_collection_path,
+    list_index_names,
+    locate_dataset_root,
+)
+from .encoder import (
+    DEFAULT_ENCODER_CHECK_QUERIES,
+    DEFAULT_ENCODER_MIN_OVERLAP,
+    ENCODER_BACKENDS,
+    apply_encoder_backend,
+    check_encoder_backend,
+)
+from .filters import FILTER_SUFFIX, build_filter, filters_dir, load_filters
+from .querylog import (
+    DEFAULT_PREWARM_TOP,
+    DEFAULT_QUERY_LOG_BACKUPS,
+    DEFAULT_QUERY_LOG_MAX_MB,
+    QueryLog,
+    top_requests,
+)
+from .responses import DEFAULT_COMPRESS_LEVEL
+from .server import (
+    DEFAULT_CACHE_SIZE,
+    DEFAULT_CHECKPOINT,
+    MAX_K,
+    SEARCH_PRESETS,
+    IndexSet,
+    InvalidSearchSettings,
+    create_app,
+    create_searcher,
+    index_fingerprint,
+    parse_search_settings,
+    reload_indexes,
+    resident_index_bytes,
+    set_ready,
+    use_mmap_index,
+)
+from .serving import (
+    DEFAULT_MAX_QUEUED,
+    DEFAULT_SERVER,
+    SERVER_CHOICES,
+    ServerUnavailableError,
+    default_thread_count,
+    run_server,
+    serve_prefork,
 )
-from .server import DEFAULT_CACHE_SIZE, DEFAULT_CHECKPOINT, create_app, create_searcher
+from .shards import create_sharded_searcher, start_local_shards
+from .warmup import DEFAULT_WARMUP_QUERIES, pretouch, warm_up, warm_up_remote
 
 PACKAGE_NAME = "colbert-server"
 
@@ -40,6 +101,19 @@ class PrintVersionAction(argparse.Action):
         parser.exit(message=f"{parser.prog} {VERSION}\n")
 
 
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def _parse_size(value: str) -> int:
+    """Parse a byte size such as ``512M`` or ``8G`` (binary units)."""
+    text = value.strip().upper().removesuffix("B").removesuffix("I")
+    number, unit = (text[:-1], text[-1:]) if text[-1:] in _SIZE_UNITS else (text, "")
+    try:
+        return int(float(number) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}") from None
+
+
 def _resolve_version() -> str:
     try:
         return metadata.version(PACKAGE_NAME)
@@ -141,6 +215,72 @@ def build_parser() -> argparse.ArgumentParser:
     serve_parser = subparsers.add_parser("serve", help="Start the ColBERT search API server.")
     serve_parser.add_argument("--host", default="0.0.0.0", help="Host interface to bind.")
     serve_parser.add_argument("--port", type=int, default=8893, help="Port to listen on.")
+    serve_parser.add_argument(
+        "--server",
+        choices=SERVER_CHOICES,
+        default=DEFAULT_SERVER,
+        help=(
+            "HTTP server: 'threaded' (bounded worker thread pool with keep-alive), 'asgi' "
+            "(uvicorn, needs uvicorn and a2wsgi installed) or 'dev' (Flask's development "
+            f"server). Default: {DEFAULT_SERVER}."
+        ),
+    )
+    serve_parser.add_argument(
+        "--threads",
+        type=int,
+        help="Number of concurrent requests to serve (default: torch's intra-op thread count).",
+    )
+    serve_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=(
+            "Fork this many worker processes after loading the index once; they share the "
+            "index memory copy-on-write and accept on the same socket (threaded server only)."
+        ),
+    )
+    serve_parser.add_argument(
+        "--max-queued",
+        type=int,
+        default=DEFAULT_MAX_QUEUED,
+        help=(
+            "Connections allowed to wait for a free worker before new ones are rejected "
+            f"with 503 (default: {DEFAULT_MAX_QUEUED})."
+        ),
+    )
+    serve_parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=0,
+        metavar="N",
+        help=(
+            "Searches allowed to run at once per process; cache hits do not count. Keep it "
+            "at least --max-batch-size when batching (default: 0, unlimited)."
+        ),
+    )
+    serve_parser.add_argument(
+        "--max-waiting",
+        type=int,
+        default=DEFAULT_MAX_WAITING,
+        help=(
+            "Searches allowed to wait for a --max-inflight slot before new ones get a 503 "
+            f"with Retry-After (default: {DEFAULT_MAX_WAITING})."
+        ),
+    )
+    serve_parser.add_argument(
+        "--request-timeout-ms",
+        type=float,
+        help=(
+            "Deadline for requests that do not pass timeout_ms; searches still waiting "
+            "when it passes are dropped with a 503 (default: none)."
+        ),
+    )
+    serve_parser.add_argument(
+        "--retry-after",
+        type=float,
+        default=DEFAULT_RETRY_AFTER,
+        help=f"Seconds sent in Retry-After with 503s (default: {DEFAULT_RETRY_AFTER:g}).",
+    )
     serve_parser.add_argument(
         "--checkpoint",
         default=DEFAULT_CHECKPOINT,
@@ -152,6 +292,191 @@ def build_parser() -> argparse.ArgumentParser:
         default=DEFAULT_CACHE_SIZE,
         help=f"Maximum number of cached search queries (default: {DEFAULT_CACHE_SIZE}).",
     )
+    serve_parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=DEFAULT_CACHE_MAX_MB,
+        help=f"Memory budget for cached search results in MB (default: {DEFAULT_CACHE_MAX_MB:g}).",
+    )
+    serve_parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        metavar="SECONDS",
+        help="Expire cached search results after this many seconds (default: never).",
+    )
+    serve_parser.add_argument(
+        "--cache-path",
+        type=Path,
+        metavar="FILE",
+        help=(
+            "Persist cached search results in this SQLite file. It survives restarts, is "
+            "shared by all workers on the host, and is keyed by index and checkpoint."
+        ),
+    )
+    serve_parser.add_argument(
+        "--cold-search-depth",
+        type=int,
+        default=MAX_K,
+        metavar="K",
+        help=(
+            "Search only max(k, K) candidates for queries not seen before instead of "
+            f"{MAX_K} (default: {MAX_K}). Lower values make cold, small-k queries cheaper."
+        ),
+    )
+    serve_parser.add_argument(
+        "--batch-window-ms",
+        type=float,
+        default=0.0,
+        help=(
+            "Coalesce concurrent /api/search requests arriving within this many milliseconds "
+            "into one encoder batch (default: 0, disabled)."
+        ),
+    )
+    serve_parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=DEFAULT_MAX_BATCH_SIZE,
+        help=(
+            "Maximum number of queries per coalesced encoder batch "
+            f"(default: {DEFAULT_MAX_BATCH_SIZE})."
+        ),
+    )
+    serve_parser.add_argument(
+        "--mmap-index",
+        action="store_true",
+        help=(
+            "Memory-map the index codes and residuals instead of loading them into RAM. "
+            "Requires a single-chunk index (see colbert.utils.coalesce)."
+        ),
+    )
+    serve_parser.add_argument(
+        "--memory-budget",
+        type=_parse_size,
+        metavar="SIZE",
+        help=(
+            "Memory-map the index automatically when its codes and residuals are larger than "
+            "SIZE (e.g. 8G, 512M); smaller indexes are loaded into RAM."
+        ),
+    )
+    serve_parser.add_argument(
+        "--encoder-backend",
+        choices=ENCODER_BACKENDS,
+        default="eager",
+        help=(
+            "Query encoder implementation: eager (default), int8 (dynamic quantization, "
+            "CPU only) or compiled (torch.compile)."
+        ),
+    )
+    serve_parser.add_argument(
+        "--encoder-check",
+        type=int,
+        default=DEFAULT_ENCODER_CHECK_QUERIES,
+        metavar="N",
+        help=(
+            "Compare the top-k of N sample queries (--warmup-queries or synthetic) against "
+            "the eager encoder before switching backends; 0 disables the check "
+            f"(default: {DEFAULT_ENCODER_CHECK_QUERIES})."
+        ),
+    )
+    serve_parser.add_argument(
+        "--encoder-min-overlap",
+        type=float,
+        default=DEFAULT_ENCODER_MIN_OVERLAP,
+        help=(
+            "Refuse to start when the mean top-k overlap with the eager encoder is below "
+            f"this fraction (default: {DEFAULT_ENCODER_MIN_OVERLAP})."
+        ),
+    )
+    serve_parser.add_argument(
+        "--warmup",
+        action="store_true",
+        help=(
+            "Run warm-up queries through the app before accepting connections; GET /ready "
+            "reports 503 until they finish."
+        ),
+    )
+    serve_parser.add_argument(
+        "--warmup-queries",
+        type=Path,
+        metavar="FILE",
+        help="Warm-up query file, one query per line (default: synthetic queries).",
+    )
+    serve_parser.add_argument(
+        "--warmup-count",
+        type=int,
+        default=DEFAULT_WARMUP_QUERIES,
+        help=f"Maximum number of warm-up queries (default: {DEFAULT_WARMUP_QUERIES}).",
+    )
+    serve_parser.add_argument(
+        "--pretouch",
+        action="store_true",
+        help="Read the index and collection files at startup to pull them into the page cache.",
+    )
+    serve_parser.add_argument(
+        "--query-log",
+        type=Path,
+        metavar="FILE",
+        help="Append served queries (normalized, with timestamp and latency) to FILE.",
+    )
+    serve_parser.add_argument(
+        "--query-log-max-mb",
+        type=float,
+        default=DEFAULT_QUERY_LOG_MAX_MB,
+        help=f"Rotate the query log at this size (default: {DEFAULT_QUERY_LOG_MAX_MB:g} MB).",
+    )
+    serve_parser.add_argument(
+        "--query-log-backups",
+        type=int,
+        default=DEFAULT_QUERY_LOG_BACKUPS,
+        help=f"Rotated query logs to keep (default: {DEFAULT_QUERY_LOG_BACKUPS}).",
+    )
+    serve_parser.add_argument(
+        "--prewarm-log",
+        type=Path,
+        metavar="FILE",
+        help=(
+            "Replay the most frequent queries from this query log (and its backups) into the "
+            "result cache before accepting connections, each with the index, filter and search "
+            "settings it was logged with."
+        ),
+    )
+    serve_parser.add_argument(
+        "--prewarm-top",
+        type=int,
+        default=DEFAULT_PREWARM_TOP,
+        help=f"Number of logged queries to replay (default: {DEFAULT_PREWARM_TOP}).",
+    )
+    serve_parser.add_argument(
+        "--compress-level",
+        type=int,
+        default=DEFAULT_COMPRESS_LEVEL,
+        choices=range(10),
+        metavar="0-9",
+        help=(
+            "gzip/deflate level for JSON responses when the client sends Accept-Encoding "
+            f"(default: {DEFAULT_COMPRESS_LEVEL}; 0 disables compression)."
+        ),
+    )
+    serve_parser.add_argument(
+        "--search-preset",
+        choices=tuple(SEARCH_PRESETS),
+        help=(
+            "Default PLAID search settings: fast (1 cell, 256 docs), balanced (2 cells, "
+            "1024 docs) or exhaustive (4 cells, 4096 docs). Defaults to ColBERT's depth-based "
+            "choice. Requests can override it with preset=..."
+        ),
+    )
+    serve_parser.add_argument(
+        "--ncells", type=int, help="Default number of centroids probed per query token."
+    )
+    serve_parser.add_argument(
+        "--centroid-score-threshold",
+        type=float,
+        help="Default centroid score below which candidate centroids are pruned.",
+    )
+    serve_parser.add_argument(
+        "--ndocs", type=int, help="Default number of candidate passages scored per query."
+    )
     source_group = serve_parser.add_mutually_exclusive_group()
     source_group.add_argument(
         "--from-cache",
@@ -175,6 +500,17 @@ def build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Extract downloaded archives when using --download-archives.",
     )
+    serve_parser.add_argument(
+        "--extract-jobs",
+        type=int,
+        metavar="N",
+        help="Archives to extract in parallel (default: one per CPU).",
+    )
+    serve_parser.add_argument(
+        "--verify-extraction",
+        action="store_true",
+        help="Check already extracted files against their recorded SHA-256 before skipping.",
+    )
     serve_parser.add_argument(
         "--index-root",
         type=Path,
@@ -182,13 +518,57 @@ def build_parser() -> argparse.ArgumentParser:
     )
     serve_parser.add_argument(
         "--index-name",
-        help="Name of the ColBERT index to load (folder name within the index root).",
+        action="append",
+        help=(
+            "Name of the ColBERT index to load (folder name within the index root). Repeat "
+            "to serve several indexes; requests choose one with index=<name>."
+        ),
+    )
+    serve_parser.add_argument(
+        "--all-indexes",
+        action="store_true",
+        help="Serve every index under the index root with one shared query encoder.",
+    )
+    serve_parser.add_argument(
+        "--sharded",
+        action="store_true",
+        help=(
+            "Treat the selected indexes as shards of one collection, in pid order: each is "
+            "served by a local worker process, and this process encodes queries once and "
+            "merges the shards' results."
+        ),
+    )
+    serve_parser.add_argument(
+        "--shard",
+        action="append",
+        metavar="URL",
+        help=(
+            "Coordinate remote shard servers (colbert-server instances) instead of loading "
+            "an index. Repeat in pid order; pass --collection-path for passage text."
+        ),
+    )
+    serve_parser.add_argument(
+        "--admin-token",
+        help=(
+            "Token required as 'Authorization: Bearer <token>' by POST /admin/reload "
+            "(default: $COLBERT_SERVER_ADMIN_TOKEN; without one, only localhost may reload)."
+        ),
     )
     serve_parser.add_argument(
         "--collection-path",
         type=Path,
         help="Path to the document collection file (optional).",
     )
+    serve_parser.add_argument(
+        "--collection-store",
+        type=Path,
+        metavar="FILE",
+        help=(
+            "Memory-mapped collection store built by `build-collection-store`. Defaults to "
+            f"the '{default_store_path(Path('collection.tsv')).name}' file next to the "
+            "collection TSV when present."
+        ),
+    )
     serve_parser.add_argument(
         "--repo-id",
         default=DATASET_REPO_ID,
@@ -229,6 +609,17 @@ def build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Extract the archives in-place (or into --extract-to if provided).",
     )
+    archives_parser.add_argument(
+        "--extract-jobs",
+        type=int,
+        metavar="N",
+        help="Archives to extract in parallel (default: one per CPU).",
+    )
+    archives_parser.add_argument(
+        "--verify-extraction",
+        action="store_true",
+        help="Check already extracted files against their recorded SHA-256 before skipping.",
+    )
     archives_parser.add_argument(
         "--repo-id",
         default=DATASET_REPO_ID,
@@ -244,6 +635,170 @@ def build_parser() -> argparse.ArgumentParser:
     )
     archives_parser.set_defaults(func=handle_download_archives)
 
+    store_parser = subparsers.add_parser(
+        "build-collection-store",
+        help="Convert the collection TSV into a memory-mapped store for fast passage lookup.",
+    )
+    store_source = store_parser.add_mutually_exclusive_group(required=True)
+    store_source.add_argument(
+        "--collection-path",
+        type=Path,
+        help="Path to the collection TSV file.",
+    )
+    store_source.add_argument(
+        "--dataset-root",
+        type=Path,
+        metavar="DIR",
+        help="Dataset directory (e.g. extracted archives) to infer the collection TSV from.",
+    )
+    store_parser.add_argument(
+        "--output",
+        type=Path,
+        metavar="FILE",
+        help="Where to write the store (default: next to the TSV with a .cstore suffix).",
+    )
+    store_parser.set_defaults(func=handle_build_collection_store)
+
+    filter_parser = subparsers.add_parser(
+        "build-filter",
+        help="Precompute a named pid filter from the collection and store it next to the index.",
+    )
+    filter_parser.add_argument(
+        "--name", required=True, help="Filter name, passed as filter=<name> when searching."
+    )
+    filter_parser.add_argument(
+        "--title-prefix",
+        action="append",
+        default=[],
+        metavar="PREFIX",
+        help="Include passages whose title starts with PREFIX (case-insensitive; repeatable).",
+    )
+    filter_parser.add_argument(
+        "--pids-file",
+        type=Path,
+        metavar="FILE",
+        help="Include the passage ids listed in FILE (one per line).",
+    )
+    filter_parser.add_argument(
+        "--dataset-root",
+        type=Path,
+        metavar="DIR",
+        help="Dataset directory to infer the index and collection TSV from.",
+    )
+    filter_parser.add_argument("--index-root", type=Path, help="Root directory of the index.")
+    filter_parser.add_argument("--index-name", help="Index the filter belongs to.")
+    filter_parser.add_argument("--collection-path", type=Path, help="Collection TSV file.")
+    filter_parser.add_argument(
+        "--output",
+        type=Path,
+        metavar="FILE",
+        help="Where to write the filter (default: <index>/filters/<name>.filter).",
+    )
+    filter_parser.set_defaults(func=handle_build_filter)
+
+    prewarm_parser = subparsers.add_parser(
+        "prewarm",
+        help="Replay the most frequent logged queries into a running server's result cache.",
+    )
+    prewarm_parser.add_argument(
+        "--from-log",
+        type=Path,
+        required=True,
+        metavar="FILE",
+        help=(
+            "Query log written by serve --query-log (rotated backups are read too). Queries are "
+            "replayed with the index, filter and search settings they were logged with."
+        ),
+    )
+    prewarm_parser.add_argument(
+        "--url",
+        default="http://127.0.0.1:8893",
+        help="Base URL of the server to warm (default: http://127.0.0.1:8893).",
+    )
+    prewarm_parser.add_argument(
+        "--top",
+        type=int,
+        default=DEFAULT_PREWARM_TOP,
+        help=f"Number of queries to replay (default: {DEFAULT_PREWARM_TOP}).",
+    )
+    prewarm_parser.add_argument(
+        "--batch-size", type=int, default=32, help="Queries per batch request (default: 32)."
+    )
+    prewarm_parser.set_defaults(func=handle_prewarm)
+
+    bench_parser = subparsers.add_parser(
+        "bench",
+        help="Replay queries against a server and report throughput and latency percentiles.",
+    )
+    bench_target = bench_parser.add_mutually_exclusive_group(required=True)
+    bench_target.add_argument("--url", help="Base URL of a running colbert-server.")
+    bench_target.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="Benchmark an in-process app backed by a synthetic searcher (no index needed).",
+    )
+    bench_target.add_argument(
+        "--index-root",
+        type=Path,
+        help="Benchmark an in-process app over this local ColBERT index root.",
+    )
+    bench_parser.add_argument("--index-name", help="Index to load with --index-root.")
+    bench_parser.add_argument(
+        "--collection-path", type=Path, help="Collection TSV to load with --index-root."
+    )
+    bench_parser.add_argument(
+        "--checkpoint",
+        default=DEFAULT_CHECKPOINT,
+        help=f"Checkpoint to load with --index-root (default: {DEFAULT_CHECKPOINT}).",
+    )
+    bench_parser.add_argument(
+        "--encoder-backend",
+        choices=ENCODER_BACKENDS,
+        default="eager",
+        help="Query encoder implementation to use with --index-root (default: eager).",
+    )
+    bench_parser.add_argument(
+        "--queries",
+        type=Path,
+        metavar="FILE",
+        help="Query file to replay (one query per line). Defaults to synthetic queries.",
+    )
+    bench_parser.add_argument(
+        "--num-queries", type=int, default=1000, help="Synthetic queries to send (default: 1000)."
+    )
+    bench_parser.add_argument(
+        "--distinct",
+        type=int,
+        default=200,
+        help="Distinct synthetic queries, drawn with a Zipf-like skew (default: 200).",
+    )
+    bench_parser.add_argument("--seed", type=int, default=0, help="Synthetic query seed.")
+    bench_parser.add_argument("--k", type=int, default=10, help="Top-k per query (default: 10).")
+    bench_parser.add_argument(
+        "--concurrency", type=int, default=8, help="Concurrent clients (default: 8)."
+    )
+    bench_parser.add_argument(
+        "--qps",
+        type=float,
+        help="Issue requests at this fixed rate instead of back-to-back (open-loop load).",
+    )
+    bench_parser.add_argument(
+        "--synthetic-encode-ms",
+        type=float,
+        default=5.0,
+        help="Simulated encoder cost per batch with --synthetic (default: 5).",
+    )
+    bench_parser.add_argument(
+        "--synthetic-search-ms",
+        type=float,
+        default=10.0,
+        help="Simulated ranking cost per query with --synthetic (default: 10).",
+    )
+    bench_parser.add_argument(
+        "--json", action="store_true", help="Print the report as JSON for scripted comparisons."
+    )
+    bench_parser.set_defaults(func=handle_bench)
+
     doctor_parser = subparsers.add_parser(
         "doctor",
         help="Inspect environment and dataset prerequisites without downloading large assets.",
@@ -265,12 +820,131 @@ def main(argv: list[str] | None = None) -> int:
 
     try:
         return args.func(args)
-    except DatasetLayoutError as err:
+    except (DatasetLayoutError, InvalidSearchSettings, ServerUnavailableError) as err:
         print(f"Error: {err}", file=sys.stderr)
         return 1
 
 
+def _shard_command(args: argparse.Namespace, index_root: Path, index_name: str) -> list[str]:
+    """``colbert-server`` arguments for a local worker serving one shard for ``--sharded``."""
+    command = [
+        "serve",
+        "--index-root",
+        str(index_root),
+        "--index-name",
+        index_name,
+        "--checkpoint",
+        args.checkpoint,
+        "--server",
+        "threaded",
+    ]
+    if args.mmap_index:
+        command.append("--mmap-index")
+    return command
+
+
+def _detect_indexes(
+    base_path: Path, args: argparse.Namespace
+) -> tuple[Path, list[str], Path | None]:
+    """Resolve ``--all-indexes`` or the repeated ``--index-name`` against a dataset root."""
+    if args.all_indexes:
+        return detect_all_dataset_paths(base_path)
+    resolved = [
+        detect_dataset_paths(base_path, preferred_index_name=name)
+        for name in dict.fromkeys(args.index_name or [None])
+    ]
+    index_root, _, collection_path = resolved[0]
+    return index_root, [index_name for _, index_name, _ in resolved], collection_path
+
+
+def _load_indexes(
+    args: argparse.Namespace,
+    index_root: Path,
+    index_names: list[str],
+    collection_path: Path | None,
+    collection_store: Path | None,
+    encoder_from=None,
+) -> tuple[dict, dict]:
+    """Load ``index_names`` and their filters, sharing one checkpoint and the memory budget."""
+    searchers, filters = {}, {}
+    remaining_budget = args.memory_budget
+    for index_name in index_names:
+        mmap_index = use_mmap_index(
+            index_root, index_name, mmap_index=args.mmap_index, memory_budget=remaining_budget
+        )
+        size = resident_index_bytes(index_root, index_name)
+        if mmap_index:
+            print(
+                f"Memory-mapping index '{index_name}' "
+                f"({size / 1024**3:.1f} GB of codes and residuals)"
+            )
+        elif remaining_budget is not None and remaining_budget > 0:
+            # Indexes loaded into RAM share the budget; later ones are mapped once it is spent.
+            remaining_budget = max(1, remaining_budget - size)
+
+        searchers[index_name] = create_searcher(
+            index_root=str(index_root),
+            index_name=index_name,
+            collection_path=str(collection_path) if collection_path else None,
+            checkpoint=args.checkpoint,
+            collection_store=collection_store,
+            mmap_index=mmap_index,
+            encoder_from=next(iter(searchers.values()), encoder_from),
+        )
+        filters[index_name] = load_filters(filters_dir(index_root, index_name))
+        if filters[index_name]:
+            print(f"Loaded filters for '{index_name}': {', '.join(sorted(filters[index_name]))}")
+    return searchers, filters
+
+
+def _cache_namespace(args: argparse.Namespace, index_root: Path, index_names: list[str]) -> str:
+    checkpoint = (
+        args.checkpoint
+        if args.encoder_backend == "eager"
+        else f"{args.checkpoint}+{args.encoder_backend}"
+    )
+    if args.shard:
+        return f"shards:{','.join(args.shard)}@{checkpoint}"
+    return ",".join(
+        index_fingerprint(index_root, index_name, checkpoint) for index_name in index_names
+    )
+
+
+def _resolve_collection_store(
+    collection_store: Path | None, collection_path: Path | None
+) -> Path | None:
+    """
+    Pick the collection store to serve from, checking it against its source TSV.
+
+    A store found next to the TSV is rebuilt when the TSV has changed since it was built;
+    if that fails the TSV is served instead. An explicitly given store that is out of date
+    is refused.
+    """
+    if collection_path is None:
+        return collection_store
+    if collection_store is not None:
+        if not store_is_current(collection_store, collection_path):
+            raise DatasetLayoutError(
+                f"Collection store {collection_store} was not built from the current "
+                f"{collection_path}. Rebuild it with `colbert-server build-collection-store`."
+            )
+        return collection_store
+
+    candidate = default_store_path(collection_path)
+    if not candidate.exists() or store_is_current(candidate, collection_path):
+        return candidate if candidate.exists() else None
+    print(f"Collection store {candidate} is out of date with {collection_path}; rebuilding it")
+    try:
+        return build_collection_store(collection_path, candidate)
+    except OSError as err:
+        print(f"Warning: could not rebuild {candidate} ({err}); serving the TSV.", file=sys.stderr)
+        return None
+
+
 def handle_serve(args: argparse.Namespace) -> int:
+    # Reject a bad combination before spending minutes loading the index.
+    if args.workers > 1 and args.server != "threaded":
+        raise ServerUnavailableError("--workers is only supported with --server threaded.")
     hf_token = args.hf_token or os.getenv("HF_TOKEN")
 
     if args.from_cache:
@@ -280,9 +954,7 @@ def handle_serve(args: argparse.Namespace) -> int:
             token=hf_token,
             cache_dir=args.cache_dir,
         )
-        index_root, index_name, inferred_collection = detect_dataset_paths(
-            snapshot_path, preferred_index_name=args.index_name
-        )
+        index_root, index_names, inferred_collection = _detect_indexes(snapshot_path, args)
         collection_path = (
             Path(args.collection_path) if args.collection_path else inferred_collection
         )
@@ -304,43 +976,229 @@ def handle_serve(args: argparse.Namespace) -> int:
             return 0
 
         extraction_dir = args.extract_to or args.download_archives
-        extracted_root = extract_archives(snapshot_path, extraction_dir)
-        print(f"Archives extracted to {extracted_root}")
-        index_root, index_name, inferred_collection = detect_dataset_paths(
-            extracted_root, preferred_index_name=args.index_name
+        extracted_root = extract_archives(
+            snapshot_path,
+            extraction_dir,
+            jobs=args.extract_jobs,
+            verify=args.verify_extraction,
         )
+        print(f"Archives extracted to {extracted_root}")
+        index_root, index_names, inferred_collection = _detect_indexes(extracted_root, args)
         collection_path = (
             Path(args.collection_path) if args.collection_path else inferred_collection
         )
+    elif args.shard:
+        index_root, index_names = None, []
+        collection_path = Path(args.collection_path) if args.collection_path else None
     else:
-        if not args.index_root or not args.index_name:
+        if not args.index_root or not (args.index_name or args.all_indexes):
             raise DatasetLayoutError(
                 "--index-root and --index-name are required when not downloading from Hugging Face."
             )
         index_root = Path(args.index_root)
-        index_name = args.index_name
+        if args.all_indexes:
+            index_names = list_index_names(index_root)
+            if not index_names:
+                raise DatasetLayoutError(f"No index directories were found under {index_root}.")
+        else:
+            index_names = list(dict.fromkeys(args.index_name))
         collection_path = Path(args.collection_path) if args.collection_path else None
 
-    if collection_path is None:
+    search_settings = parse_search_settings(
+        {
+            "preset": args.search_preset,
+            "ncells": args.ncells,
+            "centroid_score_threshold": args.centroid_score_threshold,
+            "ndocs": args.ndocs,
+        }
+    )
+
+    collection_store = _resolve_collection_store(args.collection_store, collection_path)
+
+    if collection_path is None and collection_store is None:
         print(
             "Warning: collection path could not be inferred. "
             "ColBERT will run without document text.",
             file=sys.stderr,
         )
 
-    searcher = create_searcher(
-        index_root=str(index_root),
-        index_name=index_name,
-        collection_path=str(collection_path) if collection_path else None,
-        checkpoint=args.checkpoint,
-    )
-    app = create_app(searcher, cache_size=args.cache_size)
+    sharded = bool(args.shard or args.sharded)
+    searchers, filters = {}, {}
+    if not sharded:
+        searchers, filters = _load_indexes(
+            args, index_root, index_names, collection_path, collection_store
+        )
+
+    if sharded:
+        shard_urls = args.shard or []
+        if args.sharded:
+            shard_urls, stop_shards = start_local_shards(
+                [_shard_command(args, index_root, index_name) for index_name in index_names]
+            )
+            atexit.register(stop_shards)
+            print(f"Started {len(shard_urls)} local shard servers: {', '.join(shard_urls)}")
+        searcher = create_sharded_searcher(
+            shard_urls,
+            args.checkpoint,
+            collection_path=collection_path,
+            collection_store=collection_store,
+        )
+        print(f"Coordinating {len(shard_urls)} shards ({searcher.ranker.num_passages} passages)")
+    else:
+        # The searchers share one checkpoint, so switching the first one switches them all.
+        searcher = next(iter(searchers.values()))
+    if args.encoder_backend != "eager":
+        if args.encoder_check > 0:
+            if args.warmup_queries:
+                queries = load_queries(args.warmup_queries)[: args.encoder_check]
+            else:
+                queries = synthetic_queries(args.encoder_check, distinct=args.encoder_check)
+            overlap = check_encoder_backend(searcher, args.encoder_backend, queries)
+            print(
+                f"Encoder backend {args.encoder_backend}: {overlap:.1%} top-k overlap with "
+                f"eager on {len(queries)} queries"
+            )
+            if overlap < args.encoder_min_overlap:
+                raise ServerUnavailableError(
+                    f"The {args.encoder_backend} encoder backend agrees with eager on only "
+                    f"{overlap:.1%} of top-k results (minimum {args.encoder_min_overlap:.0%})."
+                )
+        else:
+            apply_encoder_backend(searcher, args.encoder_backend)
+            print(f"Using the {args.encoder_backend} encoder backend")
+
+    warmup_queries = []
+    if args.warmup:
+        if args.warmup_queries:
+            warmup_queries = load_queries(args.warmup_queries)[: args.warmup_count]
+        else:
+            warmup_queries = synthetic_queries(args.warmup_count, distinct=args.warmup_count)
+
+    # Forked workers would each load their own copy, and local shards are child processes
+    # with indexes of their own, so those setups reload by restarting.
+    loader = None
+    if args.shard and args.workers <= 1:
+
+        def loader(encoder) -> IndexSet:
+            reconnected = create_sharded_searcher(
+                args.shard,
+                args.checkpoint,
+                collection_path=collection_path,
+                collection_store=collection_store,
+                encoder_from=encoder,
+            )
+            # Shard fingerprints are unknown here, so persisted results start over.
+            namespace = f"{_cache_namespace(args, index_root, index_names)}#{time.time_ns()}"
+            return IndexSet(reconnected, cache_namespace=namespace)
+
+    elif not sharded and args.workers <= 1:
 
-    print(f"Serving index '{index_name}' from root {index_root}")
-    if collection_path:
+        def loader(encoder) -> IndexSet:
+            names = list_index_names(index_root) if args.all_indexes else index_names
+            reloaded, reloaded_filters = _load_indexes(
+                args, index_root, names, collection_path, collection_store, encoder_from=encoder
+            )
+            return IndexSet(reloaded, reloaded_filters, _cache_namespace(args, index_root, names))
+
+    app = create_app(
+        searcher if sharded else searchers,
+        cache_size=args.cache_size,
+        cache_max_mb=args.cache_max_mb,
+        cache_ttl=args.cache_ttl,
+        cache_path=args.cache_path,
+        cache_namespace=_cache_namespace(args, index_root, index_names),
+        cold_search_depth=args.cold_search_depth,
+        batch_window_ms=args.batch_window_ms,
+        max_batch_size=args.max_batch_size,
+        search_settings=search_settings,
+        ready=not (args.warmup or args.prewarm_log),
+        filters=filters,
+        compress_level=args.compress_level,
+        query_log=(
+            QueryLog(
+                args.query_log,
+                max_bytes=int(args.query_log_max_mb * 1024 * 1024),
+                backups=args.query_log_backups,
+            )
+            if args.query_log
+            else None
+        ),
+        loader=loader,
+        reload_warmup=warmup_queries,
+        admin_token=args.admin_token or os.getenv("COLBERT_SERVER_ADMIN_TOKEN"),
+        max_inflight=args.max_inflight,
+        max_waiting=args.max_waiting,
+        retry_after=args.retry_after,
+        default_timeout_ms=args.request_timeout_ms,
+    )
+    # The app owns the searchers from here on, so a reload can free them.
+    del searcher, searchers, filters
+
+    if args.pretouch:
+        started = time.perf_counter()
+        touched = pretouch(
+            [index_root / index_name for index_name in index_names if not sharded]
+            + [path for path in (collection_store, collection_path) if path]
+        )
+        elapsed = time.perf_counter() - started
+        print(f"Pre-touched {touched / 1024**3:.1f} GB of index and collection in {elapsed:.1f}s")
+    if args.warmup:
+        for index_name in index_names if not sharded else [None]:
+            summary = warm_up(app, warmup_queries, index=index_name)
+            print(
+                f"Warmed up {repr(index_name) + ' ' if index_name else ''}with "
+                f"{summary['queries']} queries in {summary['seconds']:.1f}s"
+            )
+    if args.prewarm_log:
+        summary = warm_up(app, top_requests(args.prewarm_log, args.prewarm_top), k=MAX_K)
+        print(f"Prewarmed {summary['queries']} logged queries in {summary['seconds']:.1f}s")
+    set_ready(app)
+
+    names = ", ".join(f"'{index_name}'" for index_name in index_names)
+    if args.shard:
+        print(f"Serving a sharded index from {', '.join(args.shard)}")
+    elif sharded:
+        print(f"Serving shards {names} from {index_root}")
+    else:
+        print(
+            f"Serving {'index' if len(index_names) == 1 else 'indexes'} {names} from {index_root}"
+        )
+    if collection_store:
+        print(f"Using collection store {collection_store}")
+    elif collection_path:
         print(f"Using collection file {collection_path}")
+    if loader is not None and hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda *_: reload_indexes(app))
+        print("Send SIGHUP or POST /admin/reload to reload the index without downtime")
+
+    if args.workers > 1:
+        print(f"Forking {args.workers} workers that share the loaded index")
+        serve_prefork(
+            app,
+            args.host,
+            args.port,
+            workers=args.workers,
+            threads=args.threads,
+            max_queued=args.max_queued,
+            retry_after=args.retry_after,
+        )
+        return 0
 
-    app.run(host=args.host, port=args.port)
+    threads = args.threads or default_thread_count()
+    if args.server != "dev":
+        print(
+            f"Using the {args.server} server: {threads} concurrent requests, "
+            f"up to {args.max_queued} queued"
+        )
+    run_server(
+        app,
+        args.host,
+        args.port,
+        server=args.server,
+        threads=threads,
+        max_queued=args.max_queued,
+        retry_after=args.retry_after,
+    )
     return 0
 
 
@@ -357,12 +1215,120 @@ def handle_download_archives(args: argparse.Namespace) -> int:
 
     if args.extract or args.extract_to:
         extraction_dir = args.extract_to or args.destination
-        extracted_root = extract_archives(snapshot_path, extraction_dir)
+        extracted_root = extract_archives(
+            snapshot_path,
+            extraction_dir,
+            jobs=args.extract_jobs,
+            verify=args.verify_extraction,
+        )
         print(f"Archives extracted to {extracted_root}")
 
     return 0
 
 
+def handle_build_collection_store(args: argparse.Namespace) -> int:
+    collection_path = args.collection_path
+    if collection_path is None:
+        collection_path = infer_collection_path(locate_dataset_root(args.dataset_root))
+        if collection_path is None:
+            raise DatasetLayoutError(
+                f"No collection TSV found under {args.dataset_root}. "
+                "Supply --collection-path explicitly."
+            )
+
+    print(f"Building collection store from {collection_path}")
+    store_path = build_collection_store(collection_path, args.output)
+    print(f"Collection store written to {store_path}")
+    return 0
+
+
+def handle_build_filter(args: argparse.Namespace) -> int:
+    if not args.title_prefix and args.pids_file is None:
+        raise DatasetLayoutError("Pass --title-prefix and/or --pids-file to select passages.")
+
+    index_root, index_name, collection_path = args.index_root, args.index_name, None
+    if args.dataset_root is not None:
+        index_root, index_name, collection_path = detect_dataset_paths(
+            locate_dataset_root(args.dataset_root), preferred_index_name=args.index_name
+        )
+    collection_path = args.collection_path or collection_path
+    if collection_path is None:
+        raise DatasetLayoutError("Supply --collection-path or --dataset-root.")
+    output = args.output
+    if output is None:
+        if index_root is None or index_name is None:
+            raise DatasetLayoutError(
+                "Supply --output, --dataset-root, or --index-root with --index-name."
+            )
+        output = filters_dir(index_root, index_name) / f"{args.name}{FILTER_SUFFIX}"
+
+    pids = []
+    if args.pids_file is not None:
+        lines = args.pids_file.read_text().split()
+        try:
+            pids = [int(line) for line in lines]
+        except ValueError as exc:
+            raise DatasetLayoutError(
+                f"{args.pids_file} must list one integer pid per line."
+            ) from exc
+
+    pid_filter = build_filter(
+        collection_path, args.name, title_prefixes=args.title_prefix, pids=pids
+    )
+    pid_filter.save(output)
+    print(
+        f"Filter '{args.name}' selects {len(pid_filter)} of {pid_filter.num_passages} passages; "
+        f"written to {output}"
+    )
+    return 0
+
+
+def handle_prewarm(args: argparse.Namespace) -> int:
+    queries = top_requests(args.from_log, args.top)
+    if not queries:
+        raise DatasetLayoutError(f"No queries found in {args.from_log}.")
+    summary = warm_up_remote(args.url, queries, batch_size=args.batch_size, k=MAX_K)
+    print(f"Prewarmed {args.url} with {summary['queries']} queries in {summary['seconds']:.1f}s")
+    return 0
+
+
+def handle_bench(args: argparse.Namespace) -> int:
+    if args.queries:
+        queries = load_queries(args.queries)
+    else:
+        queries = synthetic_queries(args.num_queries, distinct=args.distinct, seed=args.seed)
+    if not queries:
+        raise DatasetLayoutError("No queries to replay.")
+
+    stop = None
+    base_url = args.url
+    if base_url is None:
+        if args.synthetic:
+            searcher = SyntheticSearcher(
+                encode_ms=args.synthetic_encode_ms, search_ms=args.synthetic_search_ms
+            )
+        else:
+            if not args.index_name:
+                raise DatasetLayoutError("--index-name is required with --index-root.")
+            searcher = create_searcher(
+                index_root=str(args.index_root),
+                index_name=args.index_name,
+                collection_path=str(args.collection_path) if args.collection_path else None,
+                checkpoint=args.checkpoint,
+            )
+            apply_encoder_backend(searcher, args.encoder_backend)
+        base_url, stop = serve_in_background(create_app(searcher), threads=args.concurrency)
+
+    try:
+        report = run_bench(base_url, queries, k=args.k, concurrency=args.concurrency, qps=args.qps)
+    finally:
+        if stop is not None:
+            stop()
+
+    print(dump_report(report) if args.json else format_report(report))
+    return 0 if report["errors"] == 0 else 1
+
+
 def _check_package(name: str, friendly: str | None = None) -> tuple[bool, str]:
     label = friendly or name
     try:
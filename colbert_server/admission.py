@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+import math
+import threading
+import time
+
+DEFAULT_MAX_WAITING = 64
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class SearchRejected(RuntimeError):
+    """Raised when a search is turned away; the API answers these with a 503."""
+
+    def __init__(self, message: str, retry_after: float = DEFAULT_RETRY_AFTER) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ServerOverloaded(SearchRejected):
+    """Every search slot is busy and the wait queue is full."""
+
+
+class DeadlineExceeded(SearchRejected):
+    """The request's deadline passed before its search started."""
+
+
+def retry_after_header(retry_after: float) -> str:
+    """Whole seconds (at least one) for a ``Retry-After`` header."""
+    return str(max(1, math.ceil(retry_after)))
+
+
+def request_deadline(started: float, timeout_ms: float | None) -> float | None:
+    """``time.perf_counter()`` value after which a request started at ``started`` is stale."""
+    return None if timeout_ms is None else started + timeout_ms / 1000.0
+
+
+class AdmissionControl:
+    """
+    Bound the number of searches running at once.
+
+    At most ``max_inflight`` callers hold a slot (``None`` means no limit); up to
+    ``max_waiting`` more wait for one in a bounded queue, and further callers are rejected
+    at once with :class:`ServerOverloaded`. A caller whose deadline passes while it waits,
+    or has already passed when it arrives, is rejected with :class:`DeadlineExceeded`, so
+    no work is spent on requests their clients have given up on.
+    """
+
+    def __init__(
+        self,
+        max_inflight: int | None = None,
+        *,
+        max_waiting: int = DEFAULT_MAX_WAITING,
+        retry_after: float = DEFAULT_RETRY_AFTER,
+    ) -> None:
+        if max_inflight is not None and max_inflight < 1:
+            raise ValueError("max_inflight must be at least 1.")
+        self.max_inflight = max_inflight
+        self.max_waiting = max(0, max_waiting)
+        self.retry_after = retry_after
+        self._condition = threading.Condition()
+        self.inflight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def check(self, deadline: float | None) -> None:
+        """Raise :class:`DeadlineExceeded` if ``deadline`` has passed."""
+        if deadline is not None and time.perf_counter() >= deadline:
+            with self._condition:
+                self.expired += 1
+            raise DeadlineExceeded(
+                "The request deadline passed before its search started.", self.retry_after
+            )
+
+    def acquire(self, deadline: float | None = None) -> None:
+        self.check(deadline)
+        with self._condition:
+            if self._full():
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise ServerOverloaded(
+                        f"All {self.max_inflight} search slots are busy and "
+                        f"{self.waiting} searches are waiting.",
+                        self.retry_after,
+                    )
+                self.waiting += 1
+                try:
+                    while self._full():
+                        timeout = None if deadline is None else deadline - time.perf_counter()
+                        if timeout is not None and timeout <= 0:
+                            self.expired += 1
+                            raise DeadlineExceeded(
+                                "The request deadline passed while waiting for a search slot.",
+                                self.retry_after,
+                            )
+                        self._condition.wait(timeout)
+                finally:
+                    self.waiting -= 1
+            self.inflight += 1
+            self.admitted += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self.inflight -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def admit(self, deadline: float | None = None) -> Iterator[None]:
+        """Hold a search slot for the duration of the ``with`` block."""
+        self.acquire(deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _full(self) -> bool:
+        return self.max_inflight is not None and self.inflight >= self.max_inflight
+
+    def stats(self) -> dict[str, object]:
+        with self._condition:
+            return {
+                "max_inflight": self.max_inflight,
+                "max_waiting": self.max_waiting,
+                "inflight": self.inflight,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "expired": self.expired,
+            }
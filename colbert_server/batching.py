@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import Future
+import os
+import queue
+import threading
+import time
+from typing import Any
+
+DEFAULT_MAX_BATCH_SIZE = 32
+
+
+class QueryBatcher:
+    """
+    Coalesce concurrent single-query searches into one batched call.
+
+    Items that arrive within ``window_ms`` of the first queued item (or until
+    ``max_batch_size`` items are waiting) are handed to ``run_batch`` together, so the
+    query encoder runs one padded batch instead of many batches of one. Every caller still
+    receives its own result; ``run_batch`` may return an exception in place of a result to
+    fail that caller alone.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list[Any]], list[Any]],
+        *,
+        window_ms: float,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        self.run_batch = run_batch
+        self.window = max(window_ms, 0.0) / 1000.0
+        self.max_batch_size = max_batch_size
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._queries = 0
+        self._sizes: Counter[int] = Counter()
+        self._reset_worker()
+
+    def _reset_worker(self) -> None:
+        # Threads do not survive fork(), so the worker is (re)started lazily per process.
+        self._pid = os.getpid()
+        self._queue: queue.SimpleQueue[tuple[Any, Future[Any]]] = queue.SimpleQueue()
+        self._worker: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self) -> None:
+        if self._pid != os.getpid():
+            self._reset_worker()
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="colbert-query-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def submit(self, item: Any) -> Future[Any]:
+        """Queue ``item`` for the next batch and return a future for its result."""
+        self._ensure_worker()
+        future: Future[Any] = Future()
+        self._queue.put((item, future))
+        return future
+
+    def search(self, item: Any) -> Any:
+        """Queue ``item`` and block until its batch has been processed."""
+        return self.submit(item).result()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict[str, object]:
+        """Return batch occupancy statistics collected since startup."""
+        with self._stats_lock:
+            batches, queries = self._batches, self._queries
+            sizes = dict(sorted(self._sizes.items()))
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "batches": batches,
+            "queries": queries,
+            "mean_batch_size": queries / batches if batches else 0.0,
+            "mean_occupancy": queries / (batches * self.max_batch_size) if batches else 0.0,
+            "batch_sizes": sizes,
+            "queue_depth": self.queue_depth(),
+        }
+
+    def _collect(self) -> list[tuple[Any, Future[Any]]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            batch = [
+                (query, future) for query, future in batch if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            with self._stats_lock:
+                self._batches += 1
+                self._queries += len(batch)
+                self._sizes[len(batch)] += 1
+
+            try:
+                results = self.run_batch([item for item, _ in batch])
+            except Exception as exc:  # Propagated to every waiting caller
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
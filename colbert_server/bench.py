@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+from pathlib import Path
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+import urllib.parse
+import zlib
+
+from .server import CACHE_STATUS_HEADER
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from flask import Flask
+
+SYNTHETIC_WORDS = (
+    "history science film music river city war king island football election novel "
+    "church species painter village company railway university album mountain "
+    "battle poet team station school bridge language opera dynasty"
+).split()
+
+
+class _SyntheticCollection:
+    def __init__(self, size: int) -> None:
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, pid: int) -> str:
+        words = " ".join(SYNTHETIC_WORDS[(pid + step) % len(SYNTHETIC_WORDS)] for step in range(40))
+        return f"Synthetic passage {pid} | {words}"
+
+
+class _SyntheticRanker:
+    def __init__(self, num_passages: int, search_ms: float) -> None:
+        self.num_passages = num_passages
+        self.search_ms = search_ms
+
+    def retrieve(self, config, Q):
+        (query,) = Q
+        seed = zlib.crc32(query.encode())
+        candidates = [(seed + step * 7919) % self.num_passages for step in range(config.ndocs)]
+        return list(dict.fromkeys(candidates)), None
+
+    def score_pids(self, config, Q, pids, centroid_scores):
+        time.sleep(self.search_ms / 1000.0)
+        return [30.0 - 0.01 * idx for idx in range(len(pids))], pids
+
+    def rank(self, config, Q, filter_fn=None, pids=None):
+        if pids is None:
+            candidates, centroid_scores = self.retrieve(config, Q)
+        else:
+            candidates, centroid_scores = list(pids), None
+        if filter_fn is not None:
+            candidates = list(filter_fn(candidates))
+        scores, candidates = self.score_pids(config, Q, candidates, centroid_scores)
+        return candidates, scores
+
+
+class SyntheticSearcher:
+    """
+    Stand-in for ``colbert.Searcher`` with configurable encoder and ranking costs.
+
+    It follows the ``Searcher``/``IndexScorer`` call structure the server relies on, so the
+    HTTP, caching and serialization layers can be benchmarked without torch or an index.
+    """
+
+    def __init__(
+        self,
+        num_passages: int = 100_000,
+        *,
+        encode_ms: float = 5.0,
+        encode_ms_per_query: float = 1.0,
+        search_ms: float = 10.0,
+    ) -> None:
+        self.collection = _SyntheticCollection(num_passages)
+        self.config = SimpleNamespace(ncells=None, centroid_score_threshold=None, ndocs=None)
+        self.ranker = _SyntheticRanker(num_passages, search_ms)
+        self.encode_ms = encode_ms
+        self.encode_ms_per_query = encode_ms_per_query
+
+    def encode(self, text, full_length_search=False):
+        queries = text if type(text) is list else [text]
+        time.sleep((self.encode_ms + self.encode_ms_per_query * len(queries)) / 1000.0)
+        return list(queries)
+
+
+def load_queries(path: Path) -> list[str]:
+    """Read one query per line (a TSV's last column is used), skipping blank lines."""
+    queries = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        query = line.rsplit("\t", 1)[-1].strip()
+        if query:
+            queries.append(query)
+    return queries
+
+
+def synthetic_queries(count: int, *, distinct: int, seed: int = 0) -> list[str]:
+    """Generate ``count`` queries drawn Zipf-like from ``distinct`` phrases, like real traffic."""
+    rng = random.Random(seed)
+    phrases = [
+        " ".join(rng.choice(SYNTHETIC_WORDS) for _ in range(rng.randint(2, 5))) + f" {idx}"
+        for idx in range(distinct)
+    ]
+    weights = [1.0 / (rank + 1) for rank in range(distinct)]
+    return rng.choices(phrases, weights=weights, k=count)
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list[float]) -> dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+    }
+
+
+class _Client(threading.local):
+    """One keep-alive connection per benchmark thread."""
+
+    def __init__(self, host: str, port: int, timeout: float) -> None:
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+
+def run_bench(
+    base_url: str,
+    queries: Iterable[str],
+    *,
+    k: int = 10,
+    concurrency: int = 8,
+    qps: float | None = None,
+    timeout: float = 30.0,
+) -> dict[str, object]:
+    """
+    Replay ``queries`` against ``base_url`` and report throughput and latency percentiles.
+
+    Without ``qps`` the load is closed-loop: ``concurrency`` clients send back-to-back
+    requests. With ``qps``, requests are issued on a fixed schedule and latency is measured
+    from the scheduled start, so a saturated server cannot hide queueing delay. Latencies
+    are split by the server's ``X-Cache`` header into cache hits and misses.
+    """
+    parsed = urllib.parse.urlsplit(base_url)
+    client = _Client(parsed.hostname or "127.0.0.1", parsed.port or 80, timeout)
+    prefix = parsed.path.rstrip("/")
+    queries = list(queries)
+    results: dict[str, list[float]] = {"hit": [], "miss": []}
+    errors = 0
+    lock = threading.Lock()
+
+    def send(query: str, scheduled: float | None) -> None:
+        nonlocal errors
+        started = scheduled if scheduled is not None else time.perf_counter()
+        path = f"{prefix}/api/search?" + urllib.parse.urlencode({"query": query, "k": k})
+        try:
+            client.connection.request("GET", path)
+            response = client.connection.getresponse()
+            response.read()
+            ok = response.status == 200
+            status = response.headers.get(CACHE_STATUS_HEADER, "miss")
+        except (OSError, http.client.HTTPException):
+            client.connection.close()
+            ok, status = False, "miss"
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                results["hit" if status == "hit" else "miss"].append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        if qps:
+            interval = 1.0 / qps
+            for idx, query in enumerate(queries):
+                scheduled = started + idx * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, query, scheduled)
+        else:
+            list(pool.map(lambda query: send(query, None), queries))
+    duration = time.perf_counter() - started
+
+    completed = len(results["hit"]) + len(results["miss"])
+    return {
+        "requests": len(queries),
+        "errors": errors,
+        "duration_s": duration,
+        "throughput_qps": completed / duration if duration else 0.0,
+        "all": summarize(results["hit"] + results["miss"]),
+        "hit": summarize(results["hit"]),
+        "miss": summarize(results["miss"]),
+    }
+
+
+def serve_in_background(app: Flask, *, threads: int) -> tuple[str, Callable[[], None]]:
+    """Start ``app`` on an ephemeral local port; return its URL and a stop callback."""
+    from .serving import PooledWSGIServer
+
+    httpd = PooledWSGIServer("127.0.0.1", 0, app, threads=threads)
+    thread = threading.Thread(target=httpd.serve_forever, name="colbert-bench-server", daemon=True)
+    thread.start()
+
+    def stop() -> None:
+        httpd.shutdown()
+        httpd.server_close()
+
+    return f"http://127.0.0.1:{httpd.port}", stop
+
+
+def format_report(report: dict[str, object]) -> str:
+    lines = [
+        f"requests: {report['requests']}  errors: {report['errors']}  "
+        f"duration: {report['duration_s']:.2f}s  throughput: {report['throughput_qps']:.1f} req/s",
+        f"{'':<6}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for group in ("all", "hit", "miss"):
+        stats = report[group]
+        lines.append(
+            f"{group:<6}{stats['count']:>8}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+            f"{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def dump_report(report: dict[str, object]) -> str:
+    return json.dumps(report, indent=2, sort_keys=True)
@@ -0,0 +1,404 @@
+from __future__ import annotations
+
+from array import array
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future
+import json
+import os
+from pathlib import Path
+import sqlite3
+import sys
+import threading
+import time
+from typing import NamedTuple
+import unicodedata
+
+DEFAULT_CACHE_MAX_MB = 512.0
+DEFAULT_ENCODING_CACHE_SIZE = 1024
+
+# Rough per-entry bookkeeping cost (OrderedDict node, entry tuple, timestamps).
+_ENTRY_OVERHEAD_BYTES = 160
+
+
+def normalize_query(query: str) -> str:
+    """Fold case, Unicode compatibility forms, and whitespace so equivalent queries share a key."""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+class CachedResult(NamedTuple):
+    """
+    Compact ranked result: parallel pid/score arrays without rendered passage text.
+
+    ``depth`` is the ``k`` the search ran with, so the entry can answer any smaller ``k``.
+    """
+
+    pids: array
+    scores: array
+    depth: int
+
+    @classmethod
+    def from_lists(cls, pids, scores, depth: int | None = None) -> CachedResult:
+        pids = array("q", pids)
+        return cls(pids, array("d", scores), len(pids) if depth is None else depth)
+
+    def covers(self, k: int) -> bool:
+        """Whether the top-``k`` can be cut from this entry (or the index has fewer hits)."""
+        return k <= self.depth or len(self.pids) < self.depth
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.pids) + sys.getsizeof(self.scores)
+
+
+class _Entry(NamedTuple):
+    result: CachedResult
+    size: int
+    expires_at: float | None
+
+
+def _key_size(key: Hashable) -> int:
+    if isinstance(key, tuple):
+        return sys.getsizeof(key) + sum(sys.getsizeof(part) for part in key)
+    return sys.getsizeof(key)
+
+
+def _store_key(key: Hashable) -> str:
+    if isinstance(key, str):
+        return key
+    return json.dumps(key, separators=(",", ":"), ensure_ascii=False)
+
+
+class SQLiteCacheStore:
+    """
+    On-disk result store shared by every process on a host.
+
+    Rows are scoped by ``namespace`` (an index/checkpoint fingerprint), so results computed
+    against a different index are never served. The database runs in WAL mode, letting
+    concurrent workers read while one of them writes. Failures are treated as misses: the
+    store only ever speeds things up.
+    """
+
+    def __init__(
+        self, path: str | Path, *, namespace: str, ttl_seconds: float | None = None
+    ) -> None:
+        self.path = Path(path)
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self._local = threading.local()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " namespace TEXT NOT NULL,"
+                " query TEXT NOT NULL,"
+                " depth INTEGER NOT NULL,"
+                " pids BLOB NOT NULL,"
+                " scores BLOB NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, query)"
+                ") WITHOUT ROWID"
+            )
+            if self.ttl_seconds:
+                connection.execute(
+                    "DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                )
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross threads or fork() boundaries.
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def get(self, key: Hashable) -> CachedResult | None:
+        try:
+            row = (
+                self._connection()
+                .execute(
+                    "SELECT depth, pids, scores, created_at FROM results "
+                    "WHERE namespace = ? AND query = ?",
+                    (self.namespace, _store_key(key)),
+                )
+                .fetchone()
+            )
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        depth, pids_blob, scores_blob, created_at = row
+        if self.ttl_seconds and created_at + self.ttl_seconds <= time.time():
+            return None
+        pids, scores = array("q"), array("d")
+        pids.frombytes(pids_blob)
+        scores.frombytes(scores_blob)
+        return CachedResult(pids, scores, depth)
+
+    def put(self, key: Hashable, result: CachedResult) -> None:
+        try:
+            self._connection().execute(
+                "INSERT INTO results (namespace, query, depth, pids, scores, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, query) DO UPDATE SET "
+                " depth = excluded.depth, pids = excluded.pids, scores = excluded.scores,"
+                " created_at = excluded.created_at "
+                "WHERE excluded.depth >= results.depth",
+                (
+                    self.namespace,
+                    _store_key(key),
+                    result.depth,
+                    result.pids.tobytes(),
+                    result.scores.tobytes(),
+                    time.time(),
+                ),
+            )
+        except sqlite3.Error:
+            pass
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of search results bounded by entry count and approximate bytes.
+
+    Entries optionally expire ``ttl_seconds`` after insertion. When a persistent ``store``
+    is given, memory misses fall back to it and every insertion is written through, so the
+    cache survives restarts and is shared between workers. Hit, miss, eviction and
+    expiration counters are available through :meth:`stats`.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        ttl_seconds: float | None = None,
+        store: SQLiteCacheStore | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.store = store
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.store_hits = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, k: int | None = None) -> CachedResult | None:
+        """
+        Return the entry for ``key``, or ``None`` on a miss.
+
+        When ``k`` is given, entries searched too shallowly to serve the top-``k`` count as
+        misses; they stay cached until replaced by a deeper search.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None:
+                if entry.expires_at <= self._clock():
+                    self._remove(key)
+                    self.expirations += 1
+                    entry = None
+            if entry is not None and k is not None and not entry.result.covers(k):
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.result
+
+        stored = self.store.get(key) if self.store is not None else None
+        if stored is None or (k is not None and not stored.covers(k)):
+            with self._lock:
+                self.misses += 1
+            return None
+        self._insert(key, stored)
+        with self._lock:
+            self.hits += 1
+            self.store_hits += 1
+        return stored
+
+    def put(self, key: Hashable, result: CachedResult) -> None:
+        self._insert(key, result)
+        if self.store is not None:
+            self.store.put(key, result)
+
+    def _insert(self, key: Hashable, result: CachedResult) -> None:
+        size = _key_size(key) + result.nbytes() + _ENTRY_OVERHEAD_BYTES
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        if self.max_entries is not None and self.max_entries <= 0:
+            return
+        expires_at = self._clock() + self.ttl_seconds if self.ttl_seconds else None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(result, size, expires_at)
+            self._bytes += size
+            while self._over_budget():
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every in-memory entry; the persistent store is left untouched."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "store_hits": self.store_hits,
+                "store_path": str(self.store.path) if self.store is not None else None,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _over_budget(self) -> bool:
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+
+class EncodingCache:
+    """
+    Thread-safe LRU of query encodings keyed by normalized query.
+
+    Searchers that share one checkpoint produce the same encoding for a query, so a query
+    sent to several indexes is encoded once while it stays among the ``max_entries`` most
+    recently used.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_ENCODING_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, object] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query: str) -> object | None:
+        with self._lock:
+            encoding = self._entries.get(query)
+            if encoding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(query)
+            self.hits += 1
+            return encoding
+
+    def put(self, query: str, encoding: object) -> None:
+        with self._lock:
+            self._entries[query] = encoding
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses}
+
+
+class SingleFlight:
+    """
+    Collapse concurrent computations of the same key into one.
+
+    The first caller to :meth:`claim` a key becomes its leader and must :meth:`resolve` it;
+    callers that claim the key while it is in flight get the leader's future and wait on it
+    instead of repeating the work. Keys are forgotten once resolved, so this coordinates
+    in-flight work only and never caches.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def claim(self, key: Hashable) -> tuple[Future, bool]:
+        """Return the future for ``key`` and whether the caller leads its computation."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.followers += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def resolve(
+        self, key: Hashable, result: object = None, exc: BaseException | None = None
+    ) -> None:
+        """Publish a leader's result (or exception) to its followers and release the key."""
+        with self._lock:
+            future = self._calls.pop(key)
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def do(
+        self,
+        key: Hashable,
+        compute: Callable[[], object],
+        *,
+        retry: tuple[type[BaseException], ...] = (),
+    ) -> tuple[object, bool]:
+        """
+        Run ``compute`` once per in-flight ``key``; return ``(result, shared)``.
+
+        A follower whose leader failed with one of the ``retry`` exceptions (a failure of
+        the leader's request rather than of the key) claims the key again instead of
+        sharing that failure.
+        """
+        while True:
+            future, leader = self.claim(key)
+            if leader:
+                break
+            try:
+                return future.result(), True
+            except retry:
+                continue
+        try:
+            result = compute()
+        except BaseException as exc:
+            self.resolve(key, exc=exc)
+            raise
+        self.resolve(key, result)
+        return result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> dict[str, int]:
+        return {"leaders": self.leaders, "followers": self.followers, "in_flight": self.in_flight()}
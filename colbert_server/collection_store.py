@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterator
+import mmap
+import os
+from pathlib import Path
+import struct
+import sys
+
+from .data import DatasetLayoutError
+
+STORE_MAGIC = b"CBCOLL02"
+STORE_SUFFIX = ".cstore"
+# magic, passage count, byte offset of the offsets table, source TSV size and mtime (ns)
+_HEADER = struct.Struct("<8sQQQq")
+
+
+def default_store_path(collection_path: Path) -> Path:
+    """Return the store path that sits next to ``collection_path`` (``collection.cstore``)."""
+    return Path(collection_path).with_suffix(STORE_SUFFIX)
+
+
+def _source_stamp(collection_path: Path) -> tuple[int, int]:
+    stat = Path(collection_path).stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def store_is_current(store_path: Path, collection_path: Path) -> bool:
+    """Whether the store at ``store_path`` was built from ``collection_path`` as it is now."""
+    try:
+        with Path(store_path).open("rb") as handle:
+            magic, _, _, size, mtime_ns = _HEADER.unpack(handle.read(_HEADER.size))
+    except (OSError, struct.error):
+        return False
+    if magic != STORE_MAGIC:
+        return False
+    try:
+        return _source_stamp(collection_path) == (size, mtime_ns)
+    except OSError:
+        # Without the TSV there is nothing for the store to be stale against.
+        return True
+
+
+def _parse_line(line: str, line_idx: int) -> str:
+    # Mirrors colbert.evaluation.loaders.load_collection so pids and texts line up exactly.
+    pid, passage, *rest = line.strip("\n\r ").split("\t")
+    if pid != "id" and int(pid) != line_idx:
+        raise DatasetLayoutError(
+            f"Collection pid {pid} on line {line_idx + 1} does not match its line number."
+        )
+    if rest:
+        passage = f"{rest[0]} | {passage}"
+    return passage
+
+
+def build_collection_store(collection_path: Path, output_path: Path | None = None) -> Path:
+    """
+    Convert a ColBERT collection TSV into a memory-mappable passage store.
+
+    The file holds a small header (including the TSV's size and mtime, see
+    :func:`store_is_current`), every passage as UTF-8 back to back, and a trailing
+    ``uint64`` offsets table indexed by pid. The store is written to a temporary file and
+    moved into place, so readers never observe a partial build. Returns the store path.
+    """
+    collection_path = Path(collection_path)
+    output_path = Path(output_path) if output_path else default_store_path(collection_path)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    source_size, source_mtime_ns = _source_stamp(collection_path)
+
+    offsets = array("Q", [0])
+    try:
+        with (
+            collection_path.open(encoding="utf-8") as source,
+            tmp_path.open("wb") as target,
+        ):
+            target.write(_HEADER.pack(STORE_MAGIC, 0, 0, 0, 0))
+            position = 0
+            for line_idx, line in enumerate(source):
+                encoded = _parse_line(line, line_idx).encode("utf-8")
+                target.write(encoded)
+                position += len(encoded)
+                offsets.append(position)
+
+            table_offset = _HEADER.size + position
+            if sys.byteorder != "little":
+                offsets.byteswap()
+            offsets.tofile(target)
+            target.seek(0)
+            target.write(
+                _HEADER.pack(
+                    STORE_MAGIC, len(offsets) - 1, table_offset, source_size, source_mtime_ns
+                )
+            )
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class CollectionStore:
+    """
+    Read-only, memory-mapped passage store built by :func:`build_collection_store`.
+
+    Opening the store only maps the file, so startup cost does not depend on collection
+    size, and forked workers share the same page cache instead of private string copies.
+    Supports ``store[pid]``, ``len(store)`` and iteration like ``colbert.data.Collection``.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        with self.path.open("rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count, table_offset, _, _ = _HEADER.unpack_from(self._mmap)
+        if magic != STORE_MAGIC:
+            if magic.startswith(STORE_MAGIC[:6]):
+                raise DatasetLayoutError(
+                    f"{self.path} was built by an older colbert-server. Rebuild it with "
+                    "`colbert-server build-collection-store`."
+                )
+            raise DatasetLayoutError(f"{self.path} is not a colbert-server collection store.")
+        self._count = count
+        view = memoryview(self._mmap)
+        self._blob = view[_HEADER.size : table_offset]
+        table = view[table_offset : table_offset + 8 * (count + 1)]
+        if sys.byteorder == "little":
+            self._offsets = table.cast("Q")
+        else:  # pragma: no cover - big-endian hosts pay for one copy of the table
+            self._offsets = array("Q", table.tobytes())
+            self._offsets.byteswap()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, pid: int) -> str:
+        if not 0 <= pid < self._count:
+            raise IndexError(f"pid {pid} is out of range for a collection of {self._count}.")
+        return str(self._blob[self._offsets[pid] : self._offsets[pid + 1]], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[pid] for pid in range(self._count))
+
+    def provenance(self) -> str:
+        return str(self.path)
@@ -1,7 +1,13 @@
 from __future__ import annotations
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import os
 from pathlib import Path
 import shutil
+import tarfile
+import zipfile
 
 from huggingface_hub import snapshot_download
 
@@ -13,6 +19,8 @@ SUPPORTED_ARCHIVE_SUFFIXES = {
     suffix for _, suffixes, _ in shutil.get_unpack_formats() for suffix in suffixes
 }
 SUPPORTED_ARCHIVE_SUFFIXES_LOWER = tuple(suffix.lower() for suffix in SUPPORTED_ARCHIVE_SUFFIXES)
+EXTRACT_MANIFEST_FILENAME = ".colbert-server-extracted.json"
+_EXTRACT_CHUNK_BYTES = 1 << 20
 
 
 class DatasetLayoutError(RuntimeError):
@@ -92,10 +100,136 @@ def download_collection_and_indexes(
     return Path(snapshot_path)
 
 
-def extract_archives(snapshot_path: Path, extract_to: Path) -> Path:
+def _archive_stamp(archive: Path) -> dict[str, int]:
+    stat = archive.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _extraction_target(extract_to: Path, name: str) -> Path:
+    target = (extract_to / name).resolve()
+    if not target.is_relative_to(extract_to.resolve()):
+        raise DatasetLayoutError(
+            f"Archive member {name!r} would be extracted outside {extract_to}."
+        )
+    return target
+
+
+def _write_member(source, target: Path) -> dict[str, object]:
+    """Stream ``source`` into ``target`` (via a ``.part`` file), hashing it on the way."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_name(target.name + ".part")
+    digest = hashlib.sha256()
+    size = 0
+    with partial.open("wb") as handle:
+        while chunk := source.read(_EXTRACT_CHUNK_BYTES):
+            digest.update(chunk)
+            handle.write(chunk)
+            size += len(chunk)
+    os.replace(partial, target)
+    return {"size": size, "sha256": digest.hexdigest()}
+
+
+def _extract_archive(archive: str, extract_to: str) -> list[dict[str, object]]:
+    """
+    Extract one archive member by member, returning a manifest entry per regular file.
+
+    Tar archives are read as a stream (``r|*``), so compressed ones are decompressed in one
+    sequential pass without seeking. Runs in a worker process of :func:`extract_archives`.
+    """
+    archive_path, destination = Path(archive), Path(extract_to)
+    files = []
+    try:
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as bundle:
+                for info in bundle.infolist():
+                    target = _extraction_target(destination, info.filename)
+                    if info.is_dir():
+                        target.mkdir(parents=True, exist_ok=True)
+                        continue
+                    with bundle.open(info) as source:
+                        entry = _write_member(source, target)
+                    files.append({"path": info.filename, **entry})
+            return files
+
+        with tarfile.open(archive_path, "r|*") as bundle:
+            for member in bundle:
+                member = tarfile.data_filter(member, str(destination))
+                if not member.isfile():
+                    bundle.extract(member, destination, filter="data")
+                    continue
+                target = _extraction_target(destination, member.name)
+                entry = _write_member(bundle.extractfile(member), target)
+                if member.mode is not None:
+                    os.chmod(target, member.mode)
+                if member.mtime is not None:
+                    os.utime(target, (member.mtime, member.mtime))
+                files.append({"path": member.name, **entry})
+    except (tarfile.TarError, zipfile.BadZipFile, OSError, EOFError) as err:
+        raise DatasetLayoutError(f"Failed to extract archive {archive_path.name}: {err}") from err
+    return files
+
+
+def _is_extracted(record: object, archive: Path, extract_to: Path, verify: bool = False) -> bool:
+    """
+    Whether a manifest ``record`` covers this exact archive and its files are all present.
+
+    Files are compared by size; with ``verify`` their SHA-256 must match as well.
+    """
+    if not isinstance(record, dict) or record.get("archive") != _archive_stamp(archive):
+        return False
+    for entry in record.get("files", []):
+        path = extract_to / entry["path"]
+        if not path.is_file() or path.stat().st_size != entry["size"]:
+            return False
+        if verify:
+            with path.open("rb") as handle:
+                if hashlib.file_digest(handle, "sha256").hexdigest() != entry["sha256"]:
+                    return False
+    return True
+
+
+def _remove_partial_files(extract_to: Path, manifest: dict[str, dict]) -> None:
+    """Delete ``.part`` files an interrupted extraction left behind."""
+    recorded = {
+        entry["path"]
+        for record in manifest.values()
+        if isinstance(record, dict)
+        for entry in record.get("files", [])
+    }
+    for partial in extract_to.rglob("*.part"):
+        if partial.is_file() and partial.relative_to(extract_to).as_posix() not in recorded:
+            partial.unlink(missing_ok=True)
+
+
+def load_extract_manifest(extract_to: Path) -> dict[str, dict]:
+    """Read the manifest written by :func:`extract_archives`, or ``{}`` if there is none."""
+    try:
+        manifest = json.loads((Path(extract_to) / EXTRACT_MANIFEST_FILENAME).read_text())
+    except (OSError, ValueError):
+        return {}
+    return manifest.get("archives", {}) if isinstance(manifest, dict) else {}
+
+
+def _write_extract_manifest(extract_to: Path, archives: dict[str, dict]) -> None:
+    path = extract_to / EXTRACT_MANIFEST_FILENAME
+    partial = path.with_name(path.name + ".part")
+    partial.write_text(json.dumps({"archives": archives}, indent=1, sort_keys=True))
+    os.replace(partial, path)
+
+
+def extract_archives(
+    snapshot_path: Path, extract_to: Path, *, jobs: int | None = None, verify: bool = False
+) -> Path:
     """
     Extract every archive found in ``snapshot_path/archives`` into ``extract_to``.
 
+    Archives are extracted in parallel by up to ``jobs`` processes (default: one per CPU).
+    Each extracted file is recorded with its size and SHA-256 in a manifest
+    (:data:`EXTRACT_MANIFEST_FILENAME`) as soon as its archive finishes, and archives whose
+    recorded files are all still present with their recorded sizes are skipped, so an
+    interrupted run resumes where it stopped (after deleting its ``.part`` files). With
+    ``verify`` the skipped files must also match their recorded SHA-256.
+
     Returns the extraction directory.
     """
     snapshot_path = Path(snapshot_path)
@@ -108,7 +242,7 @@ def extract_archives(snapshot_path: Path, extract_to: Path) -> Path:
         )
 
     extract_to.mkdir(parents=True, exist_ok=True)
-    extracted_any = False
+    archives = []
     for archive in sorted(archives_root.glob("*")):
         if not archive.is_file():
             continue
@@ -117,17 +251,47 @@ def extract_archives(snapshot_path: Path, extract_to: Path) -> Path:
         ):
             # Skip files that do not look like archives.
             continue
-        try:
-            shutil.unpack_archive(str(archive), str(extract_to))
-            extracted_any = True
-        except (shutil.ReadError, ValueError) as err:
-            raise DatasetLayoutError(f"Failed to extract archive {archive.name}: {err}") from err
+        archives.append(archive)
 
-    if not extracted_any:
+    if not archives:
         raise DatasetLayoutError(
             f"No archives were extracted from {archives_root}. Is the folder empty?"
         )
 
+    manifest = load_extract_manifest(extract_to)
+    pending = [
+        archive
+        for archive in archives
+        if not _is_extracted(manifest.get(archive.name), archive, extract_to, verify)
+    ]
+    if not pending:
+        return extract_to
+    _remove_partial_files(extract_to, manifest)
+
+    def record(archive: Path, files: list[dict[str, object]]) -> None:
+        manifest[archive.name] = {"archive": _archive_stamp(archive), "files": files}
+        _write_extract_manifest(extract_to, manifest)
+
+    jobs = min(len(pending), jobs or os.cpu_count() or 1)
+    if jobs == 1:
+        for archive in pending:
+            record(archive, _extract_archive(str(archive), str(extract_to)))
+        return extract_to
+
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = {
+            pool.submit(_extract_archive, str(archive), str(extract_to)): archive
+            for archive in pending
+        }
+        # Record finished archives even when another fails, so a rerun skips them.
+        failures = []
+        for future in as_completed(futures):
+            try:
+                record(futures[future], future.result())
+            except DatasetLayoutError as err:
+                failures.append(err)
+    if failures:
+        raise failures[0]
     return extract_to
 
 
@@ -164,16 +328,7 @@ def locate_dataset_root(root: Path) -> Path:
     )
 
 
-def detect_dataset_paths(
-    base_path: Path, *, preferred_index_name: str | None = None
-) -> tuple[Path, str, Path | None]:
-    """
-    Inspect ``base_path`` to determine the index root, index name, and collection path.
-
-    Returns a tuple ``(index_root, index_name, collection_path)`` where ``collection_path``
-    may be ``None`` if it could not be inferred automatically.
-    """
-    dataset_root = locate_dataset_root(base_path)
+def _candidate_indexes(dataset_root: Path) -> tuple[Path, list[Path]]:
     indexes_dir = dataset_root / INDEXES_DIRNAME
 
     if indexes_dir.exists():
@@ -191,6 +346,20 @@ def detect_dataset_paths(
             "If you extracted the archives manually, ensure you pointed --index-root to the dir "
             "containing the ColBERT index."
         )
+    return indexes_root, candidate_indexes
+
+
+def detect_dataset_paths(
+    base_path: Path, *, preferred_index_name: str | None = None
+) -> tuple[Path, str, Path | None]:
+    """
+    Inspect ``base_path`` to determine the index root, index name, and collection path.
+
+    Returns a tuple ``(index_root, index_name, collection_path)`` where ``collection_path``
+    may be ``None`` if it could not be inferred automatically.
+    """
+    dataset_root = locate_dataset_root(base_path)
+    indexes_root, candidate_indexes = _candidate_indexes(dataset_root)
 
     if preferred_index_name:
         target = indexes_root / preferred_index_name
@@ -200,13 +369,11 @@ def detect_dataset_paths(
             )
         index_name = preferred_index_name
     else:
-        if not candidate_indexes:
-            raise DatasetLayoutError(f"No index directories were found under {indexes_root}.")
         if len(candidate_indexes) > 1:
             options = ", ".join(sorted(p.name for p in candidate_indexes))
             raise DatasetLayoutError(
-                "Multiple index directories detected. Please supply --index-name. "
-                f"Available options: {options}"
+                "Multiple index directories detected. Please supply --index-name "
+                f"(or --all-indexes). Available options: {options}"
             )
         index_name = candidate_indexes[0].name
 
@@ -214,6 +381,22 @@ def detect_dataset_paths(
     return indexes_root, index_name, collection_path
 
 
+def detect_all_dataset_paths(base_path: Path) -> tuple[Path, list[str], Path | None]:
+    """Like :func:`detect_dataset_paths`, but return every index name (sorted) under the root."""
+    dataset_root = locate_dataset_root(base_path)
+    indexes_root, candidate_indexes = _candidate_indexes(dataset_root)
+    index_names = sorted(p.name for p in candidate_indexes)
+    return indexes_root, index_names, infer_collection_path(dataset_root)
+
+
+def list_index_names(index_root: Path) -> list[str]:
+    """Names of the ColBERT index directories directly under ``index_root``, sorted."""
+    index_root = Path(index_root)
+    if not index_root.is_dir():
+        return []
+    return sorted(p.name for p in index_root.iterdir() if _looks_like_index_dir(p))
+
+
 def infer_collection_path(dataset_root: Path) -> Path | None:
     """Attempt to infer the collection file path from the dataset root."""
     dataset_root = Path(dataset_root)
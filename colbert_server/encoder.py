@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
+
+from .server import DEFAULT_K, search_batch
+from .serving import ServerUnavailableError
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from colbert import Searcher
+
+ENCODER_BACKENDS = ("eager", "int8", "compiled")
+DEFAULT_ENCODER_CHECK_QUERIES = 32
+DEFAULT_ENCODER_MIN_OVERLAP = 0.9
+
+
+def apply_encoder_backend(searcher: Searcher, backend: str) -> None:
+    """
+    Switch the query encoder of a loaded ``searcher`` to ``backend``.
+
+    ``int8`` applies torch dynamic quantization to every ``nn.Linear`` of the checkpoint
+    (BERT layers and the ColBERT projection) in place; it runs on CPU only. ``compiled``
+    wraps the BERT model in ``torch.compile``. Either backend encodes one query before
+    returning, so compilation and unsupported builds surface at startup rather than on the
+    first request. ``eager`` leaves the checkpoint untouched.
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}; use one of {ENCODER_BACKENDS}.")
+    if backend == "eager":
+        return
+
+    import torch  # Import lazily; the searcher has already loaded it
+
+    model = searcher.checkpoint.model
+    try:
+        if backend == "int8":
+            if any(parameter.is_cuda for parameter in model.parameters()):
+                raise ServerUnavailableError("The int8 encoder backend runs on CPU only.")
+            torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+        else:
+            # ``HF_ColBERT.LM`` is a read-only property over ``base_model_prefix``.
+            setattr(model, model.base_model_prefix, torch.compile(model.LM, dynamic=True))
+        searcher.encode(["encoder backend check"])
+    except ServerUnavailableError:
+        raise
+    except Exception as exc:
+        raise ServerUnavailableError(
+            f"The {backend} encoder backend is not supported by this torch build: {exc}"
+        ) from exc
+
+
+def topk_overlap(reference: Sequence[Sequence[int]], candidate: Sequence[Sequence[int]]) -> float:
+    """Mean fraction of each reference top-k list that also appears in the candidate list."""
+    fractions = [
+        len(set(expected) & set(actual)) / len(expected)
+        for expected, actual in zip(reference, candidate)
+        if expected
+    ]
+    return sum(fractions) / len(fractions) if fractions else 1.0
+
+
+def check_encoder_backend(
+    searcher: Searcher, backend: str, queries: Sequence[str], *, k: int = DEFAULT_K
+) -> float:
+    """
+    Apply ``backend`` to ``searcher`` and return its top-``k`` overlap with the eager encoder.
+
+    ``queries`` are searched once before and once after the switch with the same search
+    settings, so the overlap only reflects the change in query embeddings.
+    """
+    reference = [pids for pids, _, _ in search_batch(searcher, queries, k)]
+    apply_encoder_backend(searcher, backend)
+    candidate = [pids for pids, _, _ in search_batch(searcher, queries, k)]
+    return topk_overlap(reference, candidate)
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+import os
+from pathlib import Path
+import re
+import struct
+import zlib
+
+from .collection_store import _parse_line
+from .data import DatasetLayoutError
+
+FILTER_MAGIC = b"CBFILT01"
+FILTER_SUFFIX = ".filter"
+FILTERS_DIRNAME = "filters"
+FILTER_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+# magic, passage count, number of pids in the filter
+_HEADER = struct.Struct("<8sQQ")
+
+
+def filters_dir(index_root: str | Path, index_name: str) -> Path:
+    """Directory next to the index where named pid filters are stored."""
+    return Path(index_root) / index_name / FILTERS_DIRNAME
+
+
+class PidFilter:
+    """
+    Named, immutable set of pids stored as a bitmap (bit ``pid % 8`` of byte ``pid // 8``).
+
+    Instances are usable as ColBERT's ``filter_fn``: called with the candidate pid tensor
+    from ``IndexScorer.rank`` they return the allowed candidates with the same dtype and
+    device. Plain pid sequences are filtered into lists.
+    """
+
+    def __init__(self, name: str, bits: bytes, num_passages: int, count: int | None = None):
+        self.name = name
+        self.bits = bytes(bits)
+        self.num_passages = num_passages
+        self.count = count if count is not None else sum(byte.bit_count() for byte in self.bits)
+        self.key = f"{name}#{zlib.crc32(self.bits):08x}"
+        self._pids: list[int] | None = None
+        self._tensors: dict[object, object] = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, pid: int) -> bool:
+        return 0 <= pid < self.num_passages and bool(self.bits[pid >> 3] >> (pid & 7) & 1)
+
+    def pids(self) -> list[int]:
+        """Every pid in the filter, in ascending order (computed once)."""
+        if self._pids is None:
+            self._pids = [
+                (offset << 3) + bit
+                for offset, byte in enumerate(self.bits)
+                if byte
+                for bit in range(8)
+                if byte >> bit & 1
+            ]
+        return self._pids
+
+    def __call__(self, pids):
+        if not hasattr(pids, "dtype"):
+            return [pid for pid in pids if pid in self]
+
+        import torch  # Import lazily; only reached from inside a ColBERT search
+
+        bits = self._tensors.get(pids.device)
+        if bits is None:
+            bits = torch.frombuffer(bytearray(self.bits), dtype=torch.uint8).to(pids.device)
+            self._tensors[pids.device] = bits
+        candidates = pids.long()
+        keep = (bits[candidates >> 3] >> (candidates & 7)) & 1
+        return pids[keep.bool()]
+
+    @classmethod
+    def from_pids(cls, name: str, pids: Iterable[int], num_passages: int) -> PidFilter:
+        bits = bytearray((num_passages + 7) // 8)
+        for pid in pids:
+            if not 0 <= pid < num_passages:
+                raise DatasetLayoutError(
+                    f"pid {pid} is outside the collection (0..{num_passages - 1})."
+                )
+            bits[pid >> 3] |= 1 << (pid & 7)
+        return cls(name, bits, num_passages)
+
+    @classmethod
+    def load(cls, path: str | Path) -> PidFilter:
+        path = Path(path)
+        data = path.read_bytes()
+        if len(data) < _HEADER.size:
+            raise DatasetLayoutError(f"{path} is not a pid filter file.")
+        magic, num_passages, count = _HEADER.unpack_from(data)
+        bits = data[_HEADER.size :]
+        if magic != FILTER_MAGIC or len(bits) != (num_passages + 7) // 8:
+            raise DatasetLayoutError(f"{path} is not a pid filter file.")
+        return cls(path.name.removesuffix(FILTER_SUFFIX), bits, num_passages, count)
+
+    def save(self, path: str | Path) -> Path:
+        """Write the filter atomically (temporary file, then rename)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            with tmp_path.open("wb") as target:
+                target.write(_HEADER.pack(FILTER_MAGIC, self.num_passages, self.count))
+                target.write(self.bits)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        os.replace(tmp_path, path)
+        return path
+
+
+def _title(passage: str) -> str:
+    # Collection passages render as "title | text" (see _parse_line).
+    return passage.split(" | ", 1)[0]
+
+
+def build_filter(
+    collection_path: str | Path,
+    name: str,
+    *,
+    title_prefixes: Iterable[str] = (),
+    pids: Iterable[int] = (),
+) -> PidFilter:
+    """
+    Build a named filter from a collection TSV in one pass.
+
+    A passage is included when its pid is listed in ``pids`` or its title starts with one
+    of ``title_prefixes`` (case-insensitive).
+    """
+    if not FILTER_NAME_PATTERN.match(name):
+        raise DatasetLayoutError(
+            f"Invalid filter name {name!r}; use letters, digits, '.', '_' and '-'."
+        )
+    prefixes = tuple(prefix.casefold() for prefix in title_prefixes)
+    selected = set(pids)
+    num_passages = 0
+    with Path(collection_path).open(encoding="utf-8") as source:
+        for line_idx, line in enumerate(source):
+            num_passages += 1
+            if prefixes and _title(_parse_line(line, line_idx)).casefold().startswith(prefixes):
+                selected.add(line_idx)
+    return PidFilter.from_pids(name, selected, num_passages)
+
+
+def load_filters(directory: str | Path) -> dict[str, PidFilter]:
+    """Load every ``*.filter`` file in ``directory`` keyed by name; empty if it is missing."""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return {}
+    return {
+        pid_filter.name: pid_filter
+        for pid_filter in map(PidFilter.load, sorted(directory.glob(f"*{FILTER_SUFFIX}")))
+    }
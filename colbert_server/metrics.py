@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+import functools
+import math
+import threading
+import time
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Search stages, in pipeline order.
+STAGE_ENCODE = "query_encoding"
+STAGE_CANDIDATES = "candidate_generation"
+STAGE_RANKING = "decompression_maxsim"
+STAGE_TEXT = "text_fetch"
+STAGE_SERIALIZE = "serialization"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._label_values(labels)] = value
+
+
+class CallbackMetric(_Metric):
+    """Metric whose unlabelled value is read from ``callback`` at scrape time."""
+
+    def __init__(
+        self, name: str, documentation: str, callback: Callable[[], float], kind: str = "gauge"
+    ) -> None:
+        super().__init__(name, documentation)
+        self.kind = kind
+        self.callback = callback
+
+    def samples(self) -> list[str]:
+        return [f"{self.name} {_format_value(self.callback())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            series = sorted(
+                (key, list(counts), total[0]) for key, (counts, total) in self._series.items()
+            )
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+
+    def register[M: _Metric](self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class ServerMetrics:
+    """Request, stage-latency, and saturation metrics exported at ``/metrics``."""
+
+    def __init__(self) -> None:
+        self.registry = MetricsRegistry()
+        self.requests = self.registry.register(
+            Counter(
+                "colbert_requests_total",
+                "HTTP requests served, by endpoint and status code.",
+                ("endpoint", "status"),
+            )
+        )
+        self.request_latency = self.registry.register(
+            Histogram(
+                "colbert_request_duration_seconds",
+                "End-to-end request latency, by endpoint.",
+                ("endpoint",),
+            )
+        )
+        self.stage_latency = self.registry.register(
+            Histogram(
+                "colbert_stage_duration_seconds",
+                "Latency of each search stage: query_encoding, candidate_generation, "
+                "decompression_maxsim, text_fetch and serialization.",
+                ("stage",),
+            )
+        )
+        self.in_flight = self.registry.register(
+            Gauge("colbert_requests_in_flight", "Requests currently being served.")
+        )
+
+    def add_callback(
+        self, name: str, documentation: str, callback: Callable[[], float], kind: str = "gauge"
+    ) -> None:
+        self.registry.register(CallbackMetric(name, documentation, callback, kind))
+
+    def time_stage(self, stage: str):
+        return self.stage_latency.time(stage=stage)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+def _timed(func: Callable, histogram: Histogram, stage: str) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with histogram.time(stage=stage):
+            return func(*args, **kwargs)
+
+    wrapper.__colbert_timed__ = True
+    return wrapper
+
+
+def instrument_searcher(searcher, metrics: ServerMetrics) -> None:
+    """
+    Time the encoder and both halves of PLAID ranking on ``searcher``.
+
+    ``IndexScorer.rank`` calls ``retrieve`` (centroid scoring and candidate generation) and
+    then ``score_pids`` (residual decompression and MaxSim), so wrapping those instance
+    attributes splits search latency by stage without re-implementing ColBERT's pipeline.
+    """
+    targets = [(searcher, "encode", STAGE_ENCODE)]
+    ranker = getattr(searcher, "ranker", None)
+    if ranker is not None:
+        targets += [(ranker, "retrieve", STAGE_CANDIDATES), (ranker, "score_pids", STAGE_RANKING)]
+
+    for owner, attribute, stage in targets:
+        method = getattr(owner, attribute, None)
+        if method is None or getattr(method, "__colbert_timed__", False):
+            continue
+        setattr(owner, attribute, _timed(method, metrics.stage_latency, stage))
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from collections import Counter
+from collections.abc import Iterable, Mapping
+import logging
+from logging.handlers import RotatingFileHandler
+import os
+from pathlib import Path
+import threading
+import time
+import urllib.parse
+
+DEFAULT_QUERY_LOG_MAX_MB = 64.0
+DEFAULT_QUERY_LOG_BACKUPS = 3
+DEFAULT_PREWARM_TOP = 1000
+
+# timestamp, latency in ms, k, cache status, request parameters, normalized query
+_FIELDS = 6
+
+
+class QueryLog:
+    """
+    Append-only, size-rotated log of served queries.
+
+    Each line is ``timestamp<TAB>latency_ms<TAB>k<TAB>cache<TAB>params<TAB>query`` with the
+    normalized query last (normalization collapses tabs and newlines, so lines always parse).
+    ``params`` is the URL-encoded index, filter and search settings the request named, empty
+    for a request that used the defaults, so a replay searches the same ranking. The file
+    handler is opened lazily per process, so prefork workers never share a file descriptor;
+    they append to the same file, and rotation across workers is best effort.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        max_bytes: int = int(DEFAULT_QUERY_LOG_MAX_MB * 1024 * 1024),
+        backups: int = DEFAULT_QUERY_LOG_BACKUPS,
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._handler: RotatingFileHandler | None = None
+        self._pid: int | None = None
+
+    def _writer(self) -> RotatingFileHandler:
+        pid = os.getpid()
+        if self._handler is None or self._pid != pid:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(
+                self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._handler, self._pid = handler, pid
+        return self._handler
+
+    def record(
+        self,
+        query: str,
+        *,
+        latency: float,
+        k: int,
+        cache_status: str,
+        params: Mapping[str, object] | None = None,
+    ) -> None:
+        encoded = urllib.parse.urlencode(sorted((params or {}).items()))
+        line = f"{time.time():.3f}\t{latency * 1000:.2f}\t{k}\t{cache_status}\t{encoded}\t{query}"
+        record = logging.makeLogRecord({"msg": line, "levelno": logging.INFO})
+        with self._lock:
+            self._writer().emit(record)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._handler is not None and self._pid == os.getpid():
+                self._handler.close()
+            self._handler = None
+
+
+def log_files(path: str | Path) -> list[Path]:
+    """Return ``path`` and its rotated backups (``path.1``, ``path.2``, ...), oldest last."""
+    path = Path(path)
+    backups = sorted(
+        (
+            candidate
+            for candidate in path.parent.glob(f"{path.name}.*")
+            if candidate.suffix[1:].isdigit()
+        ),
+        key=lambda candidate: int(candidate.suffix[1:]),
+    )
+    return [candidate for candidate in (path, *backups) if candidate.is_file()]
+
+
+def iter_logged_requests(paths: Iterable[str | Path]) -> Iterable[tuple[str, str]]:
+    """Yield ``(query, params)`` for every logged request, reading pre-params lines too."""
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as handle:
+            for line in handle:
+                fields = line.rstrip("\n").split("\t", _FIELDS - 1)
+                if len(fields) == _FIELDS - 1:
+                    fields.insert(-1, "")
+                if len(fields) == _FIELDS and fields[-1]:
+                    yield fields[-1], fields[-2]
+
+
+def top_queries(path: str | Path, limit: int = DEFAULT_PREWARM_TOP) -> list[str]:
+    """Most frequent queries in a query log and its backups, most frequent first."""
+    counts = Counter(query for query, _ in iter_logged_requests(log_files(path)))
+    return [query for query, _ in counts.most_common(limit)]
+
+
+def top_requests(path: str | Path, limit: int = DEFAULT_PREWARM_TOP) -> list[dict[str, str]]:
+    """
+    Most frequent requests in a query log and its backups, as batch API items.
+
+    Unlike :func:`top_queries`, the same query sent to two indexes (or with different
+    filters or settings) counts as two requests, and each item carries those parameters.
+    """
+    counts = Counter(iter_logged_requests(log_files(path)))
+    return [
+        {"query": query, **dict(urllib.parse.parse_qsl(params))}
+        for (query, params), _ in counts.most_common(limit)
+    ]
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+import gzip
+from typing import Any
+import zlib
+
+from flask.json.provider import DefaultJSONProvider
+
+DEFAULT_COMPRESS_LEVEL = 5
+DEFAULT_COMPRESS_MIN_BYTES = 1024
+SUPPORTED_ENCODINGS = ("gzip", "deflate")
+
+
+def _fast_dumps() -> Callable[[Any], bytes] | None:
+    """Return the fastest available JSON encoder producing UTF-8 bytes, if any."""
+    try:
+        import orjson
+    except ImportError:
+        pass
+    else:
+        return orjson.dumps
+    try:
+        import ujson  # Installed with colbert-ai
+    except ImportError:
+        return None
+
+    def dumps(obj: Any) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode()
+
+    return dumps
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes responses with ``orjson`` or ``ujson`` when available.
+
+    Keys are not sorted. Payloads the fast encoder rejects fall back to the standard
+    provider, so behaviour matches Flask's default apart from speed and key order.
+    """
+
+    sort_keys = False
+    compact = True
+
+    def __init__(self, app) -> None:
+        super().__init__(app)
+        self._dumps = _fast_dumps()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self._dumps is not None:
+            try:
+                body = self._dumps(obj)
+            except (TypeError, ValueError, OverflowError):
+                pass
+            else:
+                return self._app.response_class(body, mimetype=self.mimetype)
+        return super().response(obj)
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """Pick ``gzip`` or ``deflate`` from an ``Accept-Encoding`` header, honouring ``q=0``."""
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[coding] = weight
+
+    wildcard = weights.get("*", 0.0)
+    # Highest weight wins; ties go to the first supported encoding.
+    coding = max(SUPPORTED_ENCODINGS, key=lambda coding: weights.get(coding, wildcard))
+    return coding if weights.get(coding, wildcard) > 0 else None
+
+
+def compress(body: bytes, encoding: str, level: int = DEFAULT_COMPRESS_LEVEL) -> bytes:
+    """Encode ``body`` for a ``Content-Encoding`` of ``gzip`` or ``deflate`` (zlib format)."""
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    if encoding == "deflate":
+        return zlib.compress(body, level)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
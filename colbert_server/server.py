@@ -1,16 +1,122 @@
 from __future__ import annotations
 
-from functools import lru_cache
+import base64
+from collections.abc import Callable, Hashable, Mapping, Sequence
+import copy
+import hashlib
+import hmac
+import json
+import logging
 import math
-from typing import TYPE_CHECKING
+from pathlib import Path
+import threading
+import time
+from typing import TYPE_CHECKING, NamedTuple
 
-from flask import Flask, request
+from flask import Flask, Response, g, request
+
+from .admission import (
+    DEFAULT_MAX_WAITING,
+    DEFAULT_RETRY_AFTER,
+    AdmissionControl,
+    DeadlineExceeded,
+    SearchRejected,
+    request_deadline,
+    retry_after_header,
+)
+from .batching import DEFAULT_MAX_BATCH_SIZE, QueryBatcher
+from .cache import (
+    DEFAULT_CACHE_MAX_MB,
+    DEFAULT_ENCODING_CACHE_SIZE,
+    CachedResult,
+    EncodingCache,
+    ResultCache,
+    SingleFlight,
+    SQLiteCacheStore,
+    normalize_query,
+)
+from .collection_store import CollectionStore
+from .data import DatasetLayoutError
+from .filters import PidFilter
+from .metrics import (
+    CONTENT_TYPE_LATEST,
+    STAGE_SERIALIZE,
+    STAGE_TEXT,
+    ServerMetrics,
+    instrument_searcher,
+)
+from .querylog import QueryLog
+from .responses import (
+    DEFAULT_COMPRESS_LEVEL,
+    DEFAULT_COMPRESS_MIN_BYTES,
+    FastJSONProvider,
+    compress,
+    negotiate_encoding,
+)
+from .shards import unpack_query
 
 if TYPE_CHECKING:  # pragma: no cover - imported lazily at runtime
     from colbert import Searcher
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_CHECKPOINT = "colbert-ir/colbertv2.0"
 DEFAULT_CACHE_SIZE = 1_000_000
+DEFAULT_K = 10
+MAX_K = 100
+MAX_DEPTH = 1000
+MAX_BATCH_QUERIES = 256
+CACHE_STATUS_HEADER = "X-Cache"
+PAGED_KEY_MARKER = "paged"
+# Sent by warm-up and prewarm traffic so synthetic or replayed queries stay out of the log.
+WARMUP_HEADER = "X-Colbert-Warmup"
+# Request parameters that select a ranking; the query log keeps them so replays match.
+LOGGED_PARAMS = ("index", "filter", "preset", "ncells", "centroid_score_threshold", "ndocs")
+READY_EXTENSION = "colbert_server.ready"
+RELOAD_EXTENSION = "colbert_server.reload"
+LOOPBACK_ADDRESSES = ("127.0.0.1", "::1")
+
+MAX_RERANK_PIDS = 1000
+MAX_TIMEOUT_MS = 600_000
+MAX_NCELLS = 32
+MAX_NDOCS = 16_384
+FILTER_WIDEN_STEPS = 4
+
+RESULT_FIELDS = ("text", "pid", "rank", "score", "prob")
+
+SearchResult = tuple[list[int], list[int], list[float]]
+
+
+class InvalidRequest(ValueError):
+    """Raised for malformed request parameters; the API answers these with a 400."""
+
+
+class InvalidSearchSettings(InvalidRequest):
+    """Raised when PLAID search settings are malformed or out of range."""
+
+
+class InvalidPageRequest(InvalidRequest):
+    """Raised when ``offset``, ``limit`` or ``cursor`` parameters are malformed."""
+
+
+class SearchSettings(NamedTuple):
+    """
+    PLAID search settings for one query.
+
+    ``None`` fields fall back to ColBERT's depth-dependent defaults (see
+    :func:`plaid_defaults`).
+    """
+
+    ncells: int | None = None
+    centroid_score_threshold: float | None = None
+    ndocs: int | None = None
+
+
+SEARCH_PRESETS = {
+    "fast": SearchSettings(1, 0.5, 256),
+    "balanced": SearchSettings(2, 0.45, 1024),
+    "exhaustive": SearchSettings(4, 0.4, 4096),
+}
 
 
 def create_searcher(
@@ -18,54 +124,1171 @@ def create_searcher(
     index_name: str,
     collection_path: str | None,
     checkpoint: str = DEFAULT_CHECKPOINT,
+    collection_store: str | Path | None = None,
+    mmap_index: bool = False,
+    encoder_from: Searcher | None = None,
 ) -> Searcher:
-    """Instantiate a ColBERT Searcher with the given configuration."""
+    """
+    Instantiate a ColBERT Searcher with the given configuration.
+
+    When ``collection_store`` points to a store built by ``build-collection-store``, passage
+    text is served from that memory-mapped file instead of loading ``collection_path``.
+    With ``mmap_index``, the compressed codes and residuals are memory-mapped rather than
+    read into RAM (single-chunk indexes only, see :func:`use_mmap_index`). With
+    ``encoder_from``, the new searcher shares that searcher's loaded checkpoint instead of
+    loading its own copy of the encoder weights.
+    """
     from colbert import Searcher  # Import lazily to avoid eager torch/faiss loading
 
-    return Searcher(
-        index=index_name,
-        checkpoint=checkpoint,
-        collection=collection_path,
-        index_root=index_root,
+    config = None
+    if mmap_index:
+        from colbert.infra import ColBERTConfig
+
+        config = ColBERTConfig(load_index_with_mmap=True)
+
+    collection = collection_path
+    if collection_store is not None:
+        from colbert.data import Collection
+
+        store = CollectionStore(collection_store)
+        collection = Collection(path=store.provenance(), data=store)
+
+    def load() -> Searcher:
+        return Searcher(
+            index=index_name,
+            checkpoint=checkpoint,
+            collection=collection,
+            config=config,
+            index_root=index_root,
+        )
+
+    if encoder_from is None:
+        return load()
+
+    # Searcher.__init__ always loads its checkpoint; hand it the one already in memory.
+    import colbert.searcher as searcher_module
+
+    load_checkpoint = searcher_module.Checkpoint
+    searcher_module.Checkpoint = lambda *args, **kwargs: encoder_from.checkpoint
+    try:
+        return load()
+    finally:
+        searcher_module.Checkpoint = load_checkpoint
+
+
+def index_metadata(index_root: str | Path, index_name: str) -> dict[str, object]:
+    """Read an index's ``metadata.json``, or return an empty dict when it is missing."""
+    path = Path(index_root) / index_name / "metadata.json"
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def resident_index_bytes(index_root: str | Path, index_name: str) -> int:
+    """Size of the compressed codes and residuals a full (non-mmap) load reads into RAM."""
+    index_path = Path(index_root) / index_name
+    patterns = ("*.codes.pt", "*.residuals.pt")
+    return sum(path.stat().st_size for pattern in patterns for path in index_path.glob(pattern))
+
+
+def use_mmap_index(
+    index_root: str | Path,
+    index_name: str,
+    *,
+    mmap_index: bool = False,
+    memory_budget: int | None = None,
+) -> bool:
+    """
+    Decide whether to memory-map the index instead of loading it into RAM.
+
+    ``mmap_index`` forces memory mapping. Otherwise the index is memory-mapped only when its
+    codes and residuals exceed ``memory_budget`` bytes. ColBERT can memory-map single-chunk
+    indexes only: forcing it on a multi-chunk index raises, and a budget overrun on one
+    logs a warning and falls back to a full load.
+    """
+    if not mmap_index and (memory_budget is None or memory_budget <= 0):
+        return False
+    if not mmap_index and resident_index_bytes(index_root, index_name) <= memory_budget:
+        return False
+
+    num_chunks = index_metadata(index_root, index_name).get("num_chunks", 1)
+    if num_chunks == 1:
+        return True
+    hint = (
+        f"Index '{index_name}' has {num_chunks} chunks; memory mapping needs one. Coalesce it "
+        "with `python -m colbert.utils.coalesce --input <index> --output <new index>`."
     )
+    if mmap_index:
+        raise DatasetLayoutError(hint)
+    logger.warning("Index exceeds the memory budget but cannot be memory-mapped. %s", hint)
+    return False
 
 
-def create_app(searcher: Searcher, cache_size: int = DEFAULT_CACHE_SIZE) -> Flask:
-    """Build a Flask app that serves ColBERT search results."""
-    app = Flask(__name__)
-    counter = {"api": 0}
+def index_fingerprint(index_root: str | Path, index_name: str, checkpoint: str) -> str:
+    """
+    Identify an index build and checkpoint for persistent cache namespacing.
 
-    @lru_cache(maxsize=cache_size)
-    def api_search_query(query: str, k: int | None):
-        print(f"Query={query}")
-        if query is None:
-            return {"query": "", "topk": []}
+    The digest covers the name, size and modification time of every file in the index
+    directory, so rebuilding or replacing the index yields a new namespace.
+    """
+    index_path = Path(index_root) / index_name
+    digest = hashlib.sha256(f"{index_name}\0{checkpoint}".encode())
+    if index_path.is_dir():
+        for path in sorted(index_path.iterdir()):
+            if path.is_file():
+                stat = path.stat()
+                digest.update(f"\0{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return f"{index_name}@{checkpoint}#{digest.hexdigest()[:16]}"
+
+
+def normalize_k(k: object) -> int:
+    """Clamp a user-supplied ``k`` to ``[1, MAX_K]``, falling back to ``DEFAULT_K``."""
+    try:
+        return DEFAULT_K if k is None else max(1, min(int(k), MAX_K))
+    except (TypeError, ValueError):
+        return DEFAULT_K
+
+
+def _bounded(name: str, value: object, cast: type, low: float, high: float):
+    try:
+        parsed = cast(value)
+    except (TypeError, ValueError):
+        raise InvalidSearchSettings(f"{name} must be a number, got {value!r}.") from None
+    if not low <= parsed <= high:
+        raise InvalidSearchSettings(f"{name} must be between {low} and {high}, got {parsed}.")
+    return parsed
+
+
+def parse_search_settings(
+    params: Mapping[str, object], base: SearchSettings | None = None
+) -> SearchSettings:
+    """
+    Resolve ``preset``, ``ncells``, ``centroid_score_threshold`` and ``ndocs`` parameters.
+
+    A ``preset`` replaces ``base`` and individual settings override single fields; missing
+    or ``None`` parameters leave the corresponding field unchanged.
+    """
+    settings = base or SearchSettings()
+    preset = params.get("preset")
+    if preset is not None:
+        if preset not in SEARCH_PRESETS:
+            choices = ", ".join(SEARCH_PRESETS)
+            raise InvalidSearchSettings(f"Unknown preset {preset!r}; expected one of {choices}.")
+        settings = SEARCH_PRESETS[preset]
 
+    overrides = {}
+    if params.get("ncells") is not None:
+        overrides["ncells"] = _bounded("ncells", params["ncells"], int, 1, MAX_NCELLS)
+    if params.get("centroid_score_threshold") is not None:
+        overrides["centroid_score_threshold"] = _bounded(
+            "centroid_score_threshold", params["centroid_score_threshold"], float, -1.0, 1.0
+        )
+    if params.get("ndocs") is not None:
+        overrides["ndocs"] = _bounded("ndocs", params["ndocs"], int, 1, MAX_NDOCS)
+    return settings._replace(**overrides)
+
+
+def cache_key(
+    query: str,
+    settings: SearchSettings,
+    pid_filter: PidFilter | None = None,
+    index: str | None = None,
+    paged: bool = False,
+) -> Hashable:
+    """
+    Key a normalized query by its search settings, filter and (when serving several) index.
+
+    Unfiltered queries with default settings on the only index keep the bare query as
+    their key. ``paged`` keys the ``MAX_DEPTH`` ranking that paginated requests are cut
+    from apart from the shallower one plain requests get.
+    """
+    if settings == SearchSettings() and pid_filter is None and index is None and not paged:
+        return query
+    key = (query, *settings, pid_filter.key if pid_filter is not None else None)
+    if paged:
+        return (*key, index, PAGED_KEY_MARKER)
+    return key if index is None else (*key, index)
+
+
+def split_cache_key(key: Hashable) -> tuple[str, SearchSettings, str | None, str | None]:
+    """Invert :func:`cache_key`, returning the filter's key rather than the filter."""
+    if not isinstance(key, tuple):
+        return key, SearchSettings(), None, None
+    width = len(SearchSettings._fields)
+    query, settings, filter_key = key[0], SearchSettings(*key[1 : width + 1]), key[width + 1]
+    return query, settings, filter_key, key[width + 2] if len(key) > width + 2 else None
+
+
+def plaid_defaults(k: int) -> tuple[int, float, int]:
+    """Return ColBERT's default ``(ncells, centroid_score_threshold, ndocs)`` for depth ``k``."""
+    if k <= 10:
+        return 1, 0.5, 256
+    if k <= 100:
+        return 2, 0.45, 1024
+    return 4, 0.4, max(k * 4, 4096)
+
+
+def search_config(searcher: Searcher, k: int, settings: SearchSettings | None = None):
+    """Copy the searcher's config with ``settings`` applied and depth-``k`` defaults filled in."""
+    config = copy.copy(searcher.config)
+    overrides = settings or SearchSettings()
+    for name, override, value in zip(SearchSettings._fields, overrides, plaid_defaults(k)):
+        if override is not None:
+            setattr(config, name, override)
+        elif getattr(config, name) is None:
+            setattr(config, name, value)
+    return config
+
+
+def dense_search(
+    searcher: Searcher,
+    Q,
+    k: int,
+    settings: SearchSettings | None = None,
+    pid_filter: PidFilter | None = None,
+) -> SearchResult:
+    """
+    Rank an encoded query against the index, like ``Searcher.dense_search``.
+
+    ``Searcher.dense_search`` writes its depth-dependent PLAID settings into the shared
+    config on first use, so every later search inherits the first caller's ``k``. Here the
+    settings are applied to a per-call copy instead, which keeps shallow searches cheap
+    without affecting deeper ones. Fields set in ``settings`` take precedence over both the
+    searcher's config and the defaults. ``pid_filter`` restricts results to its passages
+    (see :func:`filtered_rank`).
+    """
+    config = search_config(searcher, k, settings)
+    if pid_filter is None:
+        pids, scores = searcher.ranker.rank(config, Q)
+    else:
+        pids, scores = filtered_rank(searcher, config, Q, k, pid_filter)
+    pids, scores = pids[:k], scores[:k]
+    return pids, list(range(1, len(pids) + 1)), scores
+
+
+def filtered_rank(searcher: Searcher, config, Q, k: int, pid_filter: PidFilter):
+    """
+    Rank only passages in ``pid_filter``.
+
+    A filter no larger than ``ndocs // 4`` is scored exhaustively by passing its pids
+    straight to the ranker; that is as many passages as an unfiltered search decompresses
+    and fully scores after centroid pruning. Larger filters are applied as ColBERT's
+    ``filter_fn`` between candidate generation and scoring. When too few candidates survive
+    for a full ``k``, the search is repeated with twice the cells and candidates, up to
+    :data:`MAX_NCELLS` and :data:`MAX_NDOCS`, so a selective filter can cost up to
+    :data:`FILTER_WIDEN_STEPS` searches, each roughly twice as expensive as the last.
+    """
+    if pid_filter.count <= config.ndocs // 4:
+        if not pid_filter.count:
+            return [], []
+        return searcher.ranker.rank(config, Q, pids=pid_filter.pids())
+
+    wanted = min(k, pid_filter.count)
+    for _ in range(FILTER_WIDEN_STEPS):
+        pids, scores = searcher.ranker.rank(config, Q, filter_fn=pid_filter)
+        if len(pids) >= wanted or (config.ncells >= MAX_NCELLS and config.ndocs >= MAX_NDOCS):
+            break
+        config = copy.copy(config)
+        config.ncells = min(config.ncells * 2, MAX_NCELLS)
+        config.ndocs = min(config.ndocs * 2, MAX_NDOCS)
+    return pids, scores
+
+
+def search_batch(
+    searcher: Searcher,
+    queries: Sequence[str],
+    k: int | Sequence[int] = MAX_K,
+    settings: SearchSettings | Sequence[SearchSettings | None] | None = None,
+    pid_filters: Sequence[PidFilter | None] | None = None,
+) -> list[SearchResult]:
+    """
+    Encode ``queries`` in a single forward pass and rank each one against the index.
+
+    ``k`` and ``settings`` are either one value for every query or per-query sequences, and
+    ``pid_filters`` optionally restricts each query to a filter. This mirrors
+    ``Searcher.search_all`` without the ``Queries``/``Ranking`` wrappers.
+    """
+    if not queries:
+        return []
+    depths = [k] * len(queries) if isinstance(k, int) else list(k)
+    if settings is None or isinstance(settings, SearchSettings):
+        settings = [settings] * len(queries)
+    pid_filters = pid_filters or [None] * len(queries)
+    return [
+        dense_search(searcher, Q, depth, query_settings, pid_filter)
+        for Q, depth, query_settings, pid_filter in zip(
+            encode_queries(searcher, queries), depths, settings, pid_filters
+        )
+    ]
+
+
+def encode_queries(
+    searcher: Searcher, queries: Sequence[str], encodings: EncodingCache | None = None
+) -> list:
+    """
+    Encode ``queries`` in one forward pass, returning a one-query batch for each.
+
+    Repeated queries are encoded once, and queries found in ``encodings`` are not encoded
+    at all; new encodings are added to it.
+    """
+    rows = {
+        query: encodings.get(query) if encodings is not None else None
+        for query in dict.fromkeys(queries)
+    }
+    missing = [query for query, row in rows.items() if row is None]
+    if missing:
+        Q = searcher.encode(missing)
+        for idx, query in enumerate(missing):
+            rows[query] = Q[idx : idx + 1]
+            if encodings is not None:
+                # Copy the row so the cache does not keep the whole batch tensor alive.
+                row = rows[query]
+                encodings.put(query, row.clone() if hasattr(row, "clone") else row)
+    return [rows[query] for query in queries]
+
+
+def passage_count(searcher: Searcher) -> int | None:
+    """Number of passages in the index, or ``None`` when it cannot be determined."""
+    doclens = getattr(searcher.ranker, "doclens", None)
+    if doclens is not None:
+        return len(doclens)
+    num_passages = getattr(searcher.ranker, "num_passages", None)
+    if num_passages is not None:
+        return num_passages
+    return len(searcher.collection) if searcher.collection is not None else None
+
+
+def rerank(searcher: Searcher, query: str, pids: Sequence[int]) -> tuple[list[int], list[float]]:
+    """
+    Score ``pids`` against ``query`` with full MaxSim over their compressed embeddings.
+
+    Passing ``pids`` to the ranker skips IVF probing and centroid pruning entirely; the
+    result is sorted by descending score like a regular search.
+    """
+    if not pids:
+        return [], []
+    Q = searcher.encode([query])
+    return searcher.ranker.rank(searcher.config, Q, pids=list(pids))
+
+
+def encode_cursor(offset: int, limit: int) -> str:
+    """Opaque pagination cursor pointing at ``offset`` with page size ``limit``."""
+    raw = json.dumps([offset, limit], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def parse_page(params: Mapping[str, object], k: object) -> tuple[int, int] | None:
+    """
+    Resolve ``cursor`` or ``offset``/``limit`` parameters into ``(offset, limit)``.
+
+    Returns ``None`` for unpaginated requests. ``limit`` defaults to ``k`` and is capped at
+    ``MAX_K``, and pages never extend past ``MAX_DEPTH``.
+    """
+    cursor = params.get("cursor")
+    if cursor:
         try:
-            requested_k = 10 if k is None else max(1, min(int(k), 100))
+            padded = str(cursor) + "=" * (-len(str(cursor)) % 4)
+            offset, limit = json.loads(base64.urlsafe_b64decode(padded))
+            offset, limit = int(offset), int(limit)
         except (TypeError, ValueError):
-            requested_k = 10
-        pids, ranks, scores = searcher.search(query, k=100)
-        pids, ranks, scores = pids[:requested_k], ranks[:requested_k], scores[:requested_k]
+            raise InvalidPageRequest(f"Invalid cursor {cursor!r}.") from None
+    elif params.get("offset") is not None or params.get("limit") is not None:
+        try:
+            offset = int(params.get("offset") or 0)
+        except (TypeError, ValueError):
+            raise InvalidPageRequest("offset must be an integer.") from None
+        limit = normalize_k(params.get("limit") if params.get("limit") is not None else k)
+    else:
+        return None
+
+    limit = max(1, min(limit, MAX_K))
+    if not 0 <= offset < MAX_DEPTH:
+        raise InvalidPageRequest(f"offset must be between 0 and {MAX_DEPTH - 1}.")
+    return offset, min(limit, MAX_DEPTH - offset)
+
+
+def parse_fields(value: object) -> tuple[str, ...] | None:
+    """
+    Parse a ``fields`` projection (``"pid,score"`` or a list of names) for result items.
+
+    Returns ``None`` when every field is wanted.
+    """
+    if value is None or value == "":
+        return None
+    names = value.split(",") if isinstance(value, str) else value
+    if not isinstance(names, list | tuple) or not all(isinstance(name, str) for name in names):
+        raise InvalidRequest("fields must be a comma-separated string or a list of names.")
+    fields = tuple(dict.fromkeys(name.strip() for name in names if name.strip()))
+    unknown = [name for name in fields if name not in RESULT_FIELDS]
+    if unknown or not fields:
+        raise InvalidRequest(f"fields must be chosen from {', '.join(RESULT_FIELDS)}.")
+    return fields
+
+
+def parse_timeout_ms(value: object, default: float | None = None) -> float | None:
+    """Parse a ``timeout_ms`` deadline budget; ``None`` or ``""`` falls back to ``default``."""
+    if value is None or value == "":
+        return default
+    try:
+        timeout_ms = float(value)
+    except (TypeError, ValueError):
+        raise InvalidRequest(f"timeout_ms must be a number, got {value!r}.") from None
+    if not 0 < timeout_ms <= MAX_TIMEOUT_MS:
+        raise InvalidRequest(f"timeout_ms must be between 0 and {MAX_TIMEOUT_MS}.")
+    return timeout_ms
+
+
+def render_results(
+    searcher: Searcher,
+    query: str,
+    pids: Sequence[int],
+    scores: Sequence[float],
+    first_rank: int = 1,
+    fields: Sequence[str] | None = None,
+) -> dict[str, object]:
+    """
+    Turn ranked pids and scores into the API response payload.
+
+    ``fields`` limits each result item to those keys; without ``text`` the collection is
+    not touched at all.
+    """
+    exp_scores = [math.exp(score) for score in scores]
+    total = sum(exp_scores)
+    probs = [score / total for score in exp_scores] if total else [0.0 for _ in scores]
+    collection = searcher.collection if fields is None or "text" in fields else None
 
-        exp_scores = [math.exp(score) for score in scores]
-        total = sum(exp_scores)
-        probs = [score / total for score in exp_scores] if total else [0.0 for _ in scores]
+    topk = []
+    for rank, (pid, score, prob) in enumerate(zip(pids, scores, probs), start=first_rank):
+        text = collection[pid] if collection is not None else None
+        topk.append({"text": text, "pid": pid, "rank": rank, "score": score, "prob": prob})
 
-        topk = []
-        for pid, rank, score, prob in zip(pids, ranks, scores, probs):
-            text = searcher.collection[pid] if searcher.collection is not None else None
-            topk.append({"text": text, "pid": pid, "rank": rank, "score": score, "prob": prob})
+    topk.sort(key=lambda item: (-item["score"], item["pid"]))
+    if fields is not None:
+        topk = [{name: item[name] for name in fields} for item in topk]
+    return {"query": query, "topk": topk}
 
-        topk.sort(key=lambda item: (-item["score"], item["pid"]))
-        return {"query": query, "topk": topk}
+
+def set_ready(app: Flask, ready: bool = True) -> None:
+    """Flip the ``GET /ready`` state of an app built by :func:`create_app`."""
+    readiness = app.extensions[READY_EXTENSION]
+    if ready:
+        readiness.set()
+    else:
+        readiness.clear()
+
+
+class IndexSet(NamedTuple):
+    """
+    Searchers to serve, as returned by the ``loader`` of :func:`create_app`.
+
+    ``searcher`` and ``filters`` take the same forms as in :func:`create_app`;
+    ``cache_namespace`` scopes their persisted results (see :func:`index_fingerprint`).
+    """
+
+    searcher: Searcher | Mapping[str, Searcher]
+    filters: Mapping[str, PidFilter] | Mapping[str, Mapping[str, PidFilter]] | None = None
+    cache_namespace: str = "default"
+
+
+class _Generation:
+    """
+    One loaded set of indexes with the result cache and in-flight searches that belong to it.
+
+    A reload builds a new generation and swaps it in whole; requests keep using the
+    generation they started on, so cached results never cross index versions.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        indexes: IndexSet,
+        cache: ResultCache,
+        encoding_cache_size: int,
+    ) -> None:
+        searcher, filters = indexes.searcher, indexes.filters or {}
+        self.version = version
+        self.named = isinstance(searcher, Mapping)
+        self.indexes: dict[str | None, Searcher] = (
+            dict(searcher) if self.named else {None: searcher}
+        )
+        if not self.indexes:
+            raise ValueError("create_app needs at least one searcher.")
+        self.default_index = next(iter(self.indexes))
+        # Every searcher shares one checkpoint, so any of them can encode for the others.
+        self.encoder = self.indexes[self.default_index]
+        self.encodings = EncodingCache(encoding_cache_size) if len(self.indexes) > 1 else None
+        self.cache = cache
+        self.flights = SingleFlight()
+        self.index_filters = {
+            index: dict(filters.get(index, {}) if self.named else filters) for index in self.indexes
+        }
+        self.filters_by_key = {
+            (index, pid_filter.key): pid_filter
+            for index, named_filters in self.index_filters.items()
+            for pid_filter in named_filters.values()
+        }
+
+    def lookup_index(self, name: object) -> str | None:
+        if name is None or name == "":
+            return self.default_index
+        if not self.named or name not in self.indexes:
+            known = ", ".join(map(str, self.indexes)) if self.named else "only one index is served"
+            raise InvalidRequest(f"Unknown index {name!r} ({known}).")
+        return name
+
+    def lookup_filter(self, name: object, index: str | None) -> PidFilter | None:
+        if name is None or name == "":
+            return None
+        if name not in self.index_filters[index]:
+            known = ", ".join(sorted(self.index_filters[index])) or "none are loaded"
+            raise InvalidSearchSettings(f"Unknown filter {name!r} ({known}).")
+        return self.index_filters[index][name]
+
+    def key_for(
+        self,
+        query: str,
+        settings: SearchSettings,
+        pid_filter: PidFilter | None,
+        index: str | None,
+        paged: bool = False,
+    ) -> Hashable:
+        # The index only becomes part of the key when there is more than one.
+        return cache_key(
+            normalize_query(query),
+            settings,
+            pid_filter,
+            index if len(self.indexes) > 1 else None,
+            paged,
+        )
+
+    def searcher(self, index: str | None) -> Searcher:
+        return self.indexes[self.default_index if index is None else index]
+
+
+def reload_indexes(app: Flask, *, wait: bool = False) -> bool:
+    """
+    Start reloading the indexes of an app built by :func:`create_app` with a ``loader``.
+
+    Returns ``False`` when a reload is already running. With ``wait``, blocks until the new
+    indexes are being served (or the reload has failed; see ``GET /api/stats``).
+    """
+    reload = app.extensions.get(RELOAD_EXTENSION)
+    if reload is None:
+        raise ValueError("This app was created without a loader, so it cannot reload.")
+    return reload(wait)
+
+
+def create_app(
+    searcher: Searcher | Mapping[str, Searcher],
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    *,
+    cache_max_mb: float = DEFAULT_CACHE_MAX_MB,
+    cache_ttl: float | None = None,
+    cache_path: str | Path | None = None,
+    cache_namespace: str = "default",
+    cold_search_depth: int = MAX_K,
+    batch_window_ms: float = 0.0,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    search_settings: SearchSettings | None = None,
+    ready: bool = True,
+    query_log: QueryLog | None = None,
+    filters: Mapping[str, PidFilter] | Mapping[str, Mapping[str, PidFilter]] | None = None,
+    compress_level: int = DEFAULT_COMPRESS_LEVEL,
+    compress_min_bytes: int = DEFAULT_COMPRESS_MIN_BYTES,
+    encoding_cache_size: int = DEFAULT_ENCODING_CACHE_SIZE,
+    loader: Callable[[Searcher], IndexSet] | None = None,
+    reload_warmup: Sequence[str] = (),
+    admin_token: str | None = None,
+    max_inflight: int | None = None,
+    max_waiting: int = DEFAULT_MAX_WAITING,
+    retry_after: float = DEFAULT_RETRY_AFTER,
+    default_timeout_ms: float | None = None,
+) -> Flask:
+    """
+    Build a Flask app that serves ColBERT search results.
+
+    ``searcher`` is one searcher or a mapping of index names to searchers that share a
+    checkpoint. The keyword arguments configure the result cache, query batching, PLAID
+    settings, filters, compression, reloading and admission control; the README and
+    ``colbert-server serve --help`` describe each of them.
+    """
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.extensions[READY_EXTENSION] = readiness = threading.Event()
+    if ready:
+        readiness.set()
+    counter = {"api": 0}
+    metrics = ServerMetrics()
+    cold_search_depth = normalize_k(cold_search_depth)
+    search_settings = search_settings or SearchSettings()
+    admission = AdmissionControl(
+        max_inflight or None, max_waiting=max_waiting, retry_after=retry_after
+    )
+
+    def deadline_for(timeout_ms: object) -> float | None:
+        """Deadline of the current request; raises ``InvalidRequest`` for a bad budget."""
+        budget = parse_timeout_ms(timeout_ms, default_timeout_ms)
+        return request_deadline(g.get("request_started", time.perf_counter()), budget)
+
+    def load_generation(indexes: IndexSet, version: int) -> _Generation:
+        cache = ResultCache(
+            max_entries=cache_size,
+            max_bytes=int(cache_max_mb * 1024 * 1024),
+            ttl_seconds=cache_ttl,
+            store=(
+                SQLiteCacheStore(
+                    cache_path, namespace=indexes.cache_namespace, ttl_seconds=cache_ttl
+                )
+                if cache_path
+                else None
+            ),
+        )
+        generation = _Generation(version, indexes, cache, encoding_cache_size)
+        for index_searcher in generation.indexes.values():
+            instrument_searcher(index_searcher, metrics)
+        return generation
+
+    # Swapped as a whole on reload; each request reads it once and keeps that generation.
+    live = {"generation": load_generation(IndexSet(searcher, filters, cache_namespace), 0)}
+
+    def current() -> _Generation:
+        return live["generation"]
+
+    def search_many(gen: _Generation, requests: list[tuple[Hashable, int]]) -> list[SearchResult]:
+        parts = [split_cache_key(key) for key, _ in requests]
+        encoded = encode_queries(gen.encoder, [query for query, *_ in parts], gen.encodings)
+        results = []
+        for Q, (query, settings, filter_key, index), (_, depth) in zip(encoded, parts, requests):
+            index = gen.default_index if index is None else index
+            pid_filter = gen.filters_by_key.get((index, filter_key))
+            results.append(dense_search(gen.indexes[index], Q, depth, settings, pid_filter))
+        return results
+
+    def run_batch(
+        items: list[tuple[_Generation, Hashable, int, float | None]],
+    ) -> list[SearchResult | DeadlineExceeded]:
+        results: list = [None] * len(items)
+        # A batch only spans two generations while a reload is being swapped in.
+        positions: dict[_Generation, list[int]] = {}
+        for idx, (gen, _, _, deadline) in enumerate(items):
+            try:
+                # Queries that went stale while queued are dropped before encoding.
+                admission.check(deadline)
+            except DeadlineExceeded as exc:
+                results[idx] = exc
+            else:
+                positions.setdefault(gen, []).append(idx)
+        for gen, members in positions.items():
+            requests = [items[idx][1:3] for idx in members]
+            for idx, result in zip(members, search_many(gen, requests)):
+                results[idx] = result
+        return results
+
+    batcher = None
+    if batch_window_ms > 0:
+        batcher = QueryBatcher(run_batch, window_ms=batch_window_ms, max_batch_size=max_batch_size)
+
+    def search_one(
+        gen: _Generation, key: Hashable, depth: int, deadline: float | None = None
+    ) -> SearchResult:
+        with admission.admit(deadline):
+            if batcher is not None:
+                return batcher.search((gen, key, depth, deadline))
+            return search_many(gen, [(key, depth)])[0]
+
+    def miss_depth(gen: _Generation, key: Hashable, k: int) -> int:
+        # Paginated requests search the whole paginated depth once; later pages are hits.
+        if k > MAX_K:
+            return MAX_DEPTH
+        # A cached entry that is too shallow means the query is warm: search it fully.
+        return MAX_K if key in gen.cache else max(k, cold_search_depth)
+
+    def store(gen: _Generation, key: Hashable, result: SearchResult, depth: int) -> CachedResult:
+        pids, _, scores = result
+        cached = CachedResult.from_lists(pids, scores, depth)
+        gen.cache.put(key, cached)
+        return cached
+
+    def search_once(
+        gen: _Generation, key: Hashable, k: int, deadline: float | None = None
+    ) -> CachedResult:
+        """Search a missed key, joining an identical search that is already in flight."""
+        while True:
+            depth = miss_depth(gen, key, k)
+            # A leader turned away by its own deadline or by admission control does not
+            # fail its followers: one of them leads the search again under its own deadline.
+            cached, _ = gen.flights.do(
+                key,
+                lambda: store(gen, key, search_one(gen, key, depth, deadline), depth),
+                retry=(SearchRejected,),
+            )
+            if cached.covers(k):
+                return cached
+            # Joined a shallower cold search; go again, now at full depth.
+
+    def respond(
+        gen: _Generation,
+        query: str,
+        cached: CachedResult,
+        k: int,
+        offset: int = 0,
+        fields: Sequence[str] | None = None,
+        index: str | None = None,
+    ) -> dict[str, object]:
+        end = offset + k
+        with metrics.time_stage(STAGE_TEXT):
+            return render_results(
+                gen.searcher(index),
+                query,
+                cached.pids[offset:end],
+                cached.scores[offset:end],
+                offset + 1,
+                fields,
+            )
+
+    def json_response(payload: object, status: int = 200) -> Response:
+        with metrics.time_stage(STAGE_SERIALIZE):
+            response = app.json.response(payload)
+        response.status_code = status
+        return response
+
+    def log_query(query: str, k: int, cache_status: str, params: Mapping[str, object]) -> None:
+        if query_log is not None and not request.headers.get(WARMUP_HEADER):
+            started = g.get("request_started")
+            latency = time.perf_counter() - started if started is not None else 0.0
+            query_log.record(
+                normalize_query(query),
+                latency=latency,
+                k=k,
+                cache_status=cache_status,
+                params={
+                    name: params[name] for name in LOGGED_PARAMS if params.get(name) is not None
+                },
+            )
+
+    def api_search_query(
+        gen: _Generation,
+        query: str | None,
+        k: object,
+        settings: SearchSettings,
+        pid_filter: PidFilter | None,
+        page: tuple[int, int] | None = None,
+        fields: Sequence[str] | None = None,
+        index: str | None = None,
+        deadline: float | None = None,
+    ) -> tuple[dict[str, object], bool]:
+        """
+        Return the response payload and whether it was served from the cache.
+
+        With ``page=(offset, limit)`` the payload holds that slice of the ranking plus a
+        ``next_cursor`` while more results remain.
+        """
+        logger.debug("Query=%s", query)
+        if query is None:
+            return {"query": "", "topk": []}, False
+
+        key = gen.key_for(query, settings, pid_filter, index, paged=page is not None)
+        offset, k = page if page is not None else (0, normalize_k(k))
+        # Every page is cut from one ranking searched at the full paginated depth; pages of
+        # rankings searched at different depths could repeat or skip passages. That ranking
+        # has a key of its own, so plain requests keep getting their shallower one.
+        depth = MAX_DEPTH if page is not None else k
+        cached = gen.cache.get(key, depth)
+        hit = cached is not None
+        if cached is None:
+            cached = search_once(gen, key, depth, deadline)
+        log_query(query, k, "hit" if hit else "miss", request.args)
+        payload = respond(gen, query, cached, k, offset, fields, index)
+        if page is not None:
+            end = offset + k
+            more = end < min(len(cached.pids), MAX_DEPTH)
+            payload.update(
+                offset=offset, limit=k, next_cursor=encode_cursor(end, k) if more else None
+            )
+        return payload, hit
 
     @app.route("/api/search", methods=["GET"])
     def api_search():
         if request.method == "GET":
+            gen = current()
+            try:
+                settings = parse_search_settings(request.args, search_settings)
+                index = gen.lookup_index(request.args.get("index"))
+                pid_filter = gen.lookup_filter(request.args.get("filter"), index)
+                page = parse_page(request.args, request.args.get("k"))
+                fields = parse_fields(request.args.get("fields"))
+                deadline = deadline_for(request.args.get("timeout_ms"))
+            except InvalidRequest as exc:
+                return {"error": str(exc)}, 400
             counter["api"] += 1
-            print("API request count:", counter["api"])
-            return api_search_query(request.args.get("query"), request.args.get("k"))
+            payload, hit = api_search_query(
+                gen,
+                request.args.get("query"),
+                request.args.get("k"),
+                settings,
+                pid_filter,
+                page,
+                fields,
+                index,
+                deadline,
+            )
+            response = json_response(payload)
+            response.headers[CACHE_STATUS_HEADER] = "hit" if hit else "miss"
+            return response
         return ("", 405)
 
+    @app.route("/api/search/batch", methods=["POST"])
+    def api_search_batch():
+        payload = request.get_json(silent=True)
+        timeout_ms = request.args.get("timeout_ms")
+        if isinstance(payload, dict):
+            timeout_ms = payload.get("timeout_ms", timeout_ms)
+            payload = payload.get("queries")
+        if not isinstance(payload, list) or not all(isinstance(item, dict) for item in payload):
+            return {"error": "Expected a JSON list of {query, k} objects."}, 400
+        if len(payload) > MAX_BATCH_QUERIES:
+            return {"error": f"At most {MAX_BATCH_QUERIES} queries per batch are supported."}, 400
+        try:
+            deadline = deadline_for(timeout_ms)
+        except InvalidRequest as exc:
+            return {"error": str(exc)}, 400
+
+        gen = current()
+        requested: list[tuple[Hashable, int] | None] = []
+        deepest: dict[Hashable, int] = {}
+        item_fields: list[tuple[str, ...] | None] = []
+        item_indexes: list[str | None] = []
+        for idx, item in enumerate(payload):
+            query = item.get("query")
+            if not isinstance(query, str):
+                requested.append(None)
+                item_fields.append(None)
+                item_indexes.append(None)
+                continue
+            try:
+                settings = parse_search_settings(item, search_settings)
+                index = gen.lookup_index(item.get("index"))
+                pid_filter = gen.lookup_filter(item.get("filter"), index)
+                item_fields.append(parse_fields(item.get("fields")))
+            except InvalidRequest as exc:
+                return {"error": f"queries[{idx}]: {exc}"}, 400
+            item_indexes.append(index)
+            key = gen.key_for(query, settings, pid_filter, index)
+            k = normalize_k(item.get("k"))
+            requested.append((key, k))
+            deepest[key] = max(k, deepest.get(key, 0))
+
+        counter["api"] += 1
+
+        found = {key: gen.cache.get(key, k) for key, k in deepest.items()}
+        misses = [key for key, hit in found.items() if hit is None]
+        cache_status = "hit" if not misses else "miss" if len(misses) == len(found) else "partial"
+
+        # Search the misses nobody else is computing in one batch, then wait for the rest.
+        claims = {key: gen.flights.claim(key) for key in misses}
+        led = [(key, miss_depth(gen, key, deepest[key])) for key in misses if claims[key][1]]
+        try:
+            results = []
+            if led:
+                with admission.admit(deadline):
+                    results = search_many(gen, led)
+            for (key, depth), result in zip(led, results):
+                found[key] = store(gen, key, result, depth)
+                gen.flights.resolve(key, found[key])
+        except BaseException as exc:
+            for key, _ in led:
+                if found[key] is None:
+                    gen.flights.resolve(key, exc=exc)
+            raise
+        for key in misses:
+            future, leader = claims[key]
+            if not leader:
+                try:
+                    cached = future.result()
+                except SearchRejected:
+                    cached = None
+                found[key] = (
+                    cached
+                    if cached is not None and cached.covers(deepest[key])
+                    else search_once(gen, key, deepest[key], deadline)
+                )
+
+        responses = []
+        for item, entry, fields, index in zip(payload, requested, item_fields, item_indexes):
+            if entry is None:
+                responses.append({"query": "", "topk": []})
+                continue
+            key, k = entry
+            log_query(item["query"], k, "miss" if key in misses else "hit", item)
+            responses.append(respond(gen, item["query"], found[key], k, fields=fields, index=index))
+        response = json_response({"results": responses})
+        response.headers[CACHE_STATUS_HEADER] = cache_status
+        return response
+
+    @app.route("/api/rerank", methods=["POST"])
+    def api_rerank():
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict) or not isinstance(payload.get("query"), str):
+            return {"error": "Expected a JSON object with a query and a list of pids."}, 400
+        pids = payload.get("pids")
+        if not isinstance(pids, list) or not all(type(pid) is int for pid in pids):
+            return {"error": "pids must be a list of integer passage ids."}, 400
+        if len(pids) > MAX_RERANK_PIDS:
+            return {"error": f"At most {MAX_RERANK_PIDS} pids per rerank are supported."}, 400
+        gen = current()
+        try:
+            index = gen.lookup_index(payload.get("index"))
+            fields = parse_fields(payload.get("fields"))
+            deadline = deadline_for(payload.get("timeout_ms"))
+        except InvalidRequest as exc:
+            return {"error": str(exc)}, 400
+        limit = passage_count(gen.searcher(index))
+        if any(pid < 0 or (limit is not None and pid >= limit) for pid in pids):
+            return {"error": f"pids must be between 0 and {limit}."}, 400
+
+        counter["api"] += 1
+        with admission.admit(deadline):
+            pids, scores = rerank(gen.searcher(index), payload["query"], list(dict.fromkeys(pids)))
+        k = len(pids) if payload.get("k") is None else normalize_k(payload["k"])
+        result = CachedResult.from_lists(pids, scores)
+        return json_response(respond(gen, payload["query"], result, k, fields=fields, index=index))
+
+    @app.route("/api/shard", methods=["GET"])
+    def api_shard_info():
+        gen = current()
+        try:
+            index = gen.lookup_index(request.args.get("index"))
+        except InvalidRequest as exc:
+            return {"error": str(exc)}, 400
+        return {"num_passages": passage_count(gen.searcher(index))}
+
+    @app.route("/api/shard/search", methods=["POST"])
+    def api_shard_search():
+        """Rank an already encoded query for a sharded coordinator (see ``shards.py``)."""
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict) or "Q" not in payload:
+            return {"error": "Expected a JSON object with an encoded query Q."}, 400
+        gen = current()
+        try:
+            index = gen.lookup_index(payload.get("index"))
+            settings = parse_search_settings(payload)
+            deadline = deadline_for(payload.get("timeout_ms"))
+            Q = unpack_query(payload["Q"])
+        except ValueError as exc:
+            return {"error": str(exc)}, 400
+        index_searcher = gen.searcher(index)
+        pids = payload.get("pids")
+        if pids is not None:
+            limit = passage_count(index_searcher)
+            if not isinstance(pids, list) or not all(
+                type(pid) is int and pid >= 0 and (limit is None or pid < limit) for pid in pids
+            ):
+                return {"error": f"pids must be integer passage ids below {limit}."}, 400
+
+        counter["api"] += 1
+        config = search_config(index_searcher, MAX_K, settings)
+        with admission.admit(deadline):
+            pids, scores = index_searcher.ranker.rank(config, Q, pids=pids)
+        return json_response({"pids": list(pids), "scores": list(scores)})
+
+    reload_lock = threading.Lock()
+    reload_status: dict[str, object] = {"in_progress": False, "error": None, "seconds": None}
+
+    def warm_generation(gen: _Generation) -> None:
+        for index in gen.indexes:
+            keys = dict.fromkeys(
+                gen.key_for(query, search_settings, None, index) for query in reload_warmup
+            )
+            requests = [(key, miss_depth(gen, key, DEFAULT_K)) for key in keys]
+            for start in range(0, len(requests), MAX_BATCH_QUERIES):
+                chunk = requests[start : start + MAX_BATCH_QUERIES]
+                for (key, depth), result in zip(chunk, search_many(gen, chunk)):
+                    store(gen, key, result, depth)
+
+    def run_reload() -> None:
+        started = time.perf_counter()
+        previous = current()
+        try:
+            gen = load_generation(loader(previous.encoder), previous.version + 1)
+            warm_generation(gen)
+            live["generation"] = gen
+        except Exception as exc:  # The old indexes keep serving
+            logger.exception("Reloading indexes failed; still serving version %d", previous.version)
+            reload_status.update(error=str(exc))
+        else:
+            reload_status.update(error=None)
+            logger.info("Now serving index version %d", gen.version)
+        finally:
+            reload_status.update(in_progress=False, seconds=time.perf_counter() - started)
+            reload_lock.release()
+
+    def start_reload(wait: bool) -> bool:
+        if not reload_lock.acquire(blocking=False):
+            return False
+        reload_status.update(in_progress=True)
+        worker = threading.Thread(target=run_reload, name="colbert-index-reload", daemon=True)
+        worker.start()
+        if wait:
+            worker.join()
+        return True
+
+    def reload_state() -> dict[str, object]:
+        return {"version": current().version, **reload_status}
+
+    if loader is not None:
+        app.extensions[RELOAD_EXTENSION] = start_reload
+
+        @app.route("/admin/reload", methods=["POST"])
+        def admin_reload():
+            if admin_token is not None:
+                expected = f"Bearer {admin_token}"
+                if not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+                    return {"error": "A valid admin token is required."}, 403
+            elif request.remote_addr not in LOOPBACK_ADDRESSES:
+                return {"error": "Reloads are only accepted from localhost."}, 403
+            wait = request.args.get("wait", "").lower() in ("1", "true", "yes")
+            if not start_reload(wait):
+                return {"error": "A reload is already in progress.", **reload_state()}, 409
+            if not wait:
+                return reload_state(), 202
+            return reload_state(), 200 if reload_status["error"] is None else 500
+
+    @app.route("/ready", methods=["GET"])
+    def api_ready():
+        is_ready = readiness.is_set()
+        return {"ready": is_ready}, 200 if is_ready else 503
+
+    @app.route("/api/stats", methods=["GET"])
+    def api_stats():
+        gen = current()
+        filter_sizes = {
+            index: {name: len(pid_filter) for name, pid_filter in named_filters.items()}
+            for index, named_filters in gen.index_filters.items()
+        }
+        return {
+            "requests": counter["api"],
+            "cache": gen.cache.stats(),
+            "batching": batcher.stats() if batcher is not None else None,
+            "single_flight": gen.flights.stats(),
+            "filters": filter_sizes if gen.named else filter_sizes[gen.default_index],
+            "indexes": [index for index in gen.indexes if index is not None],
+            "encodings": gen.encodings.stats() if gen.encodings is not None else None,
+            "reload": reload_state() if loader is not None else None,
+            "admission": admission.stats(),
+        }
+
+    @app.errorhandler(SearchRejected)
+    def search_rejected(exc: SearchRejected) -> Response:
+        response = json_response({"error": str(exc)}, 503)
+        response.headers["Retry-After"] = retry_after_header(exc.retry_after)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype=CONTENT_TYPE_LATEST)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        metrics.in_flight.inc()
+
+    @app.after_request
+    def record_request(response: Response) -> Response:
+        started = g.pop("request_started", None)
+        if started is not None:
+            endpoint = request.endpoint or "unknown"
+            metrics.request_latency.observe(time.perf_counter() - started, endpoint=endpoint)
+            metrics.requests.inc(endpoint=endpoint, status=str(response.status_code))
+        return response
+
+    @app.after_request
+    def compress_response(response: Response) -> Response:
+        # Registered after record_request, so it runs first and is included in the latency.
+        if (
+            compress_level <= 0
+            or response.direct_passthrough
+            or response.mimetype != "application/json"
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+        body = response.get_data()
+        if encoding is None or len(body) < compress_min_bytes:
+            return response
+        with metrics.time_stage(STAGE_SERIALIZE):
+            response.set_data(compress(body, encoding, compress_level))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    @app.teardown_request
+    def finish_request(exc: BaseException | None) -> None:
+        metrics.in_flight.dec()
+
+    metrics.add_callback(
+        "colbert_cache_hits_total", "Result cache hits.", lambda: current().cache.hits, "counter"
+    )
+    metrics.add_callback(
+        "colbert_cache_misses_total",
+        "Result cache misses.",
+        lambda: current().cache.misses,
+        "counter",
+    )
+    metrics.add_callback(
+        "colbert_cache_evictions_total",
+        "Result cache entries evicted to stay within budget.",
+        lambda: current().cache.evictions,
+        "counter",
+    )
+    metrics.add_callback(
+        "colbert_cache_hit_ratio",
+        "Fraction of result cache lookups that were hits.",
+        lambda: current().cache.stats()["hit_ratio"],
+    )
+    metrics.add_callback(
+        "colbert_ready", "1 once warm-up has finished.", lambda: int(readiness.is_set())
+    )
+    metrics.add_callback(
+        "colbert_index_version",
+        "Index reloads swapped in since startup; result cache counters restart with each.",
+        lambda: current().version,
+    )
+    metrics.add_callback(
+        "colbert_cache_entries", "Cached result entries.", lambda: len(current().cache)
+    )
+    metrics.add_callback(
+        "colbert_single_flight_followers_total",
+        "Cache misses that waited for an identical in-flight search instead of searching.",
+        lambda: current().flights.followers,
+        "counter",
+    )
+    metrics.add_callback(
+        "colbert_searches_in_flight",
+        "Searches holding an admission slot.",
+        lambda: admission.inflight,
+    )
+    metrics.add_callback(
+        "colbert_searches_waiting",
+        "Searches queued for an admission slot.",
+        lambda: admission.waiting,
+    )
+    metrics.add_callback(
+        "colbert_searches_rejected_total",
+        "Searches answered with a 503 because every slot and queue position was taken.",
+        lambda: admission.rejected,
+        "counter",
+    )
+    metrics.add_callback(
+        "colbert_searches_expired_total",
+        "Searches dropped because their timeout_ms deadline passed before encoding.",
+        lambda: admission.expired,
+        "counter",
+    )
+    metrics.add_callback(
+        "colbert_batch_queue_depth",
+        "Queries waiting for the next encoder batch.",
+        lambda: batcher.queue_depth() if batcher is not None else 0,
+    )
+
     return app
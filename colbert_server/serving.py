@@ -0,0 +1,482 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import gc
+import os
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from typing import TYPE_CHECKING
+
+from werkzeug.exceptions import InternalServerError
+from werkzeug.serving import (
+    LISTEN_QUEUE,
+    BaseWSGIServer,
+    WSGIRequestHandler,
+    get_sockaddr,
+    select_address_family,
+)
+from werkzeug.wsgi import LimitedStream
+
+from .admission import DEFAULT_RETRY_AFTER, retry_after_header
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from flask import Flask
+
+SERVER_CHOICES = ("threaded", "asgi", "dev")
+DEFAULT_SERVER = "threaded"
+DEFAULT_MAX_QUEUED = 64
+KEEP_ALIVE_TIMEOUT_SECONDS = 5.0
+RESPAWN_DELAY_SECONDS = 1.0
+
+_BUSY_BODY = b'{"error": "Server is overloaded."}\n'
+
+
+def _busy_response(retry_after: float) -> bytes:
+    """The raw 503 sent to connections that arrive while the pool and its queue are full."""
+    return (
+        b"HTTP/1.1 503 Service Unavailable\r\n"
+        b"Content-Type: application/json\r\n"
+        b"Content-Length: %d\r\n"
+        b"Retry-After: %s\r\n"
+        b"Connection: close\r\n"
+        b"\r\n%s"
+    ) % (len(_BUSY_BODY), retry_after_header(retry_after).encode(), _BUSY_BODY)
+
+
+class ServerUnavailableError(RuntimeError):
+    """Raised when the requested HTTP server cannot be started."""
+
+
+def default_thread_count() -> int:
+    """Size the request pool after torch's intra-op thread count (CPU count as a fallback)."""
+    try:
+        import torch
+
+        return max(1, torch.get_num_threads())
+    except ImportError:
+        return max(1, os.cpu_count() or 1)
+
+
+class _KeepAliveRequestHandler(WSGIRequestHandler):
+    """
+    Werkzeug request handler that keeps HTTP/1.1 connections open between requests.
+
+    Werkzeug closes every connection after one response because it cannot drain unread
+    request bodies safely. Here the body is wrapped in a ``LimitedStream`` that is exhausted
+    after the app runs, and the (small, JSON) response is buffered so it always carries a
+    ``Content-Length``. Chunked or ``Expect: 100-continue`` requests fall back to
+    Werkzeug's close-after-response behaviour.
+
+    A handler only serves the requests that have already arrived; it then reports through
+    ``keep_alive`` whether the connection can wait for its next request, which
+    :class:`PooledWSGIServer` does off the worker thread.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle's algorithm on, a keep-alive client
+    # waits for a delayed ACK before the body arrives.
+    disable_nagle_algorithm = True
+    # A request that has started arriving must arrive completely within this many seconds.
+    timeout = KEEP_ALIVE_TIMEOUT_SECONDS
+    keep_alive = False
+
+    def handle(self) -> None:
+        self.close_connection = True
+        try:
+            self.handle_one_request()
+            while not self.close_connection and self._request_pending():
+                self.handle_one_request()
+        except (ConnectionError, socket.timeout) as err:
+            self.connection_dropped(err)
+            self.close_connection = True
+        self.keep_alive = not self.close_connection
+
+    def _request_pending(self) -> bool:
+        # Pipelined requests may already sit in rfile's buffer, where a selector cannot see
+        # them, so they are served now rather than parked.
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def run_wsgi(self) -> None:
+        transfer_encoding = self.headers.get("Transfer-Encoding", "").lower()
+        if "chunked" in transfer_encoding or self.headers.get("Expect"):
+            super().run_wsgi()
+            return
+
+        environ = self.environ = self.make_environ()
+        try:
+            content_length = max(int(environ.get("CONTENT_LENGTH") or 0), 0)
+        except ValueError:
+            content_length = 0
+        body = LimitedStream(self.rfile, content_length)
+        environ["wsgi.input"] = body
+
+        response: list[object] = []
+
+        def start_response(status, headers, exc_info=None):  # type: ignore[no-untyped-def]
+            response[:] = [status, headers]
+            return chunks.append
+
+        chunks: list[bytes] = []
+        try:
+            application_iter = self.server.app(environ, start_response)
+            try:
+                chunks.extend(application_iter)
+            finally:
+                if hasattr(application_iter, "close"):
+                    application_iter.close()
+        except Exception:  # Flask handles app errors; this is a last resort
+            self.server.log("error", "Error on request:\n%s", traceback.format_exc())
+            chunks.clear()
+            response[:] = []
+            for chunk in InternalServerError()(environ, start_response):
+                chunks.append(chunk)
+            self.close_connection = True
+        body.exhaust()
+
+        status, headers = response
+        code, _, reason = str(status).partition(" ")
+        payload = b"".join(chunks)
+        try:
+            self.send_response(int(code), reason)
+            has_length = False
+            for key, value in headers:
+                if key.lower() == "connection":
+                    continue
+                has_length = has_length or key.lower() == "content-length"
+                self.send_header(key, value)
+            if not has_length:
+                self.send_header("Content-Length", str(len(payload)))
+            if self.close_connection:
+                self.send_header("Connection", "close")
+            self.end_headers()
+            if environ["REQUEST_METHOD"] != "HEAD":
+                self.wfile.write(payload)
+            self.wfile.flush()
+        except (ConnectionError, TimeoutError) as err:
+            self.connection_dropped(err, environ)
+            self.close_connection = True
+
+    def log_request(self, code: int | str = "-", size: int | str = "-") -> None:
+        # Per-request access logging is a synchronous write on the hot path.
+        pass
+
+    def log_error(self, format: str, *args) -> None:
+        # Idle keep-alive connections timing out are expected, not errors.
+        if not format.startswith("Request timed out"):
+            super().log_error(format, *args)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Werkzeug WSGI server that hands connections to a fixed-size worker thread pool.
+
+    At most ``threads`` connections are served concurrently and up to ``max_queued`` more
+    wait for a free worker; beyond that, connections get an immediate 503 instead of piling
+    up, carrying ``Retry-After: <retry_after>`` like the app's own overload responses. The
+    acceptor thread never runs application code, so one slow search cannot stall
+    the others. Between requests, keep-alive connections are parked on a selector rather
+    than holding a worker, so idle clients never take threads from busy ones; they are
+    closed after ``KEEP_ALIVE_TIMEOUT_SECONDS`` of silence.
+    """
+
+    multithread = True
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        app: Flask,
+        *,
+        threads: int,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+        retry_after: float = DEFAULT_RETRY_AFTER,
+        fd: int | None = None,
+    ) -> None:
+        super().__init__(host, port, app, handler=_KeepAliveRequestHandler, fd=fd)
+        self.threads = threads
+        self.max_queued = max_queued
+        self._busy_response = _busy_response(retry_after)
+        self._slots = threading.BoundedSemaphore(threads + max_queued)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="colbert-http")
+        self._idle = selectors.DefaultSelector()
+        self._parked: list[tuple[socket.socket, object]] = []
+        self._park_lock = threading.Lock()
+        self._closing = False
+        self._ready_waiting = False
+        self._wakeup, self._waker = socket.socketpair()
+        self._waker.setblocking(False)
+        self._idle.register(self._wakeup, selectors.EVENT_READ)
+        threading.Thread(target=self._watch_idle, name="colbert-http-idle", daemon=True).start()
+
+    def process_request(self, request: socket.socket, client_address) -> None:
+        if not self._slots.acquire(blocking=False):
+            try:
+                request.sendall(self._busy_response)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self._executor.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request: socket.socket, client_address) -> None:
+        keep_alive = False
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+            keep_alive = handler.keep_alive
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self._slots.release()
+            if self._ready_waiting:
+                self._wake()
+            if not (keep_alive and self._park(request, client_address)):
+                self.shutdown_request(request)
+
+    def _park(self, request: socket.socket, client_address) -> bool:
+        with self._park_lock:
+            if self._closing:
+                return False
+            self._parked.append((request, client_address))
+            self._wake()
+        return True
+
+    def _wake(self) -> None:
+        try:
+            self._waker.send(b"\0")
+        except OSError:
+            pass  # A wake-up is already pending, or the server has closed.
+
+    def _watch_idle(self) -> None:
+        """
+        Hand parked connections back to the pool when their next request arrives.
+
+        Those connections were already admitted, so when every slot is taken they wait for
+        one to free up instead of being turned away.
+        """
+        ready: deque[tuple[socket.socket, object]] = deque()
+        while True:
+            with self._park_lock:
+                if self._closing:
+                    break
+                arrivals, self._parked = self._parked, []
+            now = time.monotonic()
+            for request, client_address in arrivals:
+                expires = now + KEEP_ALIVE_TIMEOUT_SECONDS
+                self._idle.register(request, selectors.EVENT_READ, (client_address, expires))
+            parked = [key for key in self._idle.get_map().values() if key.data is not None]
+            for key in parked:
+                if key.data[1] <= now:
+                    self._idle.unregister(key.fileobj)
+                    self.shutdown_request(key.fileobj)
+            expiries = [key.data[1] for key in parked if key.data[1] > now]
+            timeout = min(expiries) - now if expiries else None
+            for key, _ in self._idle.select(timeout):
+                if key.data is None:
+                    self._wakeup.recv(4096)
+                    continue
+                self._idle.unregister(key.fileobj)
+                ready.append((key.fileobj, key.data[0]))
+            # Set before trying for a slot, so a worker releasing one right after wakes us.
+            self._ready_waiting = bool(ready)
+            while ready and self._slots.acquire(blocking=False):
+                request, client_address = ready.popleft()
+                self._executor.submit(self._process_request_thread, request, client_address)
+            self._ready_waiting = bool(ready)
+
+        for key in list(self._idle.get_map().values()):
+            if key.data is not None:
+                self.shutdown_request(key.fileobj)
+        for request, _ in (*self._parked, *ready):
+            self.shutdown_request(request)
+        self._idle.close()
+        self._wakeup.close()
+        self._waker.close()
+
+    def server_close(self) -> None:
+        super().server_close()
+        if hasattr(self, "_park_lock"):
+            with self._park_lock:
+                if not self._closing:
+                    self._closing = True
+                    self._wake()
+        if hasattr(self, "_executor"):
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def drain(self) -> None:
+        """Wait for requests that are already being served to finish."""
+        self._executor.shutdown(wait=True)
+
+
+def _bind_listener(host: str, port: int) -> socket.socket:
+    family = select_address_family(host, port)
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(get_sockaddr(host, port, family))
+    listener.listen(LISTEN_QUEUE)
+    listener.set_inheritable(True)
+    return listener
+
+
+def _run_worker(
+    app: Flask, host: str, port: int, fd: int, threads: int, max_queued: int, retry_after: float
+) -> None:
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    httpd = PooledWSGIServer(
+        host, port, app, threads=threads, max_queued=max_queued, retry_after=retry_after, fd=fd
+    )
+    # SIGTERM stops accepting; requests already in flight are allowed to finish.
+    signal.signal(
+        signal.SIGTERM, lambda *_: threading.Thread(target=httpd.shutdown, daemon=True).start()
+    )
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.drain()
+
+
+def serve_prefork(
+    app: Flask,
+    host: str,
+    port: int,
+    *,
+    workers: int,
+    threads: int | None = None,
+    max_queued: int = DEFAULT_MAX_QUEUED,
+    retry_after: float = DEFAULT_RETRY_AFTER,
+) -> None:
+    """
+    Serve ``app`` from ``workers`` forked processes sharing one listening socket.
+
+    Everything loaded before the call (the ColBERT index, the collection, the app and its
+    cache) is shared with the workers copy-on-write, so N workers cost roughly one index
+    worth of memory. Crashed workers are replaced; SIGTERM/SIGINT on the parent stops all
+    of them gracefully. Each worker runs a :class:`PooledWSGIServer` with ``threads``
+    request threads and an equal share of the CPU for torch's intra-op pool.
+    """
+    if not hasattr(os, "fork"):
+        raise ServerUnavailableError("--workers requires a platform with fork() (Linux/macOS).")
+
+    cpu_share = max(1, (os.cpu_count() or 1) // workers)
+    threads = threads or cpu_share
+    listener = _bind_listener(host, port)
+    children: set[int] = set()
+    stopping = False
+
+    # Move everything allocated so far out of the collector's view, so garbage collection
+    # in the workers does not write to (and thereby copy) the shared pages.
+    gc.collect()
+    gc.freeze()
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid:
+            children.add(pid)
+            return
+        exit_code = 0
+        try:
+            torch = sys.modules.get("torch")
+            if torch is not None:
+                torch.set_num_threads(cpu_share)
+            _run_worker(app, host, port, listener.fileno(), threads, max_queued, retry_after)
+        except BaseException:  # Never let a worker unwind into the parent loop
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(workers):
+        spawn()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            children.discard(pid)
+            if not stopping:
+                print(
+                    f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; "
+                    "starting a replacement.",
+                    file=sys.stderr,
+                )
+                time.sleep(RESPAWN_DELAY_SECONDS)
+                spawn()
+    finally:
+        listener.close()
+
+
+def _run_asgi(app: Flask, host: str, port: int, *, threads: int, max_queued: int) -> None:
+    try:
+        from a2wsgi import WSGIMiddleware
+        import uvicorn
+    except ImportError as err:
+        raise ServerUnavailableError(
+            "The asgi server needs uvicorn and a2wsgi. Install them alongside colbert-server, "
+            "e.g. `uv tool install colbert-server --with uvicorn --with a2wsgi`."
+        ) from err
+
+    # a2wsgi runs the Flask app in its own thread pool, off uvicorn's event loop.
+    uvicorn.run(
+        WSGIMiddleware(app, workers=threads),
+        host=host,
+        port=port,
+        limit_concurrency=threads + max_queued,
+        timeout_keep_alive=int(KEEP_ALIVE_TIMEOUT_SECONDS),
+        access_log=False,
+    )
+
+
+def run_server(
+    app: Flask,
+    host: str,
+    port: int,
+    *,
+    server: str = DEFAULT_SERVER,
+    threads: int | None = None,
+    max_queued: int = DEFAULT_MAX_QUEUED,
+    retry_after: float = DEFAULT_RETRY_AFTER,
+) -> None:
+    """
+    Serve ``app`` until interrupted.
+
+    ``threaded`` uses :class:`PooledWSGIServer`, ``asgi`` runs uvicorn (optional
+    dependency) and ``dev`` falls back to Flask's development server.
+    """
+    threads = threads or default_thread_count()
+    if server == "dev":
+        app.run(host=host, port=port)
+    elif server == "threaded":
+        httpd = PooledWSGIServer(
+            host, port, app, threads=threads, max_queued=max_queued, retry_after=retry_after
+        )
+        httpd.serve_forever()
+    elif server == "asgi":
+        _run_asgi(app, host, port, threads=threads, max_queued=max_queued)
+    else:
+        raise ServerUnavailableError(
+            f"Unknown server '{server}'. Choose one of: {', '.join(SERVER_CHOICES)}."
+        )
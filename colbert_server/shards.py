@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import base64
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import http.client
+import json
+import os
+from pathlib import Path
+import socket
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+import urllib.parse
+
+from .collection_store import CollectionStore
+from .serving import ServerUnavailableError
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from colbert.modeling.checkpoint import Checkpoint
+
+DEFAULT_SHARD_TIMEOUT = 30.0
+SHARD_STARTUP_TIMEOUT = 600.0
+DEFAULT_SHARD_THREADS = 8
+
+
+class ShardError(ServerUnavailableError):
+    """Raised when a shard cannot be reached or answers with an error."""
+
+
+def pack_query(Q) -> dict[str, object]:
+    """Serialize an encoded query tensor for ``POST /api/shard/search`` as base64 float32."""
+    array = Q.detach().float().contiguous().cpu().numpy()
+    data = base64.b64encode(array.tobytes()).decode("ascii")
+    return {"dtype": "float32", "shape": list(array.shape), "data": data}
+
+
+def unpack_query(payload: object):
+    """Invert :func:`pack_query`; raises ``ValueError`` for malformed payloads."""
+    if not isinstance(payload, dict):
+        raise ValueError("Q must be an object with float32 'data' and a 'shape'.")
+    shape = payload.get("shape")
+    if payload.get("dtype", "float32") != "float32" or not isinstance(shape, list):
+        raise ValueError("Q must hold float32 'data' with a 'shape'.")
+    try:
+        raw = base64.b64decode(payload.get("data", ""), validate=True)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Q data is not valid base64.") from exc
+
+    import torch  # Import lazily; only shards of a real index receive tensors
+
+    try:
+        return torch.frombuffer(bytearray(raw), dtype=torch.float32).reshape(shape)
+    except RuntimeError as exc:
+        raise ValueError(f"Q data does not match shape {shape}.") from exc
+
+
+class ShardClient:
+    """
+    HTTP client for one shard: any ``colbert-server`` serving part of an index.
+
+    Connections are kept alive and reused across requests; one the shard has closed in the
+    meantime is reopened and the request retried once.
+    """
+
+    def __init__(self, base_url: str, *, timeout: float = DEFAULT_SHARD_TIMEOUT) -> None:
+        parsed = urllib.parse.urlsplit(base_url)
+        if parsed.scheme != "http" or not parsed.hostname:
+            raise ShardError(f"Shard URL must look like http://host:port, got {base_url!r}.")
+        self.base_url = base_url.rstrip("/")
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.prefix = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self._idle: list[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _request(self, method: str, path: str, payload: object | None = None) -> dict:
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        reused = connection.sock is not None
+        try:
+            try:
+                connection.request(method, self.prefix + path, body, headers)
+                response = connection.getresponse()
+            except ConnectionError:
+                if not reused:
+                    raise
+                connection.close()
+                connection.request(method, self.prefix + path, body, headers)
+                response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as exc:
+            connection.close()
+            raise ShardError(f"Shard {self.base_url} failed: {exc}") from exc
+        if response.will_close:
+            connection.close()
+        else:
+            with self._lock:
+                self._idle.append(connection)
+        if response.status != 200:
+            raise ShardError(f"Shard {self.base_url} answered {response.status}: {data[:200]!r}")
+        return json.loads(data)
+
+    def info(self) -> dict:
+        return self._request("GET", "/api/shard")
+
+    def search(self, payload: dict[str, object]) -> tuple[list[int], list[float]]:
+        result = self._request("POST", "/api/shard/search", payload)
+        return result["pids"], result["scores"]
+
+
+class ShardedRanker:
+    """
+    Scatter-gather stand-in for ColBERT's ``IndexScorer``.
+
+    ``rank`` sends the encoded query and the PLAID settings of ``config`` to every shard in
+    parallel, maps each shard's local pids into one global pid space (shard ``i`` owns the
+    pids after all passages of shards ``0..i-1``), and merges the per-shard rankings by
+    score. Each shard returns its full ranking, so the merged top-``k`` is exactly the
+    top-``k`` over the union of the shards' candidates. Up to ``threads_per_shard``
+    requests per shard are in flight at once.
+    """
+
+    def __init__(
+        self, shards: Sequence[ShardClient], *, threads_per_shard: int = DEFAULT_SHARD_THREADS
+    ) -> None:
+        if not shards:
+            raise ShardError("Sharded search needs at least one shard.")
+        self.shards = list(shards)
+        self.threads = len(self.shards) * max(1, threads_per_shard)
+        self.sizes = [int(shard.info()["num_passages"]) for shard in self.shards]
+        self.offsets = [sum(self.sizes[:idx]) for idx in range(len(self.sizes))]
+        self.num_passages = sum(self.sizes)
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_pid: int | None = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Created per process: prefork workers must not inherit the parent's dead threads.
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix="colbert-shard")
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def rank(self, config, Q, filter_fn=None, pids=None):
+        if filter_fn is not None:
+            raise ValueError("Filters are not supported with sharded search.")
+        base = {
+            "Q": pack_query(Q),
+            "ncells": config.ncells,
+            "centroid_score_threshold": config.centroid_score_threshold,
+            "ndocs": config.ndocs,
+        }
+        calls = []
+        for shard, offset, size in zip(self.shards, self.offsets, self.sizes):
+            payload = base
+            if pids is not None:
+                local = [pid - offset for pid in pids if offset <= pid < offset + size]
+                if not local:
+                    continue
+                payload = {**base, "pids": local}
+            calls.append((offset, self._executor().submit(shard.search, payload)))
+
+        rankings = []
+        for offset, future in calls:
+            shard_pids, shard_scores = future.result()
+            rankings.append(
+                [(-score, pid + offset) for pid, score in zip(shard_pids, shard_scores)]
+            )
+        merged = list(heapq.merge(*rankings))
+        return [pid for _, pid in merged], [-score for score, _ in merged]
+
+
+class ShardedSearcher:
+    """
+    ``Searcher``-compatible coordinator over index shards.
+
+    Queries are encoded once, locally, with ``checkpoint`` (anything with ColBERT's
+    ``queryFromText``) and ranked by :class:`ShardedRanker`. Passage text comes from
+    ``collection``, which holds the whole collection in global pid order.
+    """
+
+    def __init__(self, checkpoint, shards: Sequence[ShardClient], *, collection=None, config=None):
+        self.checkpoint = checkpoint
+        self.collection = collection
+        self.config = config or SimpleNamespace(
+            ncells=None, centroid_score_threshold=None, ndocs=None
+        )
+        self.ranker = ShardedRanker(shards)
+
+    def encode(self, text, full_length_search=False):
+        queries = text if type(text) is list else [text]
+        bsize = 128 if len(queries) > 128 else None
+        return self.checkpoint.queryFromText(
+            queries, bsize=bsize, to_cpu=True, full_length_search=full_length_search
+        )
+
+
+def load_query_encoder(checkpoint: str) -> tuple[Checkpoint, object]:
+    """Load only the query encoder of ``checkpoint``; return it and its ``ColBERTConfig``."""
+    from colbert.infra import ColBERTConfig  # Import lazily to avoid eager torch loading
+    from colbert.modeling.checkpoint import Checkpoint
+
+    config = ColBERTConfig.from_existing(
+        ColBERTConfig.load_from_checkpoint(checkpoint), ColBERTConfig(checkpoint=checkpoint)
+    )
+    encoder = Checkpoint(checkpoint, colbert_config=config)
+    if config.total_visible_gpus > 0:
+        encoder = encoder.cuda()
+    return encoder, config
+
+
+def create_sharded_searcher(
+    shard_urls: Sequence[str],
+    checkpoint: str,
+    *,
+    collection_path: str | Path | None = None,
+    collection_store: str | Path | None = None,
+    timeout: float = DEFAULT_SHARD_TIMEOUT,
+    encoder_from: ShardedSearcher | None = None,
+) -> ShardedSearcher:
+    """
+    Connect to ``shard_urls`` (in pid order) and load the coordinator's query encoder.
+
+    With ``encoder_from``, that coordinator's loaded encoder is reused instead.
+    """
+    shards = [ShardClient(url, timeout=timeout) for url in shard_urls]
+    if encoder_from is not None:
+        encoder, config = encoder_from.checkpoint, encoder_from.config
+    else:
+        encoder, config = load_query_encoder(checkpoint)
+    collection = None
+    if collection_store is not None:
+        collection = CollectionStore(collection_store)
+    elif collection_path is not None:
+        from colbert.data import Collection
+
+        collection = Collection(path=str(collection_path))
+    return ShardedSearcher(encoder, shards, collection=collection, config=config)
+
+
+def _free_port(host: str) -> int:
+    with socket.socket() as probe:
+        probe.bind((host, 0))
+        return probe.getsockname()[1]
+
+
+def start_local_shards(
+    commands: Sequence[Sequence[str]],
+    *,
+    host: str = "127.0.0.1",
+    startup_timeout: float = SHARD_STARTUP_TIMEOUT,
+) -> tuple[list[str], Callable[[], None]]:
+    """
+    Start one local shard server per command and wait until every one is ready.
+
+    Each command is a ``colbert-server serve`` argument list without ``--host``/``--port``,
+    which are appended here. Returns the shard URLs and a callback that stops them.
+    """
+    processes, urls = [], []
+
+    def stop() -> None:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    try:
+        for command in commands:
+            port = _free_port(host)
+            argv = [sys.executable, "-m", "colbert_server", *command]
+            processes.append(subprocess.Popen([*argv, "--host", host, "--port", str(port)]))
+            urls.append(f"http://{host}:{port}")
+
+        deadline = time.monotonic() + startup_timeout
+        for process, url in zip(processes, urls):
+            while not _is_ready(url):
+                if process.poll() is not None:
+                    raise ShardError(f"Shard {url} exited with status {process.returncode}.")
+                if time.monotonic() > deadline:
+                    raise ShardError(f"Shard {url} was not ready after {startup_timeout:.0f}s.")
+                time.sleep(0.5)
+    except BaseException:
+        stop()
+        raise
+    return urls, stop
+
+
+def _is_ready(url: str) -> bool:
+    parsed = urllib.parse.urlsplit(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=5)
+    try:
+        connection.request("GET", "/ready")
+        return connection.getresponse().status == 200
+    except OSError:
+        return False
+    finally:
+        connection.close()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping, Sequence
+import http.client
+import json
+from pathlib import Path
+import time
+from typing import TYPE_CHECKING
+import urllib.parse
+
+from .server import MAX_BATCH_QUERIES, WARMUP_HEADER
+from .serving import ServerUnavailableError
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from flask import Flask
+
+DEFAULT_WARMUP_QUERIES = 64
+_PRETOUCH_CHUNK_BYTES = 1 << 20
+
+
+def pretouch(paths: Iterable[str | Path]) -> int:
+    """
+    Read files (or every file under a directory) once so their pages are in the OS cache.
+
+    Memory-mapped indexes and collection stores otherwise fault their pages in on the first
+    queries that touch them. Returns the number of bytes read.
+    """
+    total = 0
+    buffer = bytearray(_PRETOUCH_CHUNK_BYTES)
+    for root in paths:
+        root = Path(root)
+        files = sorted(root.rglob("*")) if root.is_dir() else [root]
+        for path in filter(Path.is_file, files):
+            try:
+                with path.open("rb", buffering=0) as handle:
+                    while read := handle.readinto(buffer):
+                        total += read
+            except OSError:
+                continue
+    return total
+
+
+def _batch_items(
+    queries: Sequence[str | Mapping[str, object]], k: int, index: str | None = None
+) -> list[dict[str, object]]:
+    """Turn plain queries and logged request items into batch API items searching ``k``."""
+    target = {"index": index} if index is not None else {}
+    return [
+        {**target, **({"query": query} if isinstance(query, str) else query), "k": k}
+        for query in queries
+    ]
+
+
+def warm_up(
+    app: Flask,
+    queries: Sequence[str | Mapping[str, object]],
+    *,
+    batch_size: int = 32,
+    k: int = 10,
+    index: str | None = None,
+) -> dict[str, float]:
+    """
+    Run ``queries`` through ``app`` before it takes traffic.
+
+    One query goes through ``GET /api/search`` and the rest through ``/api/search/batch``
+    in groups of ``batch_size``, so lazy torch initialization, the encoder at both batch
+    shapes, index pages and the result cache are all warm for the first real request.
+    ``index`` selects the index on an app that serves several. A query may also be a batch
+    item such as :func:`~colbert_server.querylog.top_requests` returns, whose own index,
+    filter and settings win over ``index``. The queries are not written to the query log.
+    """
+    started = time.perf_counter()
+    client = app.test_client()
+    client.environ_base["HTTP_" + WARMUP_HEADER.upper().replace("-", "_")] = "1"
+    items = _batch_items(queries, k, index)
+    if items:
+        client.get("/api/search", query_string=items[0])
+    batch_size = max(1, min(batch_size, MAX_BATCH_QUERIES))
+    for start in range(1, len(items), batch_size):
+        client.post("/api/search/batch", json=items[start : start + batch_size])
+    return {"queries": len(queries), "seconds": time.perf_counter() - started}
+
+
+def warm_up_remote(
+    base_url: str,
+    queries: Sequence[str | Mapping[str, object]],
+    *,
+    batch_size: int = 32,
+    k: int = 10,
+    timeout: float = 300.0,
+) -> dict[str, float]:
+    """
+    Send ``queries`` to a running server's ``/api/search/batch`` to fill its cache.
+
+    Queries may be batch items carrying an index, filter and settings, as with
+    :func:`warm_up`. The batches carry the warm-up header, so the server keeps them out of
+    its query log. A batch the server rejects as invalid (say, a logged index that is no
+    longer served) is retried one item at a time, and the items it still rejects are skipped.
+    """
+    started = time.perf_counter()
+    parsed = urllib.parse.urlsplit(base_url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+    path = parsed.path.rstrip("/") + "/api/search/batch"
+    headers = {"Content-Type": "application/json", WARMUP_HEADER: "1"}
+
+    def send(batch: list[dict[str, object]]) -> int:
+        connection.request("POST", path, json.dumps(batch).encode(), headers)
+        response = connection.getresponse()
+        response.read()
+        if response.status not in (200, 400):
+            raise ServerUnavailableError(
+                f"{base_url} answered {response.status} {response.reason} to a warm-up batch."
+            )
+        return response.status
+
+    items = _batch_items(queries, k)
+    batch_size = max(1, min(batch_size, MAX_BATCH_QUERIES))
+    try:
+        for start in range(0, len(items), batch_size):
+            batch = items[start : start + batch_size]
+            if send(batch) == 400 and len(batch) > 1:
+                for item in batch:
+                    send([item])
+    except OSError as exc:
+        raise ServerUnavailableError(f"Could not reach {base_url}: {exc}") from exc
+    finally:
+        connection.close()
+    return {"queries": len(queries), "seconds": time.perf_counter() - started}
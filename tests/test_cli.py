@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import argparse
 from io import StringIO
+import json
 from pathlib import Path
 import sys
 from unittest import mock
@@ -9,6 +10,7 @@ from unittest import mock
 import pytest
 
 import colbert_server.__init__ as cli
+from colbert_server.collection_store import CollectionStore
 
 
 def test_doctor_success(monkeypatch: mock.MagicMock) -> None:
@@ -110,6 +112,13 @@ def test_serve_from_cache_mock(monkeypatch: mock.MagicMock, tmp_path: Path) -> N
         ),
         mock.patch("colbert_server.__init__.create_searcher"),
         mock.patch("colbert_server.__init__.create_app") as mock_app,
+        mock.patch(
+            "colbert_server.__init__.warm_up", return_value={"queries": 4, "seconds": 0.0}
+        ) as mock_warm_up,
+        mock.patch("colbert_server.__init__.set_ready") as mock_set_ready,
+        mock.patch(
+            "colbert_server.__init__.check_encoder_backend", return_value=0.95
+        ) as mock_check_encoder,
     ):
         cli.handle_serve(
             argparse.Namespace(
@@ -119,15 +128,166 @@ def test_serve_from_cache_mock(monkeypatch: mock.MagicMock, tmp_path: Path) -> N
                 extract_to=None,
                 index_root=None,
                 index_name=None,
+                all_indexes=False,
+                sharded=False,
+                shard=None,
+                admin_token=None,
                 collection_path=None,
+                collection_store=None,
                 repo_id=cli.DATASET_REPO_ID,
                 revision=None,
                 hf_token=None,
                 cache_dir=None,
                 checkpoint=cli.DEFAULT_CHECKPOINT,
                 cache_size=cli.DEFAULT_CACHE_SIZE,
+                cache_max_mb=cli.DEFAULT_CACHE_MAX_MB,
+                cache_ttl=None,
+                cache_path=None,
+                cold_search_depth=cli.MAX_K,
+                batch_window_ms=0.0,
+                max_batch_size=cli.DEFAULT_MAX_BATCH_SIZE,
+                mmap_index=False,
+                memory_budget=None,
+                encoder_backend="int8",
+                encoder_check=2,
+                encoder_min_overlap=0.9,
+                warmup=True,
+                warmup_queries=None,
+                warmup_count=4,
+                pretouch=True,
+                query_log=None,
+                query_log_max_mb=cli.DEFAULT_QUERY_LOG_MAX_MB,
+                query_log_backups=cli.DEFAULT_QUERY_LOG_BACKUPS,
+                prewarm_log=None,
+                prewarm_top=cli.DEFAULT_PREWARM_TOP,
+                compress_level=cli.DEFAULT_COMPRESS_LEVEL,
+                search_preset="fast",
+                ncells=None,
+                centroid_score_threshold=None,
+                ndocs=512,
                 host="127.0.0.1",
                 port=8000,
+                server="dev",
+                threads=None,
+                workers=1,
+                max_queued=cli.DEFAULT_MAX_QUEUED,
+                max_inflight=4,
+                max_waiting=cli.DEFAULT_MAX_WAITING,
+                request_timeout_ms=None,
+                retry_after=cli.DEFAULT_RETRY_AFTER,
             )
         )
         mock_app.return_value.run.assert_called_once()
+        assert mock_app.call_args.kwargs["ready"] is False
+        assert mock_app.call_args.kwargs["max_inflight"] == 4
+        mock_warm_up.assert_called_once()
+        mock_set_ready.assert_called_once_with(mock_app.return_value)
+        settings = mock_app.call_args.kwargs["search_settings"]
+        assert settings == cli.SEARCH_PRESETS["fast"]._replace(ndocs=512)
+        assert mock_check_encoder.call_args.args[1] == "int8"
+        assert len(mock_check_encoder.call_args.args[2]) == 2
+        assert "+int8#" in mock_app.call_args.kwargs["cache_namespace"]
+
+
+def test_serve_all_indexes_loads_the_encoder_once(tmp_path: Path) -> None:
+    for name in ("news", "wiki"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "0.codes.pt").write_bytes(b"")
+    (tmp_path / "notes").mkdir()
+
+    args = cli.build_parser().parse_args(["serve", "--index-root", str(tmp_path), "--all-indexes"])
+    with (
+        mock.patch("colbert_server.__init__.create_searcher") as mock_searcher,
+        mock.patch("colbert_server.__init__.create_app") as mock_app,
+        mock.patch("colbert_server.__init__.run_server"),
+        mock.patch.object(sys, "stdout", StringIO()),
+    ):
+        assert args.func(args) == 0
+
+    calls = mock_searcher.call_args_list
+    assert [call.kwargs["index_name"] for call in calls] == ["news", "wiki"]
+    assert calls[0].kwargs["encoder_from"] is None
+    assert calls[1].kwargs["encoder_from"] is mock_searcher.return_value
+    assert list(mock_app.call_args.args[0]) == ["news", "wiki"]
+    assert mock_app.call_args.kwargs["filters"] == {"news": {}, "wiki": {}}
+
+    # A reload re-lists the index root and keeps using the loaded encoder.
+    (tmp_path / "blogs").mkdir()
+    (tmp_path / "blogs" / "0.codes.pt").write_bytes(b"")
+    encoder = mock.sentinel.encoder
+    with (
+        mock.patch("colbert_server.__init__.create_searcher") as mock_searcher,
+        mock.patch.object(sys, "stdout", StringIO()),
+    ):
+        reloaded = mock_app.call_args.kwargs["loader"](encoder)
+    assert list(reloaded.searcher) == ["blogs", "news", "wiki"]
+    assert mock_searcher.call_args_list[0].kwargs["encoder_from"] is encoder
+    assert reloaded.cache_namespace.count("@") == 3
+
+
+def test_serve_rejects_workers_without_threaded_server_before_loading(
+    monkeypatch: mock.MagicMock, capsys
+) -> None:
+    monkeypatch.setenv("COLBERT_SERVER_DISABLE_UPDATE_CHECK", "1")
+    with mock.patch("colbert_server.__init__._load_indexes") as mock_load:
+        exit_code = cli.main(["serve", "--workers", "2", "--server", "asgi"])
+
+    assert exit_code == 1 and "--server threaded" in capsys.readouterr().err
+    mock_load.assert_not_called()
+
+
+def test_build_collection_store_infers_collection(tmp_path: Path) -> None:
+    collection_dir = tmp_path / "collection"
+    collection_dir.mkdir()
+    (collection_dir / "collection.tsv").write_text("0\tmock text\n")
+    (tmp_path / "indexes" / "mock-index").mkdir(parents=True)
+
+    args = cli.build_parser().parse_args(
+        ["build-collection-store", "--dataset-root", str(tmp_path)]
+    )
+    with mock.patch.object(sys, "stdout", StringIO()):
+        assert args.func(args) == 0
+
+    assert (collection_dir / "collection.cstore").exists()
+
+
+def test_serve_rebuilds_a_stale_collection_store(tmp_path: Path) -> None:
+    collection = tmp_path / "collection.tsv"
+    collection.write_text("0\told text\n")
+    store = cli.build_collection_store(collection)
+    collection.write_text("0\tnew text\n1\tadded\n")
+
+    with mock.patch.object(sys, "stdout", StringIO()):
+        assert cli._resolve_collection_store(None, collection) == store
+    assert list(CollectionStore(store)) == ["new text", "added"]
+
+    collection.write_text("0\tedited again\n")
+    with pytest.raises(cli.DatasetLayoutError, match="not built from the current"):
+        cli._resolve_collection_store(store, collection)
+
+
+def test_bench_synthetic_reports_hit_and_miss_latency(capsys) -> None:
+    exit_code = cli.main(
+        [
+            "bench",
+            "--synthetic",
+            "--num-queries",
+            "40",
+            "--distinct",
+            "5",
+            "--concurrency",
+            "2",
+            "--synthetic-encode-ms",
+            "0",
+            "--synthetic-search-ms",
+            "0",
+            "--json",
+        ]
+    )
+
+    assert exit_code == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report["requests"] == 40 and report["errors"] == 0
+    assert report["hit"]["count"] + report["miss"]["count"] == 40
+    assert 1 <= report["miss"]["count"] <= 10
+    assert report["all"]["p99_ms"] >= report["all"]["p50_ms"]
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from colbert_server.collection_store import (
+    CollectionStore,
+    build_collection_store,
+    default_store_path,
+    store_is_current,
+)
+from colbert_server.data import DatasetLayoutError
+
+
+def test_collection_store_round_trips_passages(tmp_path: Path) -> None:
+    collection = tmp_path / "collection.tsv"
+    collection.write_text("0\tfirst passage\n1\tsecond ünïcode\tTitle\n2\t\n", encoding="utf-8")
+
+    store_path = build_collection_store(collection)
+    store = CollectionStore(store_path)
+
+    assert store_path == default_store_path(collection)
+    assert len(store) == 3
+    assert store[0] == "first passage"
+    assert store[1] == "Title | second ünïcode"
+    assert list(store)[2] == ""
+    with pytest.raises(IndexError):
+        store[3]
+
+
+def test_collection_store_rejects_misnumbered_pids(tmp_path: Path) -> None:
+    collection = tmp_path / "collection.tsv"
+    collection.write_text("0\tfirst\n5\tsecond\n", encoding="utf-8")
+
+    with pytest.raises(DatasetLayoutError):
+        build_collection_store(collection)
+
+
+def test_collection_store_records_its_source_and_rejects_old_formats(tmp_path: Path) -> None:
+    collection = tmp_path / "collection.tsv"
+    collection.write_text("0\tfirst\n", encoding="utf-8")
+    store_path = build_collection_store(collection)
+    assert store_is_current(store_path, collection)
+
+    collection.write_text("0\tfirst\n1\tsecond\n", encoding="utf-8")
+    assert not store_is_current(store_path, collection)
+
+    store_path.write_bytes(b"CBCOLL01" + bytes(64))
+    assert not store_is_current(store_path, collection)
+    with pytest.raises(DatasetLayoutError, match="older colbert-server"):
+        CollectionStore(store_path)
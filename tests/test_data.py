@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import hashlib
+import io
+from pathlib import Path
+import tarfile
+import zipfile
+
+import pytest
+
+from colbert_server.data import (
+    DatasetLayoutError,
+    extract_archives,
+    load_extract_manifest,
+)
+
+
+def _add_file(bundle: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size, info.mtime = len(data), 1_500_000_000
+    bundle.addfile(info, io.BytesIO(data))
+
+
+def test_extract_archives_runs_in_parallel_and_resumes(tmp_path: Path) -> None:
+    archives = tmp_path / "snapshot" / "archives"
+    archives.mkdir(parents=True)
+    codes = b"\x01" * 300_000
+    with tarfile.open(archives / "indexes.tar.gz", "w:gz") as bundle:
+        _add_file(bundle, "indexes/wiki/0.codes.pt", codes)
+        _add_file(bundle, "indexes/wiki/metadata.json", b"{}")
+    with zipfile.ZipFile(archives / "collection.zip", "w") as bundle:
+        bundle.writestr("collection/collection.tsv", "0\tpassage\n")
+    (archives / "README.md").write_text("not an archive")
+    out = tmp_path / "out"
+
+    assert extract_archives(tmp_path / "snapshot", out, jobs=2) == out
+    assert (out / "indexes/wiki/0.codes.pt").read_bytes() == codes
+    assert (out / "indexes/wiki/0.codes.pt").stat().st_mtime == 1_500_000_000
+    manifest = load_extract_manifest(out)
+    assert sorted(manifest) == ["collection.zip", "indexes.tar.gz"]
+    first = manifest["indexes.tar.gz"]["files"][0]
+    assert first == {
+        "path": "indexes/wiki/0.codes.pt",
+        "size": len(codes),
+        "sha256": hashlib.sha256(codes).hexdigest(),
+    }
+
+    # Complete archives are skipped; one with a missing file is extracted again, and the
+    # .part files of an interrupted run are cleaned up.
+    (out / "collection/collection.tsv").unlink()
+    (out / "indexes/wiki/metadata.json").write_text("[]")
+    (out / "indexes/wiki/1.codes.pt.part").write_bytes(b"partial")
+    extract_archives(tmp_path / "snapshot", out)
+    assert (out / "collection/collection.tsv").read_text() == "0\tpassage\n"
+    assert (out / "indexes/wiki/metadata.json").read_text() == "[]"
+    assert not list(out.rglob("*.part"))
+
+    # A same-size corruption passes the size check but not verification.
+    extract_archives(tmp_path / "snapshot", out, verify=True)
+    assert (out / "indexes/wiki/metadata.json").read_text() == "{}"
+
+
+def test_extract_archives_rejects_corrupt_and_unsafe_archives(tmp_path: Path) -> None:
+    archives = tmp_path / "archives"
+    archives.mkdir()
+    with tarfile.open(archives / "evil.tar", "w") as bundle:
+        _add_file(bundle, "../escaped.txt", b"x")
+    with pytest.raises(DatasetLayoutError):
+        extract_archives(tmp_path, tmp_path / "out")
+    assert not (tmp_path / "escaped.txt").exists()
+
+    (archives / "evil.tar").write_bytes(b"not a tar file at all" * 40)
+    with pytest.raises(DatasetLayoutError, match="evil.tar"):
+        extract_archives(tmp_path, tmp_path / "out")
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import pytest
+
+from colbert_server.bench import SyntheticSearcher
+from colbert_server.encoder import apply_encoder_backend, check_encoder_backend, topk_overlap
+
+
+def test_topk_overlap_averages_per_query_fractions() -> None:
+    reference = [[1, 2, 3, 4], [5, 6], []]
+    candidate = [[4, 3, 9, 8], [5, 6], [1]]
+
+    assert topk_overlap(reference, candidate) == pytest.approx((0.5 + 1.0) / 2)
+    assert topk_overlap([], []) == 1.0
+
+
+def test_eager_backend_check_matches_itself() -> None:
+    searcher = SyntheticSearcher(encode_ms=0, search_ms=0)
+
+    assert check_encoder_backend(searcher, "eager", ["halloween", "the fog"], k=5) == 1.0
+    with pytest.raises(ValueError, match="Unknown encoder backend"):
+        apply_encoder_backend(searcher, "fp4")
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from colbert_server.data import DatasetLayoutError
+from colbert_server.filters import build_filter, filters_dir, load_filters
+
+
+def test_build_filter_matches_titles_and_round_trips(tmp_path: Path) -> None:
+    collection = tmp_path / "collection.tsv"
+    collection.write_text(
+        "0\tHalloween (film) | A 1978 horror film.\n"
+        "1\tThe Fog | A 1980 film.\n"
+        "2\tA 1981 sequel.\tHalloween II\n"
+        "3\tSomething else | text\n"
+    )
+
+    pid_filter = build_filter(collection, "halloween", title_prefixes=["HALLOWEEN"], pids=[3])
+    path = pid_filter.save(filters_dir(tmp_path, "idx") / "halloween.filter")
+
+    loaded = load_filters(path.parent)["halloween"]
+    assert loaded.pids() == [0, 2, 3] and len(loaded) == 3 and loaded.key == pid_filter.key
+    assert loaded([3, 1, 0, 9]) == [3, 0]
+    with pytest.raises(DatasetLayoutError):
+        build_filter(collection, "bad/name", pids=[0])
+    with pytest.raises(DatasetLayoutError):
+        build_filter(collection, "oob", pids=[4])
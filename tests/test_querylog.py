@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from colbert_server import server
+from colbert_server.bench import SyntheticSearcher, serve_in_background
+from colbert_server.querylog import QueryLog, log_files, top_queries, top_requests
+from colbert_server.warmup import warm_up, warm_up_remote
+
+
+def test_query_log_rotates_and_ranks_head_queries(tmp_path: Path) -> None:
+    path = tmp_path / "queries.log"
+    query_log = QueryLog(path, max_bytes=170, backups=2)
+    client = server.create_app(SyntheticSearcher(search_ms=0), query_log=query_log)
+    client = client.test_client()
+
+    for query in ["Halloween Movie"] * 4 + ["john carpenter"] * 2 + ["fog"]:
+        client.get("/api/search", query_string={"query": query, "k": 3})
+    client.post("/api/search/batch", json=[{"query": "FOG"}, {"query": "fog"}])
+    query_log.close()
+
+    assert [file.name for file in log_files(path)] == [
+        "queries.log",
+        "queries.log.1",
+        "queries.log.2",
+    ]
+    assert top_queries(path, 2) == ["halloween movie", "fog"]
+    fields = path.read_text().splitlines()[-1].split("\t")
+    assert fields[2:] == ["10", "hit", "", "fog"]
+
+
+def test_prewarm_replays_logged_index_filter_and_settings(tmp_path: Path) -> None:
+    path = tmp_path / "queries.log"
+    # A line written before the log recorded request parameters still counts.
+    path.write_text("1.000\t2.00\t10\tmiss\tfog\n")
+    query_log = QueryLog(path)
+    logged = server.create_app(SyntheticSearcher(search_ms=0), query_log=query_log)
+    client = logged.test_client()
+    for _ in range(2):
+        client.get("/api/search", query_string={"query": "Fog", "preset": "fast", "ndocs": 512})
+    client.post("/api/search/batch", json=[{"query": "rain", "ncells": 3, "fields": "text"}])
+    query_log.close()
+
+    requests = top_requests(path, 10)
+    assert requests == [
+        {"query": "fog", "ndocs": "512", "preset": "fast"},
+        {"query": "fog"},
+        {"query": "rain", "ncells": "3"},
+    ]
+    assert top_queries(path, 10) == ["fog", "rain"]
+
+    app = server.create_app(SyntheticSearcher(search_ms=0))
+    warm_up(app, requests, batch_size=2, k=50)
+    client = app.test_client()
+    for params in ({"preset": "fast", "ndocs": 512}, {}):
+        response = client.get("/api/search", query_string={"query": "fog", **params})
+        assert response.headers["X-Cache"] == "hit"
+    response = client.post("/api/search/batch", json=[{"query": "rain", "ncells": 3}])
+    assert response.headers["X-Cache"] == "hit"
+
+
+def test_warm_up_remote_fills_a_running_server_cache_without_logging(tmp_path: Path) -> None:
+    query_log = QueryLog(tmp_path / "queries.log")
+    searcher = SyntheticSearcher(search_ms=0)
+    app = server.create_app(searcher, query_log=query_log)
+    url, stop = serve_in_background(app, threads=2)
+    try:
+        # A stale logged filter fails its batch; the rest of that batch is still warmed.
+        queries = [*(f"query {idx}" for idx in range(5)), {"query": "stale", "filter": "gone"}]
+        summary = warm_up_remote(url, queries, batch_size=2, k=50)
+    finally:
+        stop()
+    warm_up(app, ["fog", "rain", "sun"], batch_size=2)
+    query_log.close()
+
+    assert summary["queries"] == 6
+    stats = app.test_client().get("/api/stats").get_json()
+    assert stats["requests"] == 5 and stats["cache"]["entries"] == 8
+    # Neither warm-up path writes to the query log, so it never skews prewarm rankings.
+    assert log_files(query_log.path) == [] and top_queries(query_log.path, 10) == []
@@ -0,0 +1,616 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import json
+from pathlib import Path
+import threading
+import time
+from types import SimpleNamespace
+import zlib
+
+import pytest
+
+from colbert_server import server
+from colbert_server.batching import QueryBatcher
+from colbert_server.cache import CachedResult, ResultCache
+from colbert_server.data import DatasetLayoutError
+from colbert_server.filters import PidFilter
+from colbert_server.warmup import pretouch, warm_up
+
+
+class FakeRanker:
+    def __init__(self, num_passages: int) -> None:
+        self.num_passages = num_passages
+        self.ndocs_seen: list[int] = []
+        self.settings_seen: list[tuple] = []
+
+    def retrieve(self, config, Q):
+        (query,) = Q
+        seed = zlib.crc32(query.encode())
+        ranked = [(seed + step * 7) % self.num_passages for step in range(self.num_passages)]
+        return list(dict.fromkeys(ranked)), None
+
+    def score_pids(self, config, Q, pids, centroid_scores):
+        return [30.0 - 0.1 * idx for idx in range(len(pids))], pids
+
+    def rank(self, config, Q, filter_fn=None, pids=None):
+        # Same call structure as colbert's IndexScorer.rank.
+        if pids is not None:
+            scores, pids = self.score_pids(config, Q, list(pids), None)
+            return pids, scores
+        self.ndocs_seen.append(config.ndocs)
+        self.settings_seen.append((config.ncells, config.centroid_score_threshold, config.ndocs))
+        pids, centroid_scores = self.retrieve(config, Q)
+        if filter_fn is not None:
+            pids = filter_fn(pids)
+        scores, pids = self.score_pids(config, Q, pids, centroid_scores)
+        return pids, scores
+
+
+class FakeSearcher:
+    """Deterministic stand-in for ``colbert.Searcher`` that records encoder calls."""
+
+    def __init__(self, num_passages: int = 500) -> None:
+        self.collection = [f"passage {pid}" for pid in range(num_passages)]
+        self.config = SimpleNamespace(ncells=None, centroid_score_threshold=None, ndocs=None)
+        self.ranker = FakeRanker(num_passages)
+        self.encode_calls: list[list[str]] = []
+
+    def encode(self, text, full_length_search=False):
+        queries = text if type(text) is list else [text]
+        self.encode_calls.append(list(queries))
+        return list(queries)
+
+
+def test_search_returns_topk() -> None:
+    client = server.create_app(FakeSearcher()).test_client()
+
+    payload = client.get("/api/search", query_string={"query": "halloween", "k": 3}).get_json()
+
+    assert payload["query"] == "halloween"
+    assert len(payload["topk"]) == 3
+    assert abs(sum(item["prob"] for item in payload["topk"]) - 1.0) < 1e-9
+    assert payload["topk"][0]["text"] == f"passage {payload['topk'][0]['pid']}"
+
+    response = client.get("/api/search")
+    assert response.get_json() == {"query": "", "topk": []}
+    assert response.headers["X-Cache"] == "miss"
+
+
+def test_batch_search_encodes_once_and_matches_single_queries() -> None:
+    searcher = FakeSearcher()
+    client = server.create_app(searcher).test_client()
+
+    response = client.post(
+        "/api/search/batch",
+        json=[{"query": "first", "k": 2}, {"query": "second"}, {"k": 4}],
+    )
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert searcher.encode_calls == [["first", "second"]]
+    assert [len(result["topk"]) for result in results] == [2, server.DEFAULT_K, 0]
+
+    single = client.get("/api/search", query_string={"query": "first", "k": 2}).get_json()
+    assert results[0] == single
+
+
+def test_batch_search_rejects_malformed_payload() -> None:
+    client = server.create_app(FakeSearcher()).test_client()
+
+    assert client.post("/api/search/batch", json={"query": "x"}).status_code == 400
+    assert client.post("/api/search/batch", data="not json").status_code == 400
+
+
+def test_query_batcher_coalesces_concurrent_queries() -> None:
+    seen: list[list[str]] = []
+
+    def run_batch(queries: list[str]) -> list[str]:
+        seen.append(queries)
+        return [query.upper() for query in queries]
+
+    batcher = QueryBatcher(run_batch, window_ms=2000, max_batch_size=3)
+    futures = [batcher.submit(query) for query in ("a", "b", "c")]
+
+    assert [future.result(timeout=5) for future in futures] == ["A", "B", "C"]
+    assert seen == [["a", "b", "c"]]
+    stats = batcher.stats()
+    assert stats["batches"] == 1
+    assert stats["mean_occupancy"] == 1.0
+
+
+def test_search_with_batching_enabled_reports_stats() -> None:
+    client = server.create_app(FakeSearcher(), batch_window_ms=1).test_client()
+
+    unbatched = server.create_app(FakeSearcher()).test_client()
+    expected = unbatched.get("/api/search", query_string={"query": "q", "k": 5}).get_json()
+
+    assert client.get("/api/search", query_string={"query": "q", "k": 5}).get_json() == expected
+    assert client.get("/api/stats").get_json()["batching"]["queries"] == 1
+
+
+def test_concurrent_misses_for_one_query_share_a_single_search() -> None:
+    release = threading.Event()
+
+    class SlowSearcher(FakeSearcher):
+        def encode(self, text, full_length_search=False):
+            release.wait(timeout=5)
+            return super().encode(text, full_length_search)
+
+    searcher = SlowSearcher()
+    app = server.create_app(searcher)
+    queries = ["Halloween movie", "halloween  MOVIE", "halloween movie", "Halloween Movie"]
+    with ThreadPoolExecutor(len(queries)) as pool:
+        futures = [
+            pool.submit(
+                lambda query: app.test_client().get("/api/search", query_string={"query": query}),
+                query,
+            )
+            for query in queries
+        ]
+        client = app.test_client()
+        deadline = time.monotonic() + 5
+        while client.get("/api/stats").get_json()["single_flight"]["followers"] < 3:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        release.set()
+        topks = [future.result().get_json()["topk"] for future in futures]
+
+    assert searcher.encode_calls == [["halloween movie"]]
+    assert all(topk == topks[0] for topk in topks)
+    assert client.get("/api/stats").get_json()["single_flight"]["in_flight"] == 0
+
+
+def test_search_settings_apply_per_request_and_split_the_cache() -> None:
+    searcher = FakeSearcher()
+    client = server.create_app(searcher, search_settings=server.SEARCH_PRESETS["balanced"])
+    client = client.test_client()
+    seen = searcher.ranker.settings_seen
+
+    for params in ({}, {"preset": "fast"}, {"preset": "fast", "ndocs": 64}, {"preset": "fast"}):
+        response = client.get("/api/search", query_string={"query": "q", **params})
+        assert response.status_code == 200
+
+    assert seen == [(2, 0.45, 1024), (1, 0.5, 256), (1, 0.5, 64)]
+    assert searcher.config.ndocs is None
+
+    batch = client.post("/api/search/batch", json=[{"query": "q", "preset": "exhaustive"}])
+    assert batch.status_code == 200 and seen[-1] == (4, 0.4, 4096)
+    for params in ({"preset": "turbo"}, {"ncells": "many"}, {"ndocs": 0}):
+        response = client.get("/api/search", query_string={"query": "q", **params})
+        assert response.status_code == 400
+
+
+def test_warm_up_fills_cache_before_reporting_ready(tmp_path: Path) -> None:
+    searcher = FakeSearcher()
+    app = server.create_app(searcher, ready=False)
+    client = app.test_client()
+    assert client.get("/ready").status_code == 503
+
+    summary = warm_up(app, [f"query {idx}" for idx in range(5)], batch_size=2)
+    server.set_ready(app)
+
+    assert summary["queries"] == 5
+    assert [len(batch) for batch in searcher.encode_calls] == [1, 2, 2]
+    assert client.get("/ready").get_json() == {"ready": True}
+    response = client.get("/api/search", query_string={"query": "Query 3"})
+    assert response.headers[server.CACHE_STATUS_HEADER] == "hit"
+
+    (tmp_path / "idx").mkdir()
+    (tmp_path / "idx" / "0.codes.pt").write_bytes(b"c" * 10)
+    (tmp_path / "collection.tsv").write_text("0\tpassage")
+    assert pretouch([tmp_path / "idx", tmp_path / "collection.tsv", tmp_path / "gone"]) == 19
+
+
+def test_rerank_scores_only_the_supplied_pids() -> None:
+    searcher = FakeSearcher(num_passages=50)
+    client = server.create_app(searcher).test_client()
+
+    response = client.post("/api/rerank", json={"query": "q", "pids": [7, 3, 7, 42]})
+
+    assert response.status_code == 200
+    assert [item["pid"] for item in response.get_json()["topk"]] == [7, 3, 42]
+    assert searcher.encode_calls == [["q"]]
+    assert searcher.ranker.ndocs_seen == []
+    truncated = client.post("/api/rerank", json={"query": "q", "pids": [1, 2, 3], "k": 2})
+    assert len(truncated.get_json()["topk"]) == 2
+    for payload in ({"query": "q", "pids": [50]}, {"query": "q", "pids": ["1"]}, {"pids": [1]}):
+        assert client.post("/api/rerank", json=payload).status_code == 400
+
+
+def test_filtered_search_returns_full_k_from_filtered_passages() -> None:
+    class ShallowRanker(FakeRanker):
+        def retrieve(self, config, Q):
+            pids, centroid_scores = super().retrieve(config, Q)
+            return pids[: config.ncells * 40], centroid_scores
+
+    searcher = FakeSearcher(num_passages=4000)
+    searcher.ranker = ShallowRanker(4000)
+    even = PidFilter.from_pids("even", range(0, 4000, 2), 4000)
+    tiny = PidFilter.from_pids("tiny", [5, 17, 1999], 4000)
+    small = PidFilter.from_pids("small", range(0, 1500, 3), 4000)
+    filters = {"even": even, "tiny": tiny, "small": small}
+    client = server.create_app(searcher, filters=filters).test_client()
+
+    topk = client.get("/api/search", query_string={"query": "q", "k": 50, "filter": "even"})
+    pids = [item["pid"] for item in topk.get_json()["topk"]]
+    assert len(pids) == 50 and all(pid % 2 == 0 for pid in pids)
+    # Two cells give 80 candidates, 40 of them even; filling the cached depth of 100 takes
+    # two widenings.
+    assert [seen[0] for seen in searcher.ranker.settings_seen] == [2, 4, 8]
+
+    searches = len(searcher.ranker.settings_seen)
+    tiny_topk = client.get("/api/search", query_string={"query": "q", "filter": "tiny"})
+    assert sorted(item["pid"] for item in tiny_topk.get_json()["topk"]) == [5, 17, 1999]
+    # Scored directly, without candidate generation.
+    assert len(searcher.ranker.settings_seen) == searches
+    # Only filters within the fully scored budget (ndocs // 4) skip candidate generation.
+    client.get("/api/search", query_string={"query": "q", "filter": "small"})
+    ndocs = searcher.ranker.settings_seen[searches][2]
+    assert len(searcher.ranker.settings_seen) > searches and ndocs // 4 < small.count <= ndocs
+    unfiltered = client.get("/api/search", query_string={"query": "q", "k": 50})
+    assert unfiltered.headers[server.CACHE_STATUS_HEADER] == "miss"
+    bad = client.get("/api/search", query_string={"query": "q", "filter": "odd"})
+    assert bad.status_code == 400
+
+
+def test_multiple_indexes_share_one_encoding_per_query() -> None:
+    wiki, news = FakeSearcher(num_passages=500), FakeSearcher(num_passages=40)
+    recent = PidFilter.from_pids("recent", range(30, 40), 40)
+    app = server.create_app({"wiki": wiki, "news": news}, filters={"news": {"recent": recent}})
+    client = app.test_client()
+
+    default = client.get("/api/search", query_string={"query": "Fog", "k": 5}).get_json()
+    other = client.get("/api/search", query_string={"query": "fog", "k": 5, "index": "news"})
+    batch = client.post(
+        "/api/search/batch",
+        json=[{"query": "fog", "index": "news", "filter": "recent"}, {"query": "moon"}],
+    ).get_json()
+
+    # The first searcher encodes for both indexes, each query once.
+    assert wiki.encode_calls == [["fog"], ["moon"]] and news.encode_calls == []
+    assert other.headers[server.CACHE_STATUS_HEADER] == "miss"
+    assert all(item["pid"] < 40 for item in other.get_json()["topk"])
+    assert default["topk"] != other.get_json()["topk"]
+    assert all(30 <= item["pid"] < 40 for item in batch["results"][0]["topk"])
+    stats = client.get("/api/stats").get_json()
+    assert stats["indexes"] == ["wiki", "news"] and stats["encodings"]["hits"] == 2
+    assert stats["filters"] == {"wiki": {}, "news": {"recent": 10}}
+    for params in ({"index": "web"}, {"index": "wiki", "filter": "recent"}):
+        response = client.get("/api/search", query_string={"query": "q", **params})
+        assert response.status_code == 400
+    single = server.create_app(FakeSearcher()).test_client()
+    assert single.get("/api/search", query_string={"query": "q", "index": "x"}).status_code == 400
+
+
+def test_reload_swaps_indexes_while_in_flight_requests_finish_on_the_old_ones() -> None:
+    old, new = FakeSearcher(num_passages=500), FakeSearcher(num_passages=40)
+    new.collection = [f"new passage {pid}" for pid in range(40)]
+    release = threading.Event()
+    old_rank = old.ranker.rank
+    old.ranker.rank = lambda *args, **kwargs: release.wait(5) and old_rank(*args, **kwargs)
+    loaded_with = []
+
+    def loader(encoder):
+        loaded_with.append(encoder)
+        return server.IndexSet(new, cache_namespace="v2")
+
+    app = server.create_app(old, loader=loader, reload_warmup=["fog"], admin_token="secret")
+    client = app.test_client()
+    with ThreadPoolExecutor(1) as pool:
+        in_flight = pool.submit(client.get, "/api/search", query_string={"query": "moon"})
+        while not old.encode_calls:
+            time.sleep(0.01)
+
+        denied = client.post("/admin/reload")
+        reloaded = client.post(
+            "/admin/reload?wait=1", headers={"Authorization": "Bearer secret"}
+        ).get_json()
+        warm = client.get("/api/search", query_string={"query": "fog", "k": 5})
+        release.set()
+        assert in_flight.result().get_json()["topk"][0]["text"].startswith("passage ")
+
+    assert denied.status_code == 403 and loaded_with == [old]
+    assert reloaded["version"] == 1 and reloaded["error"] is None
+    assert warm.headers[server.CACHE_STATUS_HEADER] == "hit" and new.encode_calls == [["fog"]]
+    # The old index's late result landed in its own cache, not the new one.
+    after = client.get("/api/search", query_string={"query": "moon"})
+    assert after.headers[server.CACHE_STATUS_HEADER] == "miss"
+    assert after.get_json()["topk"][0]["text"].startswith("new passage ")
+    assert client.get("/api/stats").get_json()["reload"]["version"] == 1
+
+    def broken(encoder):
+        raise DatasetLayoutError("index is half-written")
+
+    app = server.create_app(FakeSearcher(), loader=broken)
+    assert server.reload_indexes(app, wait=True)
+    stats = app.test_client().get("/api/stats").get_json()["reload"]
+    assert stats["version"] == 0 and "half-written" in stats["error"]
+    with pytest.raises(ValueError):
+        server.reload_indexes(server.create_app(FakeSearcher()))
+
+
+def test_admission_control_sheds_load_but_serves_cache_hits() -> None:
+    searcher = FakeSearcher()
+    release = threading.Event()
+    rank = searcher.ranker.rank
+    searcher.ranker.rank = lambda *args, **kwargs: release.wait(5) and rank(*args, **kwargs)
+    app = server.create_app(searcher, max_inflight=1, max_waiting=1, retry_after=2.5)
+    client = app.test_client()
+    release.set()
+    client.get("/api/search", query_string={"query": "sun"})
+    release.clear()
+
+    with ThreadPoolExecutor(2) as pool:
+        running = pool.submit(client.get, "/api/search", query_string={"query": "moon"})
+        while not any("moon" in call for call in searcher.encode_calls):
+            time.sleep(0.01)
+        stale = pool.submit(
+            client.get, "/api/search", query_string={"query": "rain", "timeout_ms": 50}
+        )
+        while not app.test_client().get("/api/stats").get_json()["admission"]["waiting"]:
+            time.sleep(0.01)
+        shed = client.post("/api/search/batch", json=[{"query": "fog"}])
+        hit = client.get("/api/search", query_string={"query": "sun"})
+        assert stale.result().status_code == 503
+        release.set()
+        assert running.result().status_code == 200
+
+    assert shed.status_code == 503 and shed.headers["Retry-After"] == "3"
+    assert hit.status_code == 200 and hit.headers[server.CACHE_STATUS_HEADER] == "hit"
+    assert not any("rain" in call or "fog" in call for call in searcher.encode_calls)
+    stats = client.get("/api/stats").get_json()["admission"]
+    assert (stats["rejected"], stats["expired"], stats["inflight"]) == (1, 1, 0)
+    assert (
+        client.get("/api/search", query_string={"query": "q", "timeout_ms": -1}).status_code == 400
+    )
+
+    # Queries that go stale while waiting for an encoder batch are dropped before encoding.
+    batched = FakeSearcher()
+    client = server.create_app(batched, batch_window_ms=300, max_batch_size=8).test_client()
+    response = client.get("/api/search", query_string={"query": "late", "timeout_ms": 20})
+    assert response.status_code == 503 and batched.encode_calls == []
+
+
+def test_deadlines_apply_to_their_own_request_not_to_single_flight_followers() -> None:
+    searcher = FakeSearcher()
+    release = threading.Event()
+    rank = searcher.ranker.rank
+    searcher.ranker.rank = lambda *args, **kwargs: release.wait(5) and rank(*args, **kwargs)
+    app = server.create_app(searcher, max_inflight=1)
+    client = app.test_client()
+
+    def stats() -> dict:
+        return app.test_client().get("/api/stats").get_json()
+
+    with ThreadPoolExecutor(4) as pool:
+        busy = pool.submit(client.get, "/api/search", query_string={"query": "moon"})
+        while not searcher.encode_calls:
+            time.sleep(0.01)
+        # The leader of "rain" has a tight deadline; its follower has none.
+        leader = pool.submit(
+            client.get, "/api/search", query_string={"query": "rain", "timeout_ms": 300}
+        )
+        while not stats()["admission"]["waiting"]:
+            time.sleep(0.01)
+        followers = [
+            pool.submit(client.post, "/api/search/batch", json=[{"query": "rain"}]),
+            pool.submit(client.get, "/api/search", query_string={"query": "rain"}),
+        ]
+        while stats()["single_flight"]["followers"] < 2:
+            time.sleep(0.01)
+
+        assert leader.result().status_code == 503
+        assert not any(follower.done() for follower in followers)
+        release.set()
+        assert busy.result().status_code == 200
+        batch, single = (follower.result() for follower in followers)
+
+    assert batch.status_code == 200 and batch.get_json()["results"][0]["topk"]
+    assert single.status_code == 200 and single.get_json()["topk"]
+    assert sum("rain" in call for call in searcher.encode_calls) == 1
+
+
+def test_pagination_pages_through_one_deep_search() -> None:
+    class DepthSensitiveRanker(FakeRanker):
+        # Like PLAID's pruning, searches at different depths rank passages differently.
+        def retrieve(self, config, Q):
+            pids, centroid_scores = super().retrieve(config, Q)
+            shift = config.ndocs % len(pids)
+            return pids[shift:] + pids[:shift], centroid_scores
+
+    searcher = FakeSearcher(num_passages=500)
+    searcher.ranker = DepthSensitiveRanker(500)
+    client = server.create_app(searcher).test_client()
+    # A shallow unpaginated search is already cached; pages must not be cut from it.
+    plain = client.get("/api/search", query_string={"query": "q", "k": 10}).get_json()
+
+    pages, params = [], {"query": "q", "limit": 50, "offset": 0}
+    while params is not None:
+        payload = client.get("/api/search", query_string=params).get_json()
+        pages.append(payload)
+        cursor = payload["next_cursor"]
+        params = {"query": "q", "cursor": cursor} if cursor else None
+
+    pids = [item["pid"] for page in pages for item in page["topk"]]
+    ranks = [item["rank"] for page in pages for item in page["topk"]]
+    # Page boundaries neither overlap nor leave gaps.
+    assert len(pages) == 10 and ranks == list(range(1, 501))
+    assert len(set(pids)) == 500 and sorted(pids) == list(range(500))
+    # The first page ran the one deep search; every later page was a cache hit.
+    assert len(searcher.encode_calls) == 2 and searcher.ranker.ndocs_seen[1:] == [4096]
+    # Paging does not replace the ranking plain requests for the same query are served.
+    again = client.get("/api/search", query_string={"query": "q", "k": 10})
+    assert again.headers[server.CACHE_STATUS_HEADER] == "hit"
+    assert again.get_json()["topk"] == plain["topk"]
+
+    unpaged = client.get("/api/search", query_string={"query": "q", "k": 5}).get_json()
+    assert "next_cursor" not in unpaged and len(unpaged["topk"]) == 5
+    for params in ({"offset": 1000}, {"offset": "x"}, {"cursor": "not-a-cursor"}):
+        response = client.get("/api/search", query_string={"query": "q", **params})
+        assert response.status_code == 400
+
+
+def test_fields_projection_skips_text_and_responses_compress() -> None:
+    class CountingCollection(list):
+        lookups = 0
+
+        def __getitem__(self, pid):
+            CountingCollection.lookups += 1
+            return super().__getitem__(pid)
+
+    searcher = FakeSearcher()
+    searcher.collection = CountingCollection(searcher.collection)
+    client = server.create_app(searcher, compress_min_bytes=256).test_client()
+
+    lean = client.get("/api/search", query_string={"query": "q", "k": 3, "fields": "pid,score"})
+    assert [set(item) for item in lean.get_json()["topk"]] == [{"pid", "score"}] * 3
+    assert CountingCollection.lookups == 0
+    batch = client.post("/api/search/batch", json=[{"query": "q", "fields": ["pid"]}])
+    assert set(batch.get_json()["results"][0]["topk"][0]) == {"pid"}
+    bad = client.get("/api/search", query_string={"query": "q", "fields": "pid,body"})
+    assert bad.status_code == 400
+
+    plain = client.get("/api/search", query_string={"query": "q", "k": 50})
+    for encoding, decompress in (("gzip", gzip.decompress), ("deflate", zlib.decompress)):
+        response = client.get(
+            "/api/search",
+            query_string={"query": "q", "k": 50},
+            headers={"Accept-Encoding": f"br, {encoding}"},
+        )
+        assert response.headers["Content-Encoding"] == encoding
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert json.loads(decompress(response.data)) == plain.get_json()
+        assert len(response.data) < len(plain.data) / 2
+    assert "Content-Encoding" not in plain.headers
+
+
+def test_result_cache_normalizes_keys_and_counts_hits() -> None:
+    searcher = FakeSearcher()
+    client = server.create_app(searcher).test_client()
+
+    client.get("/api/search", query_string={"query": "Halloween  Movie", "k": "010"})
+    client.get("/api/search", query_string={"query": "halloween movie"})
+
+    assert len(searcher.encode_calls) == 1
+    stats = client.get("/api/stats").get_json()["cache"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_result_cache_enforces_byte_budget_and_ttl() -> None:
+    now = [0.0]
+    result = CachedResult.from_lists(range(100), [1.0] * 100)
+    cache = ResultCache(max_bytes=3 * (result.nbytes() + 400), ttl_seconds=10, clock=lambda: now[0])
+
+    for idx in range(5):
+        cache.put(("query", idx), result)
+    assert len(cache) == 3
+    assert cache.evictions == 2
+    assert cache.get(("query", 0)) is None
+
+    now[0] = 11.0
+    assert cache.get(("query", 4)) is None
+    assert cache.expirations == 1
+
+
+def test_cache_serves_smaller_k_from_one_search() -> None:
+    searcher = FakeSearcher()
+    client = server.create_app(searcher).test_client()
+
+    payloads = [
+        client.get("/api/search", query_string={"query": "q", "k": k}).get_json()
+        for k in (10, 3, 5)
+    ]
+
+    assert len(searcher.encode_calls) == 1
+    assert [len(payload["topk"]) for payload in payloads] == [10, 3, 5]
+    assert payloads[1]["topk"] == [
+        {**item, "prob": payloads[1]["topk"][idx]["prob"]}
+        for idx, item in enumerate(payloads[0]["topk"][:3])
+    ]
+    assert abs(sum(item["prob"] for item in payloads[1]["topk"]) - 1.0) < 1e-9
+
+
+def test_cold_search_depth_deepens_on_larger_k() -> None:
+    searcher = FakeSearcher()
+    client = server.create_app(searcher, cold_search_depth=3).test_client()
+
+    client.get("/api/search", query_string={"query": "q", "k": 3})
+    client.get("/api/search", query_string={"query": "q", "k": 2})
+    client.get("/api/search", query_string={"query": "q", "k": 20})
+    client.get("/api/search", query_string={"query": "q", "k": 50})
+
+    assert len(searcher.encode_calls) == 2
+    assert searcher.ranker.ndocs_seen == [256, 1024]
+    assert searcher.config.ndocs is None
+
+
+def test_persistent_cache_survives_restart_and_is_namespaced(tmp_path: Path) -> None:
+    cache_path = tmp_path / "results.sqlite"
+    first = FakeSearcher()
+    client = server.create_app(first, cache_path=cache_path, cache_namespace="idx-a").test_client()
+    expected = client.get("/api/search", query_string={"query": "q", "k": 5}).get_json()
+
+    restarted = FakeSearcher()
+    client = server.create_app(
+        restarted, cache_path=cache_path, cache_namespace="idx-a"
+    ).test_client()
+    assert client.get("/api/search", query_string={"query": "q", "k": 5}).get_json() == expected
+    assert restarted.encode_calls == []
+    assert client.get("/api/stats").get_json()["cache"]["store_hits"] == 1
+
+    other_index = FakeSearcher()
+    client = server.create_app(
+        other_index, cache_path=cache_path, cache_namespace="idx-b"
+    ).test_client()
+    client.get("/api/search", query_string={"query": "q", "k": 5})
+    assert other_index.encode_calls == [["q"]]
+
+
+def test_index_fingerprint_changes_when_index_files_change(tmp_path: Path) -> None:
+    index_dir = tmp_path / "idx"
+    index_dir.mkdir()
+    (index_dir / "metadata.json").write_text("{}")
+    before = server.index_fingerprint(tmp_path, "idx", "ckpt")
+
+    (index_dir / "0.codes.pt").write_bytes(b"codes")
+
+    assert server.index_fingerprint(tmp_path, "idx", "ckpt") != before
+    assert before.startswith("idx@ckpt#")
+
+
+def test_memory_budget_picks_mmap_for_large_single_chunk_indexes(tmp_path: Path) -> None:
+    index_dir = tmp_path / "idx"
+    index_dir.mkdir()
+    (index_dir / "metadata.json").write_text(json.dumps({"num_chunks": 1}))
+    (index_dir / "0.codes.pt").write_bytes(b"c" * 400)
+    (index_dir / "0.residuals.pt").write_bytes(b"r" * 600)
+
+    assert server.resident_index_bytes(tmp_path, "idx") == 1000
+    assert not server.use_mmap_index(tmp_path, "idx")
+    assert not server.use_mmap_index(tmp_path, "idx", memory_budget=1000)
+    assert server.use_mmap_index(tmp_path, "idx", memory_budget=999)
+    assert server.use_mmap_index(tmp_path, "idx", mmap_index=True)
+
+    (index_dir / "metadata.json").write_text(json.dumps({"num_chunks": 2}))
+    assert not server.use_mmap_index(tmp_path, "idx", memory_budget=999)
+    with pytest.raises(DatasetLayoutError, match="coalesce"):
+        server.use_mmap_index(tmp_path, "idx", mmap_index=True)
+
+
+def test_metrics_endpoint_reports_stage_latencies_and_cache() -> None:
+    client = server.create_app(FakeSearcher()).test_client()
+    client.get("/api/search", query_string={"query": "q"})
+    client.get("/api/search", query_string={"query": "q"})
+
+    response = client.get("/metrics")
+    body = response.get_data(as_text=True)
+
+    assert response.mimetype == "text/plain"
+    for stage in ("query_encoding", "candidate_generation", "decompression_maxsim"):
+        assert f'colbert_stage_duration_seconds_count{{stage="{stage}"}} 1' in body
+    assert 'colbert_stage_duration_seconds_count{stage="serialization"} 2' in body
+    assert 'colbert_requests_total{endpoint="api_search",status="200"} 2' in body
+    assert "colbert_cache_hit_ratio 0.5" in body
+    assert "colbert_requests_in_flight 1" in body
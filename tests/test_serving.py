@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from flask import Flask
+import pytest
+
+from colbert_server.serving import PooledWSGIServer
+
+
+def test_pooled_server_serves_requests_off_the_acceptor_thread() -> None:
+    app = Flask(__name__)
+
+    @app.route("/whoami", methods=["GET", "POST"])
+    def whoami():
+        return {"thread": threading.current_thread().name}
+
+    httpd = PooledWSGIServer("127.0.0.1", 0, app, threads=2, max_queued=1)
+    acceptor = threading.Thread(target=httpd.serve_forever, daemon=True)
+    acceptor.start()
+    connection = http.client.HTTPConnection("127.0.0.1", httpd.port, timeout=5)
+    try:
+        payloads, sockets = [], []
+        for method, body in (("POST", b'{"ignored": "body"}'), ("GET", None)):
+            connection.request(method, "/whoami", body=body)
+            payloads.append(json.load(connection.getresponse()))
+            sockets.append(connection.sock)
+        # Keep-alive: both requests travel over the same socket.
+        assert sockets[0] is not None and sockets[0] is sockets[1]
+    finally:
+        connection.close()
+        httpd.shutdown()
+        httpd.server_close()
+
+    assert all(payload["thread"].startswith("colbert-http") for payload in payloads)
+
+
+def test_idle_keep_alive_connections_do_not_hold_worker_threads() -> None:
+    app = Flask(__name__)
+
+    @app.route("/ping")
+    def ping():
+        return {"ok": True}
+
+    # Two threads and two queue places: four idle clients pinning them would shut out a fifth.
+    httpd = PooledWSGIServer("127.0.0.1", 0, app, threads=2, max_queued=2)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    idle = [http.client.HTTPConnection("127.0.0.1", httpd.port, timeout=5) for _ in range(4)]
+    try:
+        for connection in idle:
+            connection.request("GET", "/ping")
+            response = connection.getresponse()
+            assert response.status == 200 and response.read()
+
+        # Four idle keep-alive clients: a new client is still served at once.
+        started = time.monotonic()
+        newcomer = http.client.HTTPConnection("127.0.0.1", httpd.port, timeout=5)
+        newcomer.request("GET", "/ping")
+        assert newcomer.getresponse().status == 200
+        newcomer.close()
+        assert time.monotonic() - started < 1.0
+
+        # The parked connections are still open and served on their next request.
+        for connection in idle:
+            sock = connection.sock
+            connection.request("GET", "/ping")
+            assert connection.getresponse().status == 200
+            assert connection.sock is sock
+    finally:
+        for connection in idle:
+            connection.close()
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_full_pool_answers_503_with_the_configured_retry_after() -> None:
+    app = Flask(__name__)
+    entered, release = threading.Event(), threading.Event()
+
+    @app.route("/slow")
+    def slow():
+        entered.set()
+        release.wait(5)
+        return {"ok": True}
+
+    httpd = PooledWSGIServer("127.0.0.1", 0, app, threads=1, max_queued=0, retry_after=2.5)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    busy = http.client.HTTPConnection("127.0.0.1", httpd.port, timeout=5)
+    shed = http.client.HTTPConnection("127.0.0.1", httpd.port, timeout=5)
+    try:
+        busy.request("GET", "/slow")
+        assert entered.wait(5)
+        shed.request("GET", "/slow")
+        response = shed.getresponse()
+        assert response.status == 503 and response.getheader("Retry-After") == "3"
+        release.set()
+        assert busy.getresponse().status == 200
+    finally:
+        release.set()
+        busy.close()
+        shed.close()
+        httpd.shutdown()
+        httpd.server_close()
+
+
+_PREFORK_SCRIPT = """
+import os, sys
+from flask import Flask
+from colbert_server.serving import serve_prefork
+
+app = Flask(__name__)
+PARENT = os.getpid()
+
+@app.route("/pid")
+def pid():
+    return {"pid": os.getpid(), "parent": PARENT}
+
+serve_prefork(app, "127.0.0.1", int(sys.argv[1]), workers=2, threads=1)
+"""
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="pre-fork mode requires fork()")
+def test_prefork_workers_share_one_socket() -> None:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    process = subprocess.Popen([sys.executable, "-c", _PREFORK_SCRIPT, str(port)])
+    try:
+        payload = None
+        deadline = time.monotonic() + 20
+        while payload is None and time.monotonic() < deadline:
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                connection.request("GET", "/pid")
+                payload = json.load(connection.getresponse())
+                connection.close()
+            except OSError:
+                time.sleep(0.1)
+
+        assert payload is not None
+        assert payload["parent"] == process.pid
+        assert payload["pid"] != process.pid
+    finally:
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=20) == 0
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import socket
+from types import SimpleNamespace
+import zlib
+
+import pytest
+
+from colbert_server import server, shards
+from colbert_server.bench import serve_in_background
+from colbert_server.shards import ShardClient, ShardedSearcher, ShardError
+
+
+class PidScoredSearcher:
+    """Scores depend only on the query and the global pid, so shards must match one index."""
+
+    def __init__(self, num_passages: int, pid_offset: int = 0) -> None:
+        self.collection = [f"passage {pid_offset + pid}" for pid in range(num_passages)]
+        self.config = SimpleNamespace(ncells=None, centroid_score_threshold=None, ndocs=None)
+        self.ranker = SimpleNamespace(rank=self.rank, num_passages=num_passages)
+        self.pid_offset = pid_offset
+
+    def encode(self, text, full_length_search=False):
+        return text if type(text) is list else [text]
+
+    def rank(self, config, Q, filter_fn=None, pids=None):
+        (query,) = Q
+        seed = zlib.crc32(query.encode())
+        candidates = range(len(self.collection)) if pids is None else pids
+        scored = sorted(
+            ((seed ^ (self.pid_offset + pid) * 7919) % 1000 / 10, pid) for pid in candidates
+        )[::-1]
+        return [pid for _, pid in scored], [score for score, _ in scored]
+
+
+class FakeCheckpoint:
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    def queryFromText(self, queries, bsize=None, to_cpu=False, full_length_search=False):
+        self.calls.append(list(queries))
+        return list(queries)
+
+
+def test_coordinator_merges_shards_like_a_single_index(monkeypatch: pytest.MonkeyPatch) -> None:
+    # The fakes "encode" queries to plain lists, which travel as JSON instead of tensors.
+    monkeypatch.setattr(shards, "pack_query", lambda Q: {"values": Q})
+    monkeypatch.setattr(server, "unpack_query", lambda payload: payload["values"])
+    searchers = [PidScoredSearcher(60), PidScoredSearcher(40, pid_offset=60)]
+    servers = [serve_in_background(server.create_app(shard), threads=2) for shard in searchers]
+    try:
+        checkpoint = FakeCheckpoint()
+        coordinator = ShardedSearcher(
+            checkpoint,
+            [ShardClient(url) for url, _ in servers],
+            collection=[f"passage {pid}" for pid in range(100)],
+        )
+        client = server.create_app(coordinator).test_client()
+        single = server.create_app(PidScoredSearcher(100)).test_client()
+
+        for query in ("halloween", "the fog"):
+            params = {"query": query, "k": 20}
+            sharded = client.get("/api/search", query_string=params).get_json()["topk"]
+            expected = single.get("/api/search", query_string=params).get_json()["topk"]
+            assert [item["pid"] for item in sharded] == [item["pid"] for item in expected]
+            assert all(item["text"] == f"passage {item['pid']}" for item in sharded)
+        assert checkpoint.calls == [["halloween"], ["the fog"]]
+        assert coordinator.ranker.offsets == [0, 60] and server.passage_count(coordinator) == 100
+
+        reranked = client.post("/api/rerank", json={"query": "q", "pids": [99, 5, 70]})
+        expected = single.post("/api/rerank", json={"query": "q", "pids": [99, 5, 70]})
+        assert reranked.get_json()["topk"] == expected.get_json()["topk"]
+    finally:
+        for _, stop in servers:
+            stop()
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        closed_port = probe.getsockname()[1]
+    with pytest.raises(ShardError):
+        ShardedSearcher(checkpoint, [ShardClient(f"http://127.0.0.1:{closed_port}")])
+    with pytest.raises(ShardError):
+        ShardClient("localhost:8893")